@@ -43,6 +43,54 @@ async def start_order_updater():
     except Exception as e:
         logger.error(f"فشل بدء محدث حالة الطلبات: {e}")
 
+# دالة لبدء التحديث الدوري لكتالوج الخدمات
+async def start_catalog_refresher():
+    """بدء مهمة تحديث كتالوج الخدمات في الخلفية"""
+    try:
+        from services.catalog import schedule_catalog_refresher
+
+        app = {}
+        await schedule_catalog_refresher(app)
+
+        # تخزين المهمة في المتغير العام لمنع جامع المهملات من حذفها
+        background_tasks["catalog_refresher"] = app.get("catalog_refresh_task")
+
+        logger.info("تم بدء محدث كتالوج الخدمات بنجاح")
+    except Exception as e:
+        logger.error(f"فشل بدء محدث كتالوج الخدمات: {e}")
+
+# دالة إشعار المشرفين ببدء وانتهاء العروض
+async def notify_admins_promotion(event, rule):
+    """إرسال إشعار للمشرفين عند بدء عرض تسعير أو انتهائه"""
+    if event == "started":
+        text = f"🎉 <b>بدأ عرض التسعير:</b> {rule['name']}\n📉 النسبة: {rule['percentage']}%"
+    else:
+        text = f"⌛ <b>انتهى عرض التسعير:</b> {rule['name']}"
+
+    for admin_id in config.ADMIN_IDS:
+        try:
+            await bot.send_message(admin_id, text)
+        except Exception as e:
+            logger.error(f"فشل إرسال إشعار العرض للمشرف {admin_id}: {e}")
+
+# دالة لبدء مجدول فترات صلاحية قواعد التسعير
+async def start_pricing_scheduler():
+    """بدء مهمة استبدال قواعد التسعير عند مواعيد بدئها وانتهائها"""
+    try:
+        from utils.pricing_scheduler import schedule_pricing_scheduler, add_promotion_listener
+
+        add_promotion_listener(notify_admins_promotion)
+
+        app = {}
+        await schedule_pricing_scheduler(app)
+
+        # تخزين المهمة في المتغير العام لمنع جامع المهملات من حذفها
+        background_tasks["pricing_scheduler"] = app.get("pricing_scheduler_task")
+
+        logger.info("تم بدء مجدول قواعد التسعير بنجاح")
+    except Exception as e:
+        logger.error(f"فشل بدء مجدول قواعد التسعير: {e}")
+
 # دالة لتنظيف الموارد عند إغلاق البوت
 async def cleanup_resources():
     """تنظيف الموارد عند إغلاق البوت"""
@@ -82,6 +130,13 @@ async def cleanup_resources():
             for task in tasks:
                 task.cancel()
             await asyncio.gather(*tasks, return_exceptions=True)
+    except Exception as e:
+        logger.error(f"خطأ في إلغاء المهام المعلقة: {e}")
+
+    # إغلاق مجمع اتصالات قاعدة البيانات بعد توقف المهام التي تستخدمه
+    try:
+        from database.pool import close_db_pool
+        await close_db_pool()
         logger.info("اكتمل تنظيف الموارد")
     except Exception as e:
-        logger.error(f"خطأ في إلغاء المهام المعلقة: {e}")
\ No newline at end of file
+        logger.error(f"خطأ في إغلاق اتصالات قاعدة البيانات: {e}")
\ No newline at end of file
@@ -5,11 +5,14 @@
 
 from database.core import init_db
 from database.deposit import init_deposit_tables
-from database.ranks import init_ranks
+from database.ranks import init_ranks, load_rank_registry
 from database.migrations import run_migrations
 from database.services import init_services_tables
 from database.pricing import init_pricing_tables
 from database.crypto import init_crypto_tables
+from database.pool import init_db_pool, close_db_pool, get_db_pool_stats
+from database.schema import load_schema_capabilities, get_schema_capabilities
+from database.price_matrix import load_price_matrix
 
 async def init_all_db():
     """تهيئة جميع عناصر قاعدة البيانات"""
@@ -21,4 +24,16 @@ async def init_all_db():
     # تشغيل جميع المigrations مرة واحدة فقط
     await run_migrations()
     
+    # فتح مجمع الاتصالات طويلة العمر بعد اكتمال تعديلات البنية
+    await init_db_pool()
+    
+    # قراءة بنية الجداول مرة واحدة بعد اكتمال migrations
+    await load_schema_capabilities()
+    
+    # تحميل الرتب وحدودها إلى الذاكرة (يعتمد عليها جدول التسعير)
+    await load_rank_registry()
+    
+    # تحميل مصفوفة الأسعار (خدمة × رتبة) إلى الذاكرة
+    await load_price_matrix()
+    
     # الآن جميع الجداول جاهزة ولا نحتاج لاستدعاءات إضافية
@@ -4,12 +4,18 @@
 
 import logging
 import os
+import time
+import itertools
 import sqlite3
-import aiosqlite
-from typing import Dict, List, Optional, Any, Tuple
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple, AsyncIterator
 from datetime import datetime, timedelta
 
 import config
+from database.pool import get_connection
+from database.schema import get_schema_capabilities
+from database.pagination import keyset_condition, split_page
+from database.rollups import apply_order_rollup, get_order_row_ids, get_sales_totals
 
 # إعداد المسجل
 logger = logging.getLogger("smm_bot")
@@ -17,6 +23,19 @@ logger = logging.getLogger("smm_bot")
 # مسارات قاعدة البيانات
 DB_PATH = config.DB_NAME
 
+# الحد الأقصى لعدد المستخدمين في ذاكرة التخزين المؤقت
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))
+# مدة صلاحية بيانات المستخدم المخزنة بالثواني، 0 لتعطيل التخزين المؤقت
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# ذاكرة مؤقتة (LRU) لصفوف المستخدمين: user_id -> (وقت الانتهاء، بيانات المستخدم)
+_user_cache: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_user_cache_stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+# جيل آخر قراءة جارية لكل مستخدم غير موجود في الذاكرة المؤقتة. الإلغاء يحذف
+# الجيل، فلا تحفظ القراءة التي بدأت قبل الإلغاء صفًا قديمًا بعده
+_user_read_generations: Dict[int, int] = {}
+_user_generation_counter = itertools.count(1)
+
 async def update_order_remains(order_id: str, remains: int) -> bool:
     """
     تحديث الكمية المتبقية للطلب في قاعدة البيانات
@@ -29,7 +48,7 @@ async def update_order_remains(order_id: str, remains: int) -> bool:
         bool: نجاح العملية
     """
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with get_connection() as db:
             await db.execute(
                 "UPDATE orders SET remains = ?, updated_at = CURRENT_TIMESTAMP WHERE order_id = ?",
                 (remains, order_id)
@@ -44,7 +63,7 @@ async def init_db() -> None:
     """
     تهيئة قاعدة البيانات وإنشاء الجداول إذا لم تكن موجودة
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_connection() as db:
         # جدول المستخدمين
         await db.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -81,33 +100,7 @@ async def init_db() -> None:
         )
         ''')
 
-        # التحقق من وجود عمود updated_at و remains وإضافتهم إذا لم يكونوا موجودين
-        try:
-            cursor = await db.execute("PRAGMA table_info(orders)")
-            columns = await cursor.fetchall()
-            column_names = [column[1] for column in columns]
-
-            if "updated_at" not in column_names:
-                logger.info("إضافة عمود updated_at إلى جدول الطلبات")
-                await db.execute("ALTER TABLE orders ADD COLUMN updated_at TIMESTAMP")
-                # تحديث القيم الموجودة مباشرة بعد إضافة العمود
-                await db.execute("UPDATE orders SET updated_at = created_at WHERE updated_at IS NULL")
-                await db.commit()
-                
-            if "remains" not in column_names:
-                logger.info("إضافة عمود remains إلى جدول الطلبات")
-                await db.execute("ALTER TABLE orders ADD COLUMN remains INTEGER")
-                # تعيين القيمة الافتراضية للكمية المتبقية بنفس قيمة الكمية الأصلية
-                await db.execute("UPDATE orders SET remains = quantity WHERE remains IS NULL")
-                
-                # تحديث الطلبات المكتملة ليكون الرقم المتبقي 0
-                await db.execute("UPDATE orders SET remains = 0 WHERE status = 'completed' OR status = 'Completed'")
-                await db.commit()
-                
-                # إضافة سجل تنفيذ
-                logger.info("تم تحديث جميع الطلبات المكتملة بحيث تكون الكمية المتبقية 0")
-        except Exception as e:
-            logger.error(f"خطأ في التحقق من أو إضافة أعمدة إلى جدول الطلبات: {e}")
+        # الأعمدة الإضافية (updated_at و remains) تُضاف عبر migration 9
 
         # جدول طلبات الإيداع
         await db.execute('''
@@ -130,18 +123,76 @@ async def init_db() -> None:
     logger.info("تم تهيئة قاعدة البيانات بنجاح")
 
 # وظائف المستخدمين
+def invalidate_user_cache(user_id: Optional[int] = None) -> None:
+    """
+    حذف مستخدم من الذاكرة المؤقتة (أو جميع المستخدمين إذا لم يحدد)
+
+    يجب استدعاؤها بعد حفظ أي تعديل على جدول users حتى لا تُقرأ قيمة قديمة.
+    """
+    _user_cache_stats["invalidations"] += 1
+    if user_id is None:
+        _user_cache.clear()
+        _user_read_generations.clear()
+    else:
+        _user_cache.pop(user_id, None)
+        _user_read_generations.pop(user_id, None)
+
+def get_user_cache_stats() -> Dict[str, Any]:
+    """
+    الحصول على إحصائيات الذاكرة المؤقتة للمستخدمين
+
+    Returns:
+        Dict[str, Any]: عدد مرات الإصابة والإخفاق ونسبة الإصابة والحجم الحالي
+    """
+    lookups = _user_cache_stats["hits"] + _user_cache_stats["misses"]
+    return {
+        **_user_cache_stats,
+        "size": len(_user_cache),
+        "max_size": USER_CACHE_SIZE,
+        "ttl": USER_CACHE_TTL,
+        "hit_rate": _user_cache_stats["hits"] / lookups if lookups else 0.0,
+    }
+
+def _cache_user(user_id: int, user: Dict[str, Any]) -> None:
+    """حفظ صف المستخدم في الذاكرة المؤقتة مع حذف الأقدم استخدامًا عند الامتلاء"""
+    if USER_CACHE_TTL <= 0 or USER_CACHE_SIZE <= 0:
+        return
+    _user_cache[user_id] = (time.monotonic() + USER_CACHE_TTL, user)
+    _user_cache.move_to_end(user_id)
+    while len(_user_cache) > USER_CACHE_SIZE:
+        _user_cache.popitem(last=False)
+        _user_cache_stats["evictions"] += 1
+
 async def get_user(user_id: int) -> Optional[Dict[str, Any]]:
     """
     الحصول على بيانات المستخدم من قاعدة البيانات
 
+    تُخدم القراءات المتكررة من ذاكرة مؤقتة محدودة الحجم والمدة، وتُحذف
+    بيانات المستخدم منها عند كل تعديل (الرصيد، الرتبة، عدد المشتريات).
+
     Args:
         user_id: معرف المستخدم
 
     Returns:
         بيانات المستخدم أو None إذا لم يكن موجودًا
     """
+    cached = _user_cache.get(user_id)
+    if cached is not None:
+        expires_at, user = cached
+        if expires_at > time.monotonic():
+            _user_cache.move_to_end(user_id)
+            _user_cache_stats["hits"] += 1
+            # نسخة حتى لا يغير المستدعي البيانات المخزنة
+            return dict(user)
+        _user_cache.pop(user_id, None)
+        _user_cache_stats["expired"] += 1
+
+    _user_cache_stats["misses"] += 1
+    # تسجيل جيل القراءة قبل الاستعلام
+    generation = next(_user_generation_counter)
+    _user_read_generations[user_id] = generation
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             cursor = await db.execute(
                 "SELECT * FROM users WHERE user_id = ?", 
@@ -150,12 +201,19 @@ async def get_user(user_id: int) -> Optional[Dict[str, Any]]:
             user = await cursor.fetchone()
 
             if user:
+                user = dict(user)
+                # لا يُحفظ الصف إذا أُلغيت بيانات المستخدم (أو بدأت قراءة أحدث) أثناء الاستعلام
+                if _user_read_generations.get(user_id) == generation:
+                    _cache_user(user_id, user)
                 return dict(user)
 
             return None
     except Exception as e:
         logger.error(f"خطأ في الحصول على بيانات المستخدم (ID: {user_id}): {e}")
         return None
+    finally:
+        if _user_read_generations.get(user_id) == generation:
+            del _user_read_generations[user_id]
 
 async def create_user(user_id: int, username: str, full_name: str) -> bool:
     """
@@ -176,7 +234,7 @@ async def create_user(user_id: int, username: str, full_name: str) -> bool:
             logger.info(f"المستخدم موجود بالفعل: {user_id}")
             return True  # المستخدم موجود بالفعل
 
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with get_connection() as db:
             await db.execute(
                 "INSERT INTO users (user_id, username, full_name, balance, last_activity) VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)",
                 (user_id, username, full_name, 0)
@@ -200,14 +258,65 @@ async def update_user_activity(user_id: int, timestamp: str) -> None:
         user_id: معرف المستخدم
         timestamp: الطابع الزمني
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_connection() as db:
         await db.execute(
             "UPDATE users SET last_activity = ? WHERE user_id = ?",
             (timestamp, user_id)
         )
         await db.commit()
+    invalidate_user_cache(user_id)
 
-async def update_user_balance(user_id: int, amount: float, operation: str = "add") -> bool:
+async def apply_balance_change(db, user_id: int, amount: float, operation: str,
+                               reason: Optional[str] = None, reference: Optional[str] = None) -> bool:
+    """
+    تعديل الرصيد وتسجيله في سجل الرصيد ضمن معاملة مفتوحة على الاتصال db
+
+    التعديل يتم بعبارة UPDATE شرطية واحدة (لا قراءة ثم كتابة في Python)، لذلك
+    لا تضيع أي عملية عند تزامن خصم طلب مع قبول إيداع. لا تقوم الدالة بالحفظ:
+    على المستدعي تنفيذ commit أو rollback مع بقية تعديلات المعاملة، ثم
+    invalidate_user_cache بعد الحفظ.
+
+    Args:
+        db: اتصال الكتابة (داخل معاملة)
+        user_id: معرف المستخدم
+        amount: المبلغ (موجب)
+        operation: نوع العملية (add للإضافة، subtract للخصم)
+        reason: سبب العملية المسجل في السجل (افتراضيًا نوع العملية)
+        reference: مرجع العملية (رقم الطلب أو الإيداع)
+
+    Returns:
+        True إذا تم التعديل، False إذا لم يوجد المستخدم أو كان الرصيد غير كافٍ
+    """
+    if operation == "add":
+        cursor = await db.execute(
+            "UPDATE users SET balance = balance + ? WHERE user_id = ?",
+            (amount, user_id)
+        )
+        delta = amount
+    elif operation == "subtract":
+        # الشرط balance >= ? يضمن عدم النزول تحت الصفر حتى مع العمليات المتزامنة
+        cursor = await db.execute(
+            "UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ?",
+            (amount, user_id, amount)
+        )
+        delta = -amount
+    else:
+        return False
+
+    if cursor.rowcount == 0:
+        return False
+
+    await db.execute(
+        """
+        INSERT INTO balance_ledger (user_id, delta, balance_after, reason, reference)
+        SELECT user_id, ?, balance, ?, ? FROM users WHERE user_id = ?
+        """,
+        (delta, reason or operation, reference, user_id)
+    )
+    return True
+
+async def update_user_balance(user_id: int, amount: float, operation: str = "add",
+                              reason: Optional[str] = None, reference: Optional[str] = None) -> bool:
     """
     تحديث رصيد المستخدم
 
@@ -215,42 +324,91 @@ async def update_user_balance(user_id: int, amount: float, operation: str = "add
         user_id: معرف المستخدم
         amount: المبلغ
         operation: نوع العملية (add للإضافة، subtract للخصم)
+        reason: سبب العملية المسجل في سجل الرصيد (اختياري)
+        reference: مرجع العملية مثل رقم الطلب (اختياري)
 
     Returns:
         True إذا نجحت العملية، False إذا فشلت
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        user = await get_user(user_id)
+    try:
+        async with get_connection() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            updated = await apply_balance_change(db, user_id, amount, operation, reason, reference)
+            if not updated:
+                await db.rollback()
+                return False
 
-        if not user:
-            return False
+            await db.commit()
+            invalidate_user_cache(user_id)
+            return True
+    except Exception as e:
+        logger.error(f"خطأ في تحديث رصيد المستخدم {user_id}: {e}")
+        return False
 
-        current_balance = user["balance"]
+async def get_balance_history(user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    الحصول على آخر حركات رصيد المستخدم من سجل الرصيد
 
-        # حساب الرصيد الجديد
-        if operation == "add":
-            new_balance = current_balance + amount
-        elif operation == "subtract":
-            # التأكد من وجود رصيد كافٍ
-            if current_balance < amount:
-                return False
-            new_balance = current_balance - amount
-        else:
-            return False
+    Args:
+        user_id: معرف المستخدم
+        limit: الحد الأقصى لعدد الحركات
 
-        # تحديث الرصيد
-        await db.execute(
-            "UPDATE users SET balance = ? WHERE user_id = ?",
-            (new_balance, user_id)
-        )
-        await db.commit()
+    Returns:
+        قائمة الحركات (الأحدث أولاً) مع الرصيد بعد كل حركة
+    """
+    try:
+        async with get_connection(readonly=True) as db:
+            db.row_factory = dict_factory
+            cursor = await db.execute(
+                """
+                SELECT id, delta, balance_after, reason, reference, created_at
+                FROM balance_ledger
+                WHERE user_id = ?
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                (user_id, limit)
+            )
+            return await cursor.fetchall()
+    except Exception as e:
+        logger.error(f"خطأ في استرجاع سجل رصيد المستخدم {user_id}: {e}")
+        return []
 
-        return True
+async def reconcile_balances(tolerance: float = 0.000001) -> List[Dict[str, Any]]:
+    """
+    مطابقة أرصدة المستخدمين مع مجموع حركاتهم في سجل الرصيد
+
+    Returns:
+        قائمة المستخدمين الذين يختلف رصيدهم عن مجموع السجل (فارغة إذا كان كل شيء متطابقًا)
+    """
+    try:
+        async with get_connection(readonly=True) as db:
+            db.row_factory = dict_factory
+            cursor = await db.execute(
+                """
+                SELECT u.user_id, u.balance, IFNULL(l.total, 0) AS ledger_balance,
+                       u.balance - IFNULL(l.total, 0) AS difference
+                FROM users u
+                LEFT JOIN (
+                    SELECT user_id, SUM(delta) AS total FROM balance_ledger GROUP BY user_id
+                ) l ON l.user_id = u.user_id
+                WHERE ABS(u.balance - IFNULL(l.total, 0)) > ?
+                """,
+                (tolerance,)
+            )
+            mismatches = await cursor.fetchall()
+
+        if mismatches:
+            logger.warning(f"تم العثور على {len(mismatches)} مستخدم برصيد لا يطابق سجل الرصيد")
+        return mismatches
+    except Exception as e:
+        logger.error(f"خطأ في مطابقة الأرصدة: {e}")
+        return []
 
 async def get_all_users(page: int = 1, per_page: int = 10) -> Tuple[List[Dict[str, Any]], int]:
     """الحصول على جميع المستخدمين مع الصفحات"""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
 
             # حساب إجمالي المستخدمين
@@ -274,78 +432,63 @@ async def get_all_users(page: int = 1, per_page: int = 10) -> Tuple[List[Dict[st
         logger.error(f"خطأ في الحصول على المستخدمين: {e}")
         return [], 0
 
-async def get_orders_stats() -> Dict[str, Any]:
-    """الحصول على إحصائيات الطلبات"""
-    try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            # تعريف dict_factory داخل الدالة لمنع خطأ الاسم غير معرف
-            def dict_factory(cursor, row):
-                """تحويل نتائج قاعدة البيانات إلى قاموس"""
-                d = {}
-                for idx, col in enumerate(cursor.description):
-                    d[col[0]] = row[idx]
-                return d
-
-            db.row_factory = dict_factory
-
-            # إجمالي عدد الطلبات
-            cursor = await db.execute("SELECT COUNT(*) as count FROM orders")
-            result = await cursor.fetchone()
-            total_count = result["count"]
+async def get_users_page(cursor: Optional[str] = None,
+                         limit: int = 5) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    الحصول على صفحة واحدة من المستخدمين (الأحدث أولاً) بالتصفح بالمفتاح
 
-            # إجمالي مبلغ الطلبات
-            cursor = await db.execute("SELECT SUM(amount) as total FROM orders") # Corrected column name to 'amount'
-            result = await cursor.fetchone()
-            total_amount = result["total"] or 0
+    Args:
+        cursor: مؤشر الصفحة (None للصفحة الأولى)
+        limit: عدد العناصر في الصفحة
 
-            # إحصائيات حسب الفترة
+    Returns:
+        (مستخدمو الصفحة، مؤشر الصفحة التالية أو None إذا كانت الأخيرة)
+    """
+    try:
+        condition, params = keyset_condition(cursor, "u", key="user_id")
+        query = "SELECT u.* FROM users u"
+        if condition:
+            query += f" WHERE {condition}"
+        query += " ORDER BY u.created_at DESC, u.user_id DESC LIMIT ?"
 
-            # اليوم
-            today = datetime.now().strftime("%Y-%m-%d")
-            cursor = await db.execute(
-                "SELECT SUM(amount) as total FROM orders WHERE date(created_at) = ?", # Corrected column name to 'amount'
-                (today,)
-            )
-            result = await cursor.fetchone()
-            today_amount = result["total"] or 0
+        async with get_connection(readonly=True) as db:
+            db.row_factory = dict_factory
+            cursor_obj = await db.execute(query, params + [limit + 1])
+            rows = await cursor_obj.fetchall()
 
-            # هذا الأسبوع
-            # الحصول على تاريخ بداية الأسبوع (الأحد)
-            now = datetime.now()
-            start_of_week = (now - timedelta(days=now.weekday())).strftime("%Y-%m-%d")
-            cursor = await db.execute(
-                "SELECT SUM(amount) as total FROM orders WHERE date(created_at) >= ?", # Corrected column name to 'amount'
-                (start_of_week,)
-            )
-            result = await cursor.fetchone()
-            week_amount = result["total"] or 0
+        return split_page(rows, limit, key="user_id")
+    except Exception as e:
+        logger.error(f"خطأ في استرجاع صفحة المستخدمين: {e}")
+        return [], None
 
-            # هذا الشهر
-            start_of_month = now.strftime("%Y-%m-01")
-            cursor = await db.execute(
-                "SELECT SUM(amount) as total FROM orders WHERE date(created_at) >= ?", # Corrected column name to 'amount'
-                (start_of_month,)
-            )
-            result = await cursor.fetchone()
-            month_amount = result["total"] or 0
+async def get_orders_stats() -> Dict[str, Any]:
+    """الحصول على إحصائيات الطلبات (من جداول التجميع اليومية)"""
+    try:
+        # إجمالي عدد الطلبات ومبالغها
+        totals = await get_sales_totals()
+
+        # إحصائيات حسب الفترة
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        tomorrow = (now + timedelta(days=1)).strftime("%Y-%m-%d")
+        # بداية الأسبوع (الاثنين)
+        start_of_week = (now - timedelta(days=now.weekday())).strftime("%Y-%m-%d")
+        start_of_month = now.strftime("%Y-%m-01")
+        start_of_year = now.strftime("%Y-01-01")
+
+        today_totals = await get_sales_totals(today, tomorrow)
+        week_totals = await get_sales_totals(start_of_week)
+        month_totals = await get_sales_totals(start_of_month)
+        year_totals = await get_sales_totals(start_of_year)
 
-            # هذا العام
-            start_of_year = now.strftime("%Y-01-01")
-            cursor = await db.execute(
-                "SELECT SUM(amount) as total FROM orders WHERE date(created_at) >= ?", # Corrected column name to 'amount'
-                (start_of_year,)
-            )
-            result = await cursor.fetchone()
-            year_amount = result["total"] or 0
-
-            return {
-                "total_count": total_count,
-                "total_amount": total_amount,
-                "today": today_amount,
-                "this_week": week_amount,
-                "this_month": month_amount,
-                "this_year": year_amount
-            }
+        return {
+            "total_count": totals["count"],
+            "total_amount": totals["amount"],
+            "today": today_totals["amount"],
+            "this_week": week_totals["amount"],
+            "this_month": month_totals["amount"],
+            "this_year": year_totals["amount"]
+        }
     except Exception as e:
         logger.error(f"خطأ في الحصول على إحصائيات الطلبات: {e}")
         return {
@@ -375,66 +518,40 @@ async def create_order(user_id: int, order_id: str, service_id: int, service_nam
     Returns:
         True إذا نجحت العملية، False إذا فشلت
     """
-    # خصم المبلغ من رصيد المستخدم
-    balance_updated = await update_user_balance(user_id, amount, "subtract")
+    try:
+        async with get_connection() as db:
+            # خصم المبلغ وإنشاء الطلب في نفس المعاملة
+            await db.execute("BEGIN IMMEDIATE")
+            balance_updated = await apply_balance_change(db, user_id, amount, "subtract", "order", order_id)
 
-    if not balance_updated:
-        return False
+            if not balance_updated:
+                await db.rollback()
+                return False
 
-    try:
-        # إنشاء الطلب
-        async with aiosqlite.connect(DB_PATH) as db:
-            # التحقق من وجود عمود updated_at
-            cursor = await db.execute("PRAGMA table_info(orders)")
-            columns = await cursor.fetchall()
-            column_names = [column[1] for column in columns]
-
-            # التحقق من وجود أعمدة updated_at و remains
-            has_updated_at = "updated_at" in column_names
-            has_remains = "remains" in column_names
-            
-            if has_updated_at and has_remains:
-                # إذا كانت الأعمدة موجودة
-                await db.execute(
-                    """
-                    INSERT INTO orders 
-                    (order_id, user_id, service_id, service_name, link, quantity, amount, remains, updated_at) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                    """,
-                    (order_id, user_id, service_id, service_name, link, quantity, amount, quantity)
-                )
-            elif has_updated_at:
-                # إذا كان عمود updated_at موجودًا فقط
-                await db.execute(
-                    """
-                    INSERT INTO orders 
-                    (order_id, user_id, service_id, service_name, link, quantity, amount, updated_at) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-                    """,
-                    (order_id, user_id, service_id, service_name, link, quantity, amount)
-                )
-            elif has_remains:
-                # إذا كان عمود remains موجودًا فقط
-                await db.execute(
-                    """
-                    INSERT INTO orders 
-                    (order_id, user_id, service_id, service_name, link, quantity, amount, remains) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (order_id, user_id, service_id, service_name, link, quantity, amount, quantity)
-                )
-            else:
-                # إذا لم تكن الأعمدة موجودة
-                await db.execute(
-                    """
-                    INSERT INTO orders 
-                    (order_id, user_id, service_id, service_name, link, quantity, amount) 
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (order_id, user_id, service_id, service_name, link, quantity, amount)
-                )
+            # إنشاء الطلب
+            schema = get_schema_capabilities()
+            columns = ["order_id", "user_id", "service_id", "service_name", "link", "quantity", "amount"]
+            values = ["?"] * len(columns)
+            params = [order_id, user_id, service_id, service_name, link, quantity, amount]
+
+            # الكمية المتبقية تبدأ بنفس قيمة الكمية المطلوبة
+            if schema.has_column("orders", "remains"):
+                columns.append("remains")
+                values.append("?")
+                params.append(quantity)
+
+            if schema.has_column("orders", "updated_at"):
+                columns.append("updated_at")
+                values.append("CURRENT_TIMESTAMP")
+
+            cursor = await db.execute(
+                f"INSERT INTO orders ({', '.join(columns)}) VALUES ({', '.join(values)})",
+                params
+            )
+            await apply_order_rollup(db, [cursor.lastrowid])
 
             await db.commit()
+            invalidate_user_cache(user_id)
             return True
     except Exception as e:
         logger.error(f"خطأ في إنشاء الطلب: {e}")
@@ -453,53 +570,29 @@ async def get_user_orders(user_id: int, page: int = 1, per_page: int = 5) -> Tup
         (قائمة الطلبات، إجمالي عدد الطلبات)
     """
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
 
-            # التحقق مما إذا كان عمود remains موجودًا
-            cursor = await db.execute("PRAGMA table_info(orders)")
-            columns = await cursor.fetchall()
-            column_names = [column[1] for column in columns]
-            has_remains = "remains" in column_names
-
             # استعلام للحصول على الطلبات مع معلومات الخدمة
-            # استخدام IFNULL للتعامل مع حالة عدم وجود عمود updated_at
-            if has_remains:
-                query = """
-                    SELECT 
-                        o.id as id,
-                        o.order_id,
-                        o.service_id,
-                        o.service_name,
-                        o.link,
-                        o.quantity,
-                        o.amount,
-                        o.status,
-                        o.remains,
-                        o.created_at,
-                        IFNULL(o.updated_at, o.created_at) as updated_at
-                    FROM orders o
-                    WHERE o.user_id = ?
-                    ORDER BY o.created_at DESC
-                """
-            else:
-                query = """
-                    SELECT 
-                        o.id as id,
-                        o.order_id,
-                        o.service_id,
-                        o.service_name,
-                        o.link,
-                        o.quantity,
-                        o.amount,
-                        o.status,
-                        o.quantity as remains,
-                        o.created_at,
-                        IFNULL(o.updated_at, o.created_at) as updated_at
-                    FROM orders o
-                    WHERE o.user_id = ?
-                    ORDER BY o.created_at DESC
-                """
+            # استخدام IFNULL للتعامل مع حالة عدم وجود قيمة updated_at
+            remains_column = "o.remains" if get_schema_capabilities().has_column("orders", "remains") else "o.quantity"
+            query = f"""
+                SELECT 
+                    o.id as id,
+                    o.order_id,
+                    o.service_id,
+                    o.service_name,
+                    o.link,
+                    o.quantity,
+                    o.amount,
+                    o.status,
+                    {remains_column} as remains,
+                    o.created_at,
+                    IFNULL(o.updated_at, o.created_at) as updated_at
+                FROM orders o
+                WHERE o.user_id = ?
+                ORDER BY o.created_at DESC
+            """
 
             # استعلام للحصول على العدد الإجمالي
             count_query = "SELECT COUNT(*) as total FROM orders WHERE user_id = ?"
@@ -538,6 +631,66 @@ async def get_user_orders(user_id: int, page: int = 1, per_page: int = 5) -> Tup
         logger.error(f"خطأ في استرجاع طلبات المستخدم: {e}")
         return [], 0
 
+async def get_user_orders_page(user_id: int, cursor: Optional[str] = None,
+                               limit: int = 5) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    الحصول على صفحة واحدة من طلبات المستخدم بالتصفح بالمفتاح
+
+    Args:
+        user_id: معرف المستخدم
+        cursor: مؤشر الصفحة (None للصفحة الأولى)
+        limit: عدد العناصر في الصفحة
+
+    Returns:
+        (طلبات الصفحة، مؤشر الصفحة التالية أو None إذا كانت الأخيرة)
+    """
+    try:
+        condition, params = keyset_condition(cursor, "o")
+        remains_column = "o.remains" if get_schema_capabilities().has_column("orders", "remains") else "o.quantity"
+        query = f"""
+            SELECT 
+                o.id as id,
+                o.order_id,
+                o.service_id,
+                o.service_name,
+                o.link,
+                o.quantity,
+                o.amount,
+                o.status,
+                {remains_column} as remains,
+                o.created_at,
+                IFNULL(o.updated_at, o.created_at) as updated_at
+            FROM orders o
+            WHERE o.user_id = ? {"AND " + condition if condition else ""}
+            ORDER BY o.created_at DESC, o.id DESC
+            LIMIT ?
+        """
+
+        async with get_connection(readonly=True) as db:
+            db.row_factory = dict_factory
+            cursor_obj = await db.execute(query, [user_id] + params + [limit + 1])
+            rows = await cursor_obj.fetchall()
+
+        orders, next_cursor = split_page(rows, limit)
+        for order_dict in orders:
+            if not order_dict.get("order_id"):
+                order_dict["order_id"] = f"LOCAL-{order_dict.get('id', '0')}"
+
+            if not order_dict.get("service_name"):
+                order_dict["service_name"] = "غير محدد"
+
+            if order_dict.get("created_at"):
+                try:
+                    created_at = datetime.fromisoformat(order_dict["created_at"].replace('Z', '+00:00'))
+                    order_dict["created_at"] = created_at.strftime("%Y-%m-%d %H:%M")
+                except (ValueError, TypeError):
+                    pass
+
+        return orders, next_cursor
+    except Exception as e:
+        logger.error(f"خطأ في استرجاع صفحة طلبات المستخدم: {e}")
+        return [], None
+
 async def handle_order_completion(user_id: int, order_id: str) -> None:
     """دالة مركزية للتعامل مع اكتمال الطلبات وفحص ترقية الرتب"""
     try:
@@ -566,7 +719,7 @@ async def update_order_status(order_id: str, status: str) -> bool:
         True إذا نجحت العملية، False إذا فشلت
     """
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with get_connection() as db:
             # تنظيف وتوحيد قيمة الحالة
             status = status.lower().strip().replace(" ", "_")
             
@@ -576,11 +729,19 @@ async def update_order_status(order_id: str, status: str) -> bool:
             user_id = order_row[0] if order_row else None
             current_status = order_row[1] if order_row else None
             
+            # نقل الطلب في جداول التجميع من الحالة القديمة إلى الجديدة
+            status_changed = order_row is not None and current_status != status
+            if status_changed:
+                row_ids = await get_order_row_ids(db, [order_id])
+                await apply_order_rollup(db, row_ids, -1)
+
             # تحديث الحالة
             await db.execute(
                 "UPDATE orders SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE order_id = ?",
                 (status, order_id)
             )
+            if status_changed:
+                await apply_order_rollup(db, row_ids)
             await db.commit()
             logger.info(f"تم تحديث حالة الطلب #{order_id} إلى: {status}")
             
@@ -611,7 +772,7 @@ async def get_all_orders(status: Optional[str] = None) -> Tuple[List[Dict[str, A
         # إضافة الترتيب التنازلي حسب التاريخ
         query += " ORDER BY o.created_at DESC"
 
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = dict_factory
             cursor = await db.execute(query, params)
             orders = await cursor.fetchall()
@@ -630,6 +791,132 @@ async def get_all_orders(status: Optional[str] = None) -> Tuple[List[Dict[str, A
         logger.error(f"خطأ في استرجاع جميع الطلبات: {e}")
         return [], 0
 
+async def get_orders_page(status: Optional[str] = None, cursor: Optional[str] = None,
+                          limit: int = 5) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    الحصول على صفحة واحدة من جميع الطلبات بالتصفح بالمفتاح، مع إمكانية التصفية حسب الحالة
+
+    Args:
+        status: حالة الطلبات (None لجميع الحالات)
+        cursor: مؤشر الصفحة (None للصفحة الأولى)
+        limit: عدد العناصر في الصفحة
+
+    Returns:
+        (طلبات الصفحة، مؤشر الصفحة التالية أو None إذا كانت الأخيرة)
+    """
+    try:
+        conditions = []
+        params = []
+        if status:
+            conditions.append("o.status = ?")
+            params.append(status)
+
+        condition, cursor_params = keyset_condition(cursor, "o")
+        if condition:
+            conditions.append(condition)
+            params.extend(cursor_params)
+
+        query = """
+            SELECT o.*, u.username, u.full_name
+            FROM orders o
+            LEFT JOIN users u ON o.user_id = u.user_id
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY o.created_at DESC, o.id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        async with get_connection(readonly=True) as db:
+            db.row_factory = dict_factory
+            cursor_obj = await db.execute(query, params)
+            rows = await cursor_obj.fetchall()
+
+        return split_page(rows, limit)
+    except Exception as e:
+        logger.error(f"خطأ في استرجاع صفحة الطلبات: {e}")
+        return [], None
+
+async def count_orders(status: Optional[str] = None) -> int:
+    """عدد الطلبات، مع إمكانية التصفية حسب الحالة"""
+    try:
+        async with get_connection(readonly=True) as db:
+            if status:
+                cursor = await db.execute("SELECT COUNT(*) FROM orders WHERE status = ?", (status,))
+            else:
+                cursor = await db.execute("SELECT COUNT(*) FROM orders")
+            result = await cursor.fetchone()
+            return result[0] if result else 0
+    except Exception as e:
+        logger.error(f"خطأ في حساب عدد الطلبات: {e}")
+        return 0
+
+async def count_user_orders(user_id: int) -> int:
+    """عدد طلبات المستخدم"""
+    try:
+        async with get_connection(readonly=True) as db:
+            cursor = await db.execute("SELECT COUNT(*) FROM orders WHERE user_id = ?", (user_id,))
+            result = await cursor.fetchone()
+            return result[0] if result else 0
+    except Exception as e:
+        logger.error(f"خطأ في حساب عدد طلبات المستخدم: {e}")
+        return 0
+
+# الحالات التي تعتبر فيها الطلبات نشطة (بكل الصيغ المخزنة: الافتراضية من الجدول والموحدة من المحدث)
+ACTIVE_ORDER_STATUSES = (
+    "pending", "in_progress", "processing",
+    "Pending", "In progress", "In Progress", "Processing",
+)
+
+async def iter_active_orders(chunk_size: int = 500, due_within: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    استرجاع الطلبات النشطة على دفعات كمكرر غير متزامن
+
+    يختار الاستعلام الطلبات النشطة فقط والأعمدة التي يحتاجها محدث الحالة،
+    ويتقدم بالمعرف (keyset) بدلاً من OFFSET بحيث يبقى استهلاك الذاكرة ثابتًا
+    مهما كبر سجل الطلبات.
+
+    Args:
+        chunk_size: عدد الصفوف في كل استعلام
+        due_within: إذا تم تحديده، تُرجع فقط الطلبات التي يحين موعد فحصها
+            خلال هذا العدد من الثواني (أو التي لم تُجدول بعد)
+
+    Yields:
+        Dict[str, Any]: بيانات الطلب (id, order_id, user_id, status, quantity, remains,
+        created_at, poll_interval, next_check_at)
+    """
+    placeholders = ", ".join("?" for _ in ACTIVE_ORDER_STATUSES)
+    due_filter = ""
+    due_params: Tuple[Any, ...] = ()
+    if due_within is not None:
+        due_filter = "AND (next_check_at IS NULL OR next_check_at <= datetime('now', ?))"
+        due_params = (f"+{int(due_within)} seconds",)
+
+    query = f"""
+        SELECT id, order_id, user_id, status, quantity, remains,
+               created_at, poll_interval, next_check_at
+        FROM orders
+        WHERE status IN ({placeholders}) AND id > ?
+          AND order_id IS NOT NULL AND order_id != ''
+          {due_filter}
+        ORDER BY id
+        LIMIT ?
+    """
+
+    last_id = 0
+    async with get_connection(readonly=True) as db:
+        db.row_factory = dict_factory
+        while True:
+            cursor = await db.execute(query, (*ACTIVE_ORDER_STATUSES, last_id, *due_params, chunk_size))
+            rows = await cursor.fetchall()
+            await cursor.close()
+
+            for row in rows:
+                yield row
+
+            if len(rows) < chunk_size:
+                break
+            last_id = rows[-1]["id"]
+
 async def get_recent_orders(limit: int = 5) -> List[Dict[str, Any]]:
     """استرجاع آخر الطلبات بحد أقصى محدد"""
     try:
@@ -641,7 +928,7 @@ async def get_recent_orders(limit: int = 5) -> List[Dict[str, Any]]:
             LIMIT ?
         """
 
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = dict_factory
             cursor = await db.execute(query, (limit,))
             orders = await cursor.fetchall()
@@ -662,58 +949,31 @@ async def get_order_by_id(order_id: str) -> Optional[Dict[str, Any]]:
         بيانات الطلب أو None إذا لم يكن موجودًا
     """
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
 
-            # التحقق مما إذا كان عمود remains موجودًا
-            cursor = await db.execute("PRAGMA table_info(orders)")
-            columns = await cursor.fetchall()
-            column_names = [column[1] for column in columns]
-            has_remains = "remains" in column_names
-
             # البحث أولاً عن الطلب باستخدام order_id
-            if has_remains:
-                query = """
-                    SELECT 
-                        o.id as id,
-                        o.order_id,
-                        o.user_id,
-                        u.username,
-                        u.full_name,
-                        o.service_id,
-                        o.service_name,
-                        o.link,
-                        o.quantity,
-                        o.amount,
-                        o.status,
-                        o.remains,
-                        o.created_at,
-                        IFNULL(o.updated_at, o.created_at) as updated_at
-                    FROM orders o
-                    LEFT JOIN users u ON o.user_id = u.user_id
-                    WHERE o.order_id = ?
-                """
-            else:
-                query = """
-                    SELECT 
-                        o.id as id,
-                        o.order_id,
-                        o.user_id,
-                        u.username,
-                        u.full_name,
-                        o.service_id,
-                        o.service_name,
-                        o.link,
-                        o.quantity,
-                        o.amount,
-                        o.status,
-                        o.quantity as remains,
-                        o.created_at,
-                        IFNULL(o.updated_at, o.created_at) as updated_at
-                    FROM orders o
-                    LEFT JOIN users u ON o.user_id = u.user_id
-                    WHERE o.order_id = ?
-                """
+            remains_column = "o.remains" if get_schema_capabilities().has_column("orders", "remains") else "o.quantity"
+            query = f"""
+                SELECT 
+                    o.id as id,
+                    o.order_id,
+                    o.user_id,
+                    u.username,
+                    u.full_name,
+                    o.service_id,
+                    o.service_name,
+                    o.link,
+                    o.quantity,
+                    o.amount,
+                    o.status,
+                    {remains_column} as remains,
+                    o.created_at,
+                    IFNULL(o.updated_at, o.created_at) as updated_at
+                FROM orders o
+                LEFT JOIN users u ON o.user_id = u.user_id
+                WHERE o.order_id = ?
+            """
 
             cursor = await db.execute(query, (order_id,))
             order = await cursor.fetchone()
@@ -773,18 +1033,12 @@ async def update_order_remains_simple(order_id: str, remains: int) -> bool:
             logger.error("معرف الطلب فارغ، تعذر تحديث الكمية المتبقية")
             return False
         
-        async with aiosqlite.connect(DB_PATH) as db:
-            # تحقق من وجود العمود
-            cursor = await db.execute("PRAGMA table_info(orders)")
-            columns = await cursor.fetchall()
-            column_names = [column[1] for column in columns]
-            
-            if "remains" not in column_names:
-                # إضافة عمود remains إذا لم يكن موجودًا
-                await db.execute("ALTER TABLE orders ADD COLUMN remains INTEGER DEFAULT NULL")
-                await db.commit()
-                logger.info("تمت إضافة عمود remains إلى جدول orders")
-            
+        # عمود remains يُضاف عبر migration 9، ولا يتم تعديل البنية أثناء التشغيل
+        if not get_schema_capabilities().has_column("orders", "remains"):
+            logger.error("عمود remains غير موجود في جدول orders، تعذر تحديث الكمية المتبقية")
+            return False
+        
+        async with get_connection() as db:
             # جلب حالة الطلب الحالية و user_id للاستخدام في فحص الترقية
             cursor = await db.execute(
                 "SELECT status, user_id FROM orders WHERE order_id = ?",
@@ -820,10 +1074,13 @@ async def update_order_remains_simple(order_id: str, remains: int) -> bool:
             
             # تنفيذ تحديث الحالة إذا لزم الأمر
             if update_status and new_status:
+                row_ids = await get_order_row_ids(db, [order_id_str])
+                await apply_order_rollup(db, row_ids, -1)
                 await db.execute(
                     "UPDATE orders SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE order_id = ?",
                     (new_status, order_id_str)
                 )
+                await apply_order_rollup(db, row_ids)
                 logger.info(f"تم تحديث حالة الطلب #{order_id_str} من {current_status} إلى {new_status}")
                 
                 # سنقوم بفحص ترقية الرتبة بعد الcommit لضمان سلامة البيانات
@@ -841,23 +1098,124 @@ async def update_order_remains_simple(order_id: str, remains: int) -> bool:
         logger.error(f"خطأ في تحديث الكمية المتبقية للطلب #{order_id}: {e}")
         return False
 
+async def apply_order_status_updates(updates: List[Tuple[str, str, int]],
+                                     schedule: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """
+    تطبيق تحديثات الحالة والكمية المتبقية لدفعة طلبات في معاملة واحدة
+
+    يتم قراءة القيم الحالية للدفعة كاملة باستعلام واحد، ثم كتابة الصفوف التي
+    تغيرت فعلاً فقط باستخدام executemany وحفظها مرة واحدة.
+
+    Args:
+        updates: قائمة (معرف الطلب، الحالة الجديدة، الكمية المتبقية)
+        schedule: فترة الاستعلام التالية بالثواني لكل طلب تم فحصه (اختياري)
+
+    Returns:
+        List[Dict[str, Any]]: الطلبات التي تحولت إلى "completed" في هذه الدفعة
+        (order_id, user_id) لمعالجة اكتمالها بعد الحفظ
+    """
+    if not updates and not schedule:
+        return []
+
+    # توحيد القيم الجديدة (آخر قيمة لكل طلب هي المعتمدة)
+    new_values: Dict[str, Tuple[str, int]] = {}
+    for order_id, status, remains in updates:
+        order_id_str = str(order_id).strip()
+        if not order_id_str:
+            continue
+        try:
+            remains_value = max(0, int(remains))
+        except (ValueError, TypeError):
+            remains_value = 0
+        new_values[order_id_str] = ((status or "pending").lower().strip().replace(" ", "_"), remains_value)
+
+    if not new_values and not schedule:
+        return []
+
+    async with get_connection() as db:
+        try:
+            # حجز الكتابة من البداية حتى لا تتغير الصفوف بين القراءة والكتابة
+            await db.execute("BEGIN IMMEDIATE")
+
+            current: Dict[str, Tuple[Any, Any, Any]] = {}
+            order_ids = list(new_values)
+            for i in range(0, len(order_ids), 500):
+                chunk = order_ids[i:i + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                cursor = await db.execute(
+                    f"SELECT order_id, user_id, status, remains FROM orders WHERE order_id IN ({placeholders})",
+                    chunk
+                )
+                for order_id, user_id, status, remains in await cursor.fetchall():
+                    current[order_id] = (user_id, status, remains)
+
+            changed_rows = []
+            status_changed_ids = []
+            completed_orders = []
+            for order_id, (new_status, new_remains) in new_values.items():
+                if order_id not in current:
+                    continue
+                user_id, old_status, old_remains = current[order_id]
+                if old_status == new_status and old_remains == new_remains:
+                    continue
+
+                changed_rows.append((new_status, new_remains, order_id))
+                if old_status != new_status:
+                    status_changed_ids.append(order_id)
+                old_status_normalized = (old_status or "").lower().strip().replace(" ", "_")
+                if new_status == "completed" and old_status_normalized != "completed" and user_id:
+                    completed_orders.append({"order_id": order_id, "user_id": user_id})
+
+            if changed_rows:
+                row_ids = await get_order_row_ids(db, status_changed_ids)
+                await apply_order_rollup(db, row_ids, -1)
+                await db.executemany(
+                    "UPDATE orders SET status = ?, remains = ?, updated_at = CURRENT_TIMESTAMP WHERE order_id = ?",
+                    changed_rows
+                )
+                await apply_order_rollup(db, row_ids)
+
+            # تسجيل موعد الفحص التالي لكل طلب تم فحصه (حتى لو لم يتغير)
+            if schedule:
+                await db.executemany(
+                    """
+                    UPDATE orders
+                    SET poll_interval = ?, last_checked_at = CURRENT_TIMESTAMP,
+                        next_check_at = datetime('now', ?)
+                    WHERE order_id = ?
+                    """,
+                    [(int(interval), f"+{int(interval)} seconds", str(order_id))
+                     for order_id, interval in schedule.items()]
+                )
+            await db.commit()
+
+            logger.info(
+                f"تم تطبيق تحديثات دفعة الطلبات: {len(changed_rows)} متغير من أصل {len(new_values)}، "
+                f"{len(completed_orders)} مكتمل"
+            )
+            return completed_orders
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"خطأ في تطبيق تحديثات دفعة الطلبات: {e}")
+            raise
+
 async def get_user_count():
     """الحصول على عدد المستخدمين"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_connection(readonly=True) as db:
         cursor = await db.execute("SELECT COUNT(*) as count FROM users")
         result = await cursor.fetchone()
         return result[0] if result else 0
 
 async def get_deposit_count():
     """الحصول على عدد عمليات الإيداع"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_connection(readonly=True) as db:
         cursor = await db.execute("SELECT COUNT(*) as count FROM deposits")
         result = await cursor.fetchone()
         return result[0] if result else 0
 
 async def get_order_count():
     """الحصول على عدد الطلبات"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_connection(readonly=True) as db:
         cursor = await db.execute("SELECT COUNT(*) as count FROM orders")
         result = await cursor.fetchone()
         return result[0] if result else 0
@@ -870,7 +1228,7 @@ def dict_factory(cursor, row):
 
 async def get_all_users_simple(limit=None):
     """استرجاع جميع المستخدمين بشكل بسيط"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_connection(readonly=True) as db:
         # تنفيذ الاستعلام
         if limit:
             query = "SELECT * FROM users ORDER BY created_at DESC LIMIT ?"
@@ -912,7 +1270,7 @@ async def get_active_users(days=30):
     # حساب تاريخ البداية للفترة المحددة
     start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_connection(readonly=True) as db:
         # تنفيذ الاستعلام
         query = "SELECT * FROM users WHERE last_activity > ? ORDER BY last_activity DESC"
         cursor = await db.execute(query, (start_date,))
@@ -944,7 +1302,7 @@ async def get_active_users(days=30):
 
 async def get_system_stats():
     """استرجاع إحصائيات النظام العامة"""
-    async with aiosqlite.connect(DB_PATH) as db:
+    async with get_connection(readonly=True) as db:
         stats = {}
 
         # إجمالي عدد المستخدمين
@@ -990,7 +1348,7 @@ async def execute_query(query, params=None, fetch_one=False, fetch_all=False):
         النتيجة حسب المعلمات
     """
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with get_connection() as db:
             db.row_factory = dict_factory
             
             if params:
@@ -6,12 +6,11 @@
 
 import logging
 import sqlite3
-import aiosqlite
 import json
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
-import config
+from database.pool import get_connection
 
 # إعداد المسجل
 logger = logging.getLogger("smm_bot")
@@ -26,7 +25,7 @@ async def create_crypto_wallet(user_id: int, asset: str, network: str,
                              sub_account_id: str = None) -> int:
     """إنشاء محفظة عملة مشفرة للمستخدم"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             cursor = await db.execute(
                 """INSERT INTO crypto_wallets (user_id, asset, network, address, tag, sub_account_id) 
                    VALUES (?, ?, ?, ?, ?, ?)""",
@@ -46,7 +45,7 @@ async def create_crypto_wallet(user_id: int, asset: str, network: str,
 async def get_user_wallet(user_id: int, asset: str, network: str) -> Optional[Dict[str, Any]]:
     """الحصول على محفظة المستخدم"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             cursor = await db.execute(
@@ -63,7 +62,7 @@ async def get_user_wallet(user_id: int, asset: str, network: str) -> Optional[Di
 async def get_all_user_wallets(user_id: int) -> List[Dict[str, Any]]:
     """الحصول على جميع محافظ المستخدم"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             cursor = await db.execute(
@@ -83,7 +82,7 @@ async def create_crypto_transaction(user_id: int, transaction_type: str, amount:
                                   fee: float = 0, raw_data: dict = None) -> int:
     """إنشاء معاملة عملة مشفرة"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             raw_data_json = json.dumps(raw_data) if raw_data else None
             
             cursor = await db.execute(
@@ -110,7 +109,7 @@ async def update_crypto_transaction(transaction_id: int, status: str = None,
                                   admin_note: str = None) -> bool:
     """تحديث معاملة عملة مشفرة"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             updates = []
             params = []
             
@@ -157,7 +156,7 @@ async def update_crypto_transaction(transaction_id: int, status: str = None,
 async def get_crypto_transaction_by_id(transaction_id: int) -> Optional[Dict[str, Any]]:
     """الحصول على معاملة بواسطة المعرف"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             cursor = await db.execute(
@@ -185,7 +184,7 @@ async def get_crypto_transaction_by_id(transaction_id: int) -> Optional[Dict[str
 async def get_crypto_transaction_by_txid(txid: str) -> Optional[Dict[str, Any]]:
     """الحصول على معاملة بواسطة txid"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             cursor = await db.execute(
@@ -214,7 +213,7 @@ async def get_user_crypto_transactions(user_id: int, transaction_type: str = Non
                                      asset: str = None, limit: int = 50) -> List[Dict[str, Any]]:
     """الحصول على معاملات المستخدم"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             query = "SELECT * FROM crypto_transactions WHERE user_id = ?"
@@ -253,7 +252,7 @@ async def get_pending_crypto_transactions(transaction_type: str = None,
                                         asset: str = None) -> List[Dict[str, Any]]:
     """الحصول على المعاملات المعلقة"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             query = """SELECT ct.*, u.username, u.full_name 
@@ -293,7 +292,7 @@ async def get_pending_crypto_transactions(transaction_type: str = None,
 async def get_crypto_statistics() -> Dict[str, Any]:
     """الحصول على إحصائيات العملات المشفرة"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             # إجمالي المحافظ النشطة
@@ -338,7 +337,7 @@ async def get_crypto_statistics() -> Dict[str, Any]:
 async def deactivate_wallet(wallet_id: int) -> bool:
     """إلغاء تفعيل محفظة"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             await db.execute(
                 "UPDATE crypto_wallets SET is_active = 0, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
                 (wallet_id,)
@@ -4,19 +4,19 @@
 
 import logging
 import sqlite3
-import aiosqlite
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
-import config
-from database.core import update_user_balance, get_user
+from database.pool import get_connection
+from database.pagination import keyset_condition, split_page
+from database.core import apply_balance_change, get_user, invalidate_user_cache
 
 # إعداد المسجل
 logger = logging.getLogger("smm_bot")
 
 async def init_deposit_tables() -> None:
     """تهيئة جداول الإيداع"""
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection() as db:
         # جدول الإيداعات
         await db.execute('''
         CREATE TABLE IF NOT EXISTS deposits (
@@ -36,23 +36,7 @@ async def init_deposit_tables() -> None:
         )
         ''')
 
-        # التحقق من وجود عمود admin_id وإضافته إذا لم يكن موجودًا
-        cursor = await db.execute("PRAGMA table_info(deposits)")
-        columns = await cursor.fetchall()
-        column_names = [column[1] for column in columns]
-
-        # إضافة الأعمدة إذا لم تكن موجودة
-        if "admin_id" not in column_names:
-            await db.execute("ALTER TABLE deposits ADD COLUMN admin_id INTEGER")
-
-        if "admin_note" not in column_names:
-            await db.execute("ALTER TABLE deposits ADD COLUMN admin_note TEXT")
-
-        if "transaction_id" not in column_names:
-            await db.execute("ALTER TABLE deposits ADD COLUMN transaction_id TEXT")
-
-        if "receipt_info" not in column_names:
-            await db.execute("ALTER TABLE deposits ADD COLUMN receipt_info TEXT")
+        # الأعمدة الإضافية لقواعد البيانات القديمة تُضاف عبر migration 9
 
         await db.commit()
         logger.info("تم تهيئة جداول الإيداع بنجاح")
@@ -77,7 +61,7 @@ async def create_deposit_request(user_id: int, amount: float, payment_method: st
             logger.warning(f"محاولة إنشاء طلب إيداع بمبلغ غير صالح: {amount}")
             return -1
 
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             cursor = await db.execute('''
             INSERT INTO deposits (user_id, amount, payment_method, receipt_url, receipt_info, created_at, updated_at)
             VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
@@ -101,7 +85,7 @@ async def get_deposit_by_id(deposit_id: int) -> Optional[Dict[str, Any]]:
     Returns:
         قاموس يحتوي على معلومات طلب الإيداع أو None إذا لم يتم العثور عليه
     """
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection(readonly=True) as db:
         db.row_factory = sqlite3.Row # Corrected: Using sqlite3.Row for proper dictionary conversion
 
         query = """
@@ -126,7 +110,7 @@ async def get_user_deposits(user_id: int) -> Tuple[List[Dict[str, Any]], int]:
     Returns:
         قائمة بطلبات الإيداع والعدد الإجمالي
     """
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection(readonly=True) as db:
         db.row_factory = sqlite3.Row
 
         # الحصول على العدد الإجمالي
@@ -156,7 +140,7 @@ async def get_pending_deposits() -> Tuple[List[Dict[str, Any]], int]:
         (قائمة طلبات الإيداع المعلقة، العدد الإجمالي)
     """
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
 
             # الحصول على طلبات الإيداع المعلقة
@@ -188,7 +172,7 @@ async def get_all_deposits() -> Tuple[List[Dict[str, Any]], int]:
         (قائمة جميع طلبات الإيداع، العدد الإجمالي)
     """
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
 
             # الحصول على جميع طلبات الإيداع
@@ -211,6 +195,82 @@ async def get_all_deposits() -> Tuple[List[Dict[str, Any]], int]:
         logger.error(f"خطأ في الحصول على جميع طلبات الإيداع: {e}")
         return [], 0
 
+async def get_deposits_page(status: Optional[str] = None, user_id: Optional[int] = None,
+                            cursor: Optional[str] = None,
+                            limit: int = 5) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    الحصول على صفحة واحدة من طلبات الإيداع بالتصفح بالمفتاح
+
+    Args:
+        status: حالة طلبات الإيداع (None لجميع الحالات)
+        user_id: معرف المستخدم (None لجميع المستخدمين)
+        cursor: مؤشر الصفحة (None للصفحة الأولى)
+        limit: عدد العناصر في الصفحة
+
+    Returns:
+        (طلبات الصفحة، مؤشر الصفحة التالية أو None إذا كانت الأخيرة)
+    """
+    try:
+        conditions = []
+        params = []
+        if status:
+            conditions.append("d.status = ?")
+            params.append(status)
+
+        if user_id is not None:
+            conditions.append("d.user_id = ?")
+            params.append(user_id)
+
+        condition, cursor_params = keyset_condition(cursor, "d")
+        if condition:
+            conditions.append(condition)
+            params.extend(cursor_params)
+
+        query = """
+            SELECT d.*, u.username, u.full_name
+            FROM deposits d
+            LEFT JOIN users u ON d.user_id = u.user_id
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY d.created_at DESC, d.id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        async with get_connection(readonly=True) as db:
+            db.row_factory = sqlite3.Row
+            cursor_obj = await db.execute(query, params)
+            rows = [dict(row) for row in await cursor_obj.fetchall()]
+
+        return split_page(rows, limit)
+    except Exception as e:
+        logger.error(f"خطأ في الحصول على صفحة طلبات الإيداع: {e}")
+        return [], None
+
+async def count_deposits(status: Optional[str] = None, user_id: Optional[int] = None) -> int:
+    """عدد طلبات الإيداع، مع إمكانية التصفية حسب الحالة أو المستخدم"""
+    try:
+        conditions = []
+        params = []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+
+        query = "SELECT COUNT(*) FROM deposits"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        async with get_connection(readonly=True) as db:
+            cursor = await db.execute(query, params)
+            result = await cursor.fetchone()
+            return result[0] if result else 0
+    except Exception as e:
+        logger.error(f"خطأ في حساب عدد طلبات الإيداع: {e}")
+        return 0
+
 async def approve_deposit(deposit_id: int, admin_id: int = None, admin_note: str = None, transaction_id: str = None) -> bool:
     """
     الموافقة على طلب إيداع
@@ -249,21 +309,31 @@ async def approve_deposit(deposit_id: int, admin_id: int = None, admin_note: str
             # طرق الدفع الأخرى تستخدم الدولار مباشرة
             amount_usd = amount
 
-        # إضافة المبلغ بالدولار إلى رصيد المستخدم
-        balance_updated = await update_user_balance(user_id, amount_usd, "add")
-
-        if not balance_updated:
-            logger.error(f"فشل في تحديث رصيد المستخدم {user_id} لطلب الإيداع {deposit_id}")
-            return False
-
-        # تحديث حالة طلب الإيداع
-        async with aiosqlite.connect(config.DB_NAME) as db:
-            await db.execute('''
+        async with get_connection() as db:
+            # تغيير حالة الطلب وإضافة الرصيد في معاملة واحدة؛ شرط status = 'pending'
+            # يمنع إضافة المبلغ مرتين عند الموافقة المتزامنة على نفس الطلب
+            await db.execute("BEGIN IMMEDIATE")
+            cursor = await db.execute('''
             UPDATE deposits
             SET status = 'approved', updated_at = CURRENT_TIMESTAMP, admin_id = ?, admin_note = ?, transaction_id = ?
-            WHERE id = ?
+            WHERE id = ? AND status = 'pending'
             ''', (admin_id, admin_note, transaction_id, deposit_id))
+
+            if cursor.rowcount == 0:
+                await db.rollback()
+                logger.warning(f"طلب الإيداع {deposit_id} لم يعد معلقًا")
+                return False
+
+            # إضافة المبلغ بالدولار إلى رصيد المستخدم
+            balance_updated = await apply_balance_change(db, user_id, amount_usd, "add", "deposit", str(deposit_id))
+
+            if not balance_updated:
+                await db.rollback()
+                logger.error(f"فشل في تحديث رصيد المستخدم {user_id} لطلب الإيداع {deposit_id}")
+                return False
+
             await db.commit()
+        invalidate_user_cache(user_id)
 
         logger.info(f"تمت الموافقة على طلب الإيداع {deposit_id} للمستخدم {user_id} بمبلغ {amount}")
         return True
@@ -283,7 +353,7 @@ async def update_deposit_transaction_id(deposit_id: int, transaction_id: str) ->
         True إذا نجحت العملية، False إذا فشلت
     """
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             await db.execute('''
             UPDATE deposits
             SET transaction_id = ?, updated_at = CURRENT_TIMESTAMP
@@ -323,7 +393,7 @@ async def reject_deposit(deposit_id: int, admin_id: int = None, admin_note: str
             return False
 
         # تحديث حالة طلب الإيداع
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             await db.execute('''
             UPDATE deposits
             SET status = 'rejected', updated_at = CURRENT_TIMESTAMP, admin_id = ?, admin_note = ?
@@ -365,8 +435,6 @@ async def refund_deposit(deposit_id: int, admin_id: int = None, admin_note: str
         user_id = deposit["user_id"]
         amount = deposit["amount"]
         
-        # خصم المبلغ من رصيد المستخدم
-        from database.core import update_user_balance
         payment_method = deposit["payment_method"]
         
         # حساب المبلغ بالدولار إذا كانت طريقة الدفع بالدينار الجزائري
@@ -377,21 +445,31 @@ async def refund_deposit(deposit_id: int, admin_id: int = None, admin_note: str
             # طرق الدفع الأخرى تستخدم الدولار مباشرة
             amount_usd = amount
             
-        balance_updated = await update_user_balance(user_id, amount_usd, "subtract")
-        
-        if not balance_updated:
-            logger.error(f"فشل في تحديث رصيد المستخدم {user_id} لاسترداد طلب الإيداع {deposit_id}")
-            return False
-            
-        # تحديث حالة طلب الإيداع إلى "مسترد"
-        async with aiosqlite.connect(config.DB_NAME) as db:
-            await db.execute('''
+        async with get_connection() as db:
+            # تحديث حالة طلب الإيداع إلى "مسترد" وخصم المبلغ في معاملة واحدة
+            await db.execute("BEGIN IMMEDIATE")
+            cursor = await db.execute('''
             UPDATE deposits
             SET status = 'refunded', updated_at = CURRENT_TIMESTAMP, admin_id = ?, 
                 admin_note = CASE WHEN ? IS NULL THEN admin_note ELSE ? END
-            WHERE id = ?
+            WHERE id = ? AND status = 'approved'
             ''', (admin_id, admin_note, admin_note, deposit_id))
+
+            if cursor.rowcount == 0:
+                await db.rollback()
+                logger.warning(f"طلب الإيداع {deposit_id} لم يعد في حالة الموافقة")
+                return False
+
+            # خصم المبلغ من رصيد المستخدم
+            balance_updated = await apply_balance_change(db, user_id, amount_usd, "subtract", "deposit_refund", str(deposit_id))
+            
+            if not balance_updated:
+                await db.rollback()
+                logger.error(f"فشل في تحديث رصيد المستخدم {user_id} لاسترداد طلب الإيداع {deposit_id}")
+                return False
+
             await db.commit()
+        invalidate_user_cache(user_id)
             
         logger.info(f"تم استرداد طلب الإيداع {deposit_id} للمستخدم {user_id} بمبلغ {amount}")
         return True
@@ -445,7 +523,7 @@ async def update_deposit_receipt(deposit_id: int, receipt_url: str = None, recei
         params.append(deposit_id)
 
         # تحديث طلب الإيداع
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             await db.execute(
                 f"UPDATE deposits SET {', '.join(updates)} WHERE id = ?",
                 params
@@ -466,7 +544,7 @@ async def get_deposit_stats() -> Dict[str, Dict[str, Any]]:
         قاموس يحتوي على إحصائيات طلبات الإيداع
     """
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             # دالة مساعدة لتحويل نتائج الاستعلام إلى قاموس
             def dict_factory(cursor, row):
                 d = {}
@@ -551,7 +629,7 @@ async def get_deposit_history(user_id: int, limit: int = 10) -> List[Dict[str, A
         قائمة بسجلات الإيداع
     """
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             cursor = await db.execute('''
             SELECT *
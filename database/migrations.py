@@ -6,21 +6,65 @@
 
 import logging
 import sqlite3
-import aiosqlite
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
-import config
+from database.pool import get_connection
+from database.rollups import rebuild_order_rollups
+from database.price_matrix import create_price_matrix_table
 
 # إعداد المسجل
 logger = logging.getLogger("smm_bot")
 
 # إصدار schema الحالي
-CURRENT_SCHEMA_VERSION = 5
+CURRENT_SCHEMA_VERSION = 13
+
+# الاستعلامات الأكثر استخدامًا مع قيم تجريبية لمعاملاتها (لتقرير خطط التنفيذ)
+HOT_QUERIES = {
+    "orders_by_order_id": ("SELECT status, user_id FROM orders WHERE order_id = ?", ("1",)),
+    "orders_by_user": ("SELECT * FROM orders WHERE user_id = ? ORDER BY created_at DESC LIMIT 5", (1,)),
+    "orders_recent": ("SELECT * FROM orders ORDER BY created_at DESC LIMIT 5", ()),
+    "orders_amount_since": ("SELECT SUM(amount) FROM orders WHERE created_at >= ?", ("2000-01-01",)),
+    "orders_active": ("SELECT id FROM orders WHERE status IN ('pending', 'processing') AND id > ? ORDER BY id LIMIT 500", (0,)),
+    "deposits_pending": ("SELECT * FROM deposits WHERE status = 'pending' ORDER BY created_at DESC", ()),
+    "deposits_by_user": ("SELECT * FROM deposits WHERE user_id = ? ORDER BY created_at DESC LIMIT 5", (1,)),
+    "users_active_since": ("SELECT COUNT(*) FROM users WHERE last_activity > ?", ("2000-01-01",)),
+    "users_recent": ("SELECT * FROM users ORDER BY created_at DESC LIMIT 10", ()),
+    "pricing_rules_lookup": (
+        "SELECT * FROM pricing_rules WHERE scope = ? AND ref_id = ? AND rank_id = ? AND is_active = 1",
+        ("service", 1, 1),
+    ),
+}
+
+async def explain_hot_queries(db) -> Dict[str, str]:
+    """
+    الحصول على خطة تنفيذ كل استعلام من الاستعلامات الأكثر استخدامًا
+
+    Returns:
+        Dict[str, str]: اسم الاستعلام -> ملخص خطة التنفيذ (EXPLAIN QUERY PLAN)
+    """
+    plans = {}
+    for name, (query, params) in HOT_QUERIES.items():
+        try:
+            cursor = await db.execute(f"EXPLAIN QUERY PLAN {query}", params)
+            rows = await cursor.fetchall()
+            plans[name] = " | ".join(row[3] for row in rows)
+        except Exception as e:
+            plans[name] = f"غير متاح ({e})"
+    return plans
+
+def format_query_plan_report(before: Dict[str, str], after: Dict[str, str]) -> str:
+    """تنسيق تقرير مقارنة خطط التنفيذ قبل وبعد إضافة الفهارس"""
+    lines = ["تقرير خطط تنفيذ الاستعلامات (قبل -> بعد):"]
+    for name in HOT_QUERIES:
+        lines.append(f"- {name}:")
+        lines.append(f"    قبل: {before.get(name, '-')}")
+        lines.append(f"    بعد: {after.get(name, '-')}")
+    return "\n".join(lines)
 
 async def init_migrations_table():
     """تهيئة جدول migrations لتتبع إصدارات قاعدة البيانات"""
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection() as db:
         await db.execute('''
         CREATE TABLE IF NOT EXISTS schema_migrations (
             version INTEGER PRIMARY KEY,
@@ -34,7 +78,7 @@ async def init_migrations_table():
 async def get_current_schema_version() -> int:
     """الحصول على إصدار schema الحالي"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             cursor = await db.execute(
                 "SELECT MAX(version) as version FROM schema_migrations"
             )
@@ -46,7 +90,7 @@ async def get_current_schema_version() -> int:
 
 async def apply_migration(version: int, description: str, migration_sql: str):
     """تطبيق migration معين"""
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection() as db:
         try:
             # تطبيق SQL statements
             for statement in migration_sql.split(';'):
@@ -68,7 +112,7 @@ async def apply_migration(version: int, description: str, migration_sql: str):
 
 async def migration_v1_services_and_categories():
     """Migration 1: إضافة جداول الخدمات والفئات"""
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection() as db:
         try:
             # إنشاء جدول categories أولاً
             await db.execute('''
@@ -125,7 +169,7 @@ async def migration_v1_services_and_categories():
 
 async def migration_v2_pricing_rules():
     """Migration 2: إضافة نظام قواعد التسعير"""
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection() as db:
         try:
             # إنشاء جدول pricing_rules
             await db.execute('''
@@ -169,7 +213,7 @@ async def migration_v2_pricing_rules():
 
 async def migration_v3_crypto_system():
     """Migration 3: إضافة نظام العملات المشفرة"""
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection() as db:
         try:
             # إنشاء جدول crypto_wallets
             await db.execute('''
@@ -247,7 +291,7 @@ async def migration_v4_enhanced_deposits():
     '''
     
     # تطبيق التعديلات بحذر (قد تكون الأعمدة موجودة)
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection() as db:
         try:
             # فحص الأعمدة الموجودة
             cursor = await db.execute("PRAGMA table_info(deposits)")
@@ -284,7 +328,7 @@ async def migration_v4_enhanced_deposits():
 
 async def migration_v5_purchase_based_ranks():
     """Migration 5: تحويل نظام الرتب إلى نظام معتمد على عدد المشتريات مع الخصومات التلقائية"""
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection() as db:
         try:
             # فحص الأعمدة الموجودة في جدول المستخدمين
             cursor = await db.execute("PRAGMA table_info(users)")
@@ -372,35 +416,256 @@ async def migration_v5_purchase_based_ranks():
             logger.error(f"فشل في تطبيق migration 5: {e}")
             raise
 
+async def migration_v6_orders_status_index():
+    """Migration 6: فهرس حالة الطلبات لاختيار الطلبات النشطة مباشرة من SQL"""
+    async with get_connection() as db:
+        try:
+            # الفهرس المركب (status, id) يخدم الاستعلام بالحالة مع التقدم بالمفتاح (keyset)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_id ON orders(status, id)")
+            
+            # تسجيل المigration كمطبق
+            await db.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (6, "فهرس حالة الطلبات")
+            )
+            await db.commit()
+            logger.info("تم تطبيق migration 6: فهرس حالة الطلبات")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"فشل في تطبيق migration 6: {e}")
+            raise
+
+async def migration_v7_order_poll_schedule():
+    """Migration 7: جدولة استعلام حالة كل طلب (موعد الفحص التالي وفترة الاستعلام)"""
+    async with get_connection() as db:
+        try:
+            # فحص الأعمدة الموجودة
+            cursor = await db.execute("PRAGMA table_info(orders)")
+            columns = await cursor.fetchall()
+            column_names = [column[1] for column in columns]
+            
+            # إضافة الأعمدة الجديدة إذا لم تكن موجودة
+            if "next_check_at" not in column_names:
+                await db.execute("ALTER TABLE orders ADD COLUMN next_check_at TIMESTAMP")
+            
+            if "poll_interval" not in column_names:
+                await db.execute("ALTER TABLE orders ADD COLUMN poll_interval INTEGER")
+            
+            if "last_checked_at" not in column_names:
+                await db.execute("ALTER TABLE orders ADD COLUMN last_checked_at TIMESTAMP")
+            
+            # تسجيل المigration كمطبق
+            await db.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (7, "جدولة استعلام حالة الطلبات")
+            )
+            await db.commit()
+            logger.info("تم تطبيق migration 7: جدولة استعلام حالة الطلبات")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"فشل في تطبيق migration 7: {e}")
+            raise
+
+async def migration_v8_wal_and_indexes():
+    """Migration 8: تفعيل وضع WAL وإضافة فهارس مسارات الوصول الأكثر استخدامًا"""
+    async with get_connection() as db:
+        try:
+            # وضع WAL دائم في ملف قاعدة البيانات: القراء لا ينتظرون الكاتب
+            cursor = await db.execute("PRAGMA journal_mode = WAL")
+            journal_mode = (await cursor.fetchone())[0]
+            logger.info(f"وضع سجل قاعدة البيانات: {journal_mode}")
+            
+            before = await explain_hot_queries(db)
+            
+            # الطلبات: البحث برقم الطلب، طلبات المستخدم مرتبة بالتاريخ، والإحصائيات حسب التاريخ
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders(user_id, created_at)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_created_amount ON orders(created_at, amount)")
+            
+            # الإيداعات: القوائم حسب الحالة أو المستخدم مرتبة بالتاريخ
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_deposits_status_created ON deposits(status, created_at)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_deposits_user_created ON deposits(user_id, created_at)")
+            
+            # المستخدمين: النشاط الأخير وتاريخ التسجيل
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_last_activity ON users(last_activity)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_created ON users(created_at)")
+            
+            # قواعد التسعير مغطاة مسبقًا بالفهرس idx_pricing_rules_composite (migration 2)
+            
+            # تحديث إحصائيات المخطط ليختار الفهارس الجديدة
+            await db.execute("ANALYZE")
+            
+            after = await explain_hot_queries(db)
+            logger.info(format_query_plan_report(before, after))
+            
+            # تسجيل المigration كمطبق
+            await db.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (8, "وضع WAL وفهارس الاستعلامات الأكثر استخدامًا")
+            )
+            await db.commit()
+            logger.info("تم تطبيق migration 8: وضع WAL والفهارس")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"فشل في تطبيق migration 8: {e}")
+            raise
+
+async def migration_v9_legacy_columns():
+    """Migration 9: نقل إضافة الأعمدة التي كانت تتم أثناء التشغيل إلى نظام migrations"""
+    async with get_connection() as db:
+        try:
+            # أعمدة جدول الطلبات (كانت تُضاف في init_db و update_order_remains_simple)
+            cursor = await db.execute("PRAGMA table_info(orders)")
+            columns = await cursor.fetchall()
+            column_names = [column[1] for column in columns]
+            
+            if "updated_at" not in column_names:
+                await db.execute("ALTER TABLE orders ADD COLUMN updated_at TIMESTAMP")
+                await db.execute("UPDATE orders SET updated_at = created_at WHERE updated_at IS NULL")
+            
+            if "remains" not in column_names:
+                await db.execute("ALTER TABLE orders ADD COLUMN remains INTEGER")
+                # الكمية المتبقية تساوي الكمية الأصلية، وصفر للطلبات المكتملة
+                await db.execute("UPDATE orders SET remains = quantity WHERE remains IS NULL")
+                await db.execute("UPDATE orders SET remains = 0 WHERE status = 'completed' OR status = 'Completed'")
+            
+            # أعمدة جدول الإيداعات (كانت تُضاف في init_deposit_tables)
+            cursor = await db.execute("PRAGMA table_info(deposits)")
+            columns = await cursor.fetchall()
+            column_names = [column[1] for column in columns]
+            
+            if "admin_id" not in column_names:
+                await db.execute("ALTER TABLE deposits ADD COLUMN admin_id INTEGER")
+            
+            if "admin_note" not in column_names:
+                await db.execute("ALTER TABLE deposits ADD COLUMN admin_note TEXT")
+            
+            if "transaction_id" not in column_names:
+                await db.execute("ALTER TABLE deposits ADD COLUMN transaction_id TEXT")
+            
+            if "receipt_info" not in column_names:
+                await db.execute("ALTER TABLE deposits ADD COLUMN receipt_info TEXT")
+            
+            # تسجيل المigration كمطبق
+            await db.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (9, "نقل إضافة أعمدة الطلبات والإيداعات إلى migrations")
+            )
+            await db.commit()
+            logger.info("تم تطبيق migration 9: أعمدة الطلبات والإيداعات")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"فشل في تطبيق migration 9: {e}")
+            raise
+
+async def migration_v10_keyset_pagination_indexes():
+    """Migration 10: فهارس التصفح بالمفتاح حسب (created_at, id)"""
+    async with get_connection() as db:
+        try:
+            # المعرف (rowid) مضمن في نهاية كل فهرس، فيكفي الفهرس على created_at لترتيب (created_at, id)
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_deposits_created ON deposits(created_at)")
+            
+            # تسجيل المigration كمطبق
+            await db.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (10, "فهارس التصفح بالمفتاح")
+            )
+            await db.commit()
+            logger.info("تم تطبيق migration 10: فهارس التصفح بالمفتاح")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"فشل في تطبيق migration 10: {e}")
+            raise
+
+async def migration_v11_balance_ledger():
+    """Migration 11: سجل حركات الرصيد"""
+    async with get_connection() as db:
+        try:
+            await db.execute('''
+            CREATE TABLE IF NOT EXISTS balance_ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                delta REAL NOT NULL,
+                balance_after REAL NOT NULL,
+                reason TEXT NOT NULL,
+                reference TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users (user_id)
+            )
+            ''')
+            
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_balance_ledger_user ON balance_ledger(user_id, id)")
+            await db.execute("CREATE INDEX IF NOT EXISTS idx_balance_ledger_created ON balance_ledger(created_at)")
+            
+            # رصيد افتتاحي لكل مستخدم لديه رصيد، حتى يطابق مجموع السجل الأرصدة الحالية
+            await db.execute('''
+            INSERT INTO balance_ledger (user_id, delta, balance_after, reason)
+            SELECT user_id, balance, balance, 'opening_balance'
+            FROM users
+            WHERE balance IS NOT NULL AND balance != 0
+            ''')
+            
+            # تسجيل المigration كمطبق
+            await db.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (11, "سجل حركات الرصيد")
+            )
+            await db.commit()
+            logger.info("تم تطبيق migration 11: سجل حركات الرصيد")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"فشل في تطبيق migration 11: {e}")
+            raise
+
+async def migration_v12_order_rollups():
+    """Migration 12: جداول تجميع المبيعات اليومية والساعية"""
+    async with get_connection() as db:
+        try:
+            # إنشاء الجداول وبناؤها من سجل الطلبات الحالي
+            await rebuild_order_rollups(db)
+            
+            # تسجيل المigration كمطبق
+            await db.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (12, "جداول تجميع المبيعات")
+            )
+            await db.commit()
+            logger.info("تم تطبيق migration 12: جداول تجميع المبيعات")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"فشل في تطبيق migration 12: {e}")
+            raise
+
+async def migration_v13_service_price_matrix():
+    """Migration 13: جدول مصفوفة الأسعار (خدمة × رتبة)"""
+    async with get_connection() as db:
+        try:
+            # يُملأ الجدول عند أول تحميل للمصفوفة بعد بدء التشغيل
+            await create_price_matrix_table(db)
+            
+            # تسجيل المigration كمطبق
+            await db.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                (13, "مصفوفة الأسعار")
+            )
+            await db.commit()
+            logger.info("تم تطبيق migration 13: مصفوفة الأسعار")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"فشل في تطبيق migration 13: {e}")
+            raise
+
 async def update_all_users_ranks_by_purchases(db):
     """تحديث رتب جميع المستخدمين حسب عدد المشتريات المكتملة"""
+    from database.ranks import recompute_ranks
+
     try:
-        # الحصول على جميع المستخدمين مع عدد مشترياتهم
-        cursor = await db.execute("SELECT user_id, completed_purchases FROM users")
-        users = await cursor.fetchall()
-        
-        for user_id, purchases in users:
-            # تحديد الرتبة المناسبة حسب عدد المشتريات
-            new_rank_id = 6  # جديد (افتراضي)
-            
-            if purchases >= 200:
-                new_rank_id = 1  # VIP
-            elif purchases >= 100:
-                new_rank_id = 2  # ماسي
-            elif purchases >= 75:
-                new_rank_id = 3  # ذهبي
-            elif purchases >= 50:
-                new_rank_id = 4  # فضي
-            elif purchases >= 25:
-                new_rank_id = 5  # برونزي
-            
-            # تحديث رتبة المستخدم
-            await db.execute(
-                "UPDATE users SET rank_id = ? WHERE user_id = ?",
-                (new_rank_id, user_id)
-            )
+        # عبارة UPDATE واحدة ضمن معاملة الـ migration
+        moves = await recompute_ranks(db)
         
-        logger.info(f"تم تحديث رتب {len(users)} مستخدم حسب عدد المشتريات")
+        logger.info(f"تم تحديث رتب {sum(moves.values())} مستخدم حسب عدد المشتريات")
     except Exception as e:
         logger.error(f"خطأ في تحديث رتب المستخدمين: {e}")
         raise
@@ -419,6 +684,14 @@ async def run_migrations():
         (3, migration_v3_crypto_system),
         (4, migration_v4_enhanced_deposits),
         (5, migration_v5_purchase_based_ranks),
+        (6, migration_v6_orders_status_index),
+        (7, migration_v7_order_poll_schedule),
+        (8, migration_v8_wal_and_indexes),
+        (9, migration_v9_legacy_columns),
+        (10, migration_v10_keyset_pagination_indexes),
+        (11, migration_v11_balance_ledger),
+        (12, migration_v12_order_rollups),
+        (13, migration_v13_service_price_matrix),
     ]
     
     for version, migration_func in migrations:
@@ -433,10 +706,10 @@ async def run_migrations():
 async def reset_database():
     """إعادة تعيين قاعدة البيانات (للتطوير فقط)"""
     logger.warning("تحذير: إعادة تعيين قاعدة البيانات!")
-    async with aiosqlite.connect(config.DB_NAME) as db:
+    async with get_connection() as db:
         # حذف جميع الجداول
         tables = [
-            'schema_migrations', 'crypto_transactions', 'crypto_wallets',
+            'schema_migrations', 'service_price_matrix', 'order_rollup_daily', 'order_rollup_hourly', 'balance_ledger', 'crypto_transactions', 'crypto_wallets',
             'pricing_rules', 'services', 'categories', 'deposits', 'orders', 'ranks', 'users'
         ]
         
@@ -0,0 +1,65 @@
+"""
+أدوات التصفح بالمفتاح (keyset pagination)
+
+تُرتب القوائم تنازليًا حسب (created_at, id)، وتحمل كل صفحة مؤشرًا معتمًا
+(opaque cursor) لآخر صف فيها. الصفحة التالية تبدأ مباشرة بعد هذا الصف عبر
+الفهرس بدلاً من OFFSET، فيبقى زمن جلب أي صفحة ثابتًا مهما كبر الجدول.
+"""
+
+import json
+import base64
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+# إعداد المسجل
+logger = logging.getLogger("smm_bot")
+
+def encode_cursor(created_at: Any, row_id: int) -> str:
+    """ترميز موضع صف (created_at, id) كمؤشر نصي معتم"""
+    raw = json.dumps([created_at, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[Any, int]]:
+    """
+    فك ترميز المؤشر
+
+    Returns:
+        (created_at, id) أو None إذا كان المؤشر فارغًا أو غير صالح
+    """
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return created_at, int(row_id)
+    except Exception as e:
+        logger.warning(f"مؤشر صفحة غير صالح: {e}")
+        return None
+
+def keyset_condition(cursor: Optional[str], alias: str, key: str = "id") -> Tuple[str, List[Any]]:
+    """
+    بناء شرط "بعد المؤشر" للترتيب التنازلي حسب (created_at, id)
+
+    Args:
+        cursor: مؤشر آخر صف في الصفحة السابقة (None للصفحة الأولى)
+        alias: اسم الجدول المستعار في الاستعلام
+        key: عمود المفتاح الأساسي (مثل user_id في جدول المستخدمين)
+
+    Returns:
+        (نص الشرط أو نص فارغ، المعاملات)
+    """
+    position = decode_cursor(cursor)
+    if position is None:
+        return "", []
+    return f"({alias}.created_at, {alias}.{key}) < (?, ?)", list(position)
+
+def split_page(rows: List[Dict[str, Any]], limit: int, key: str = "id") -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    فصل صف الفحص الإضافي عن الصفحة وإنشاء مؤشر الصفحة التالية
+
+    يجب أن يجلب الاستعلام limit + 1 صفًا: وجود الصف الإضافي يعني وجود صفحة تالية.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(last["created_at"], last[key])
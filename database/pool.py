@@ -0,0 +1,236 @@
+"""
+مجمع اتصالات قاعدة البيانات
+
+يحتفظ هذا الملف باتصالات aiosqlite طويلة العمر بدلاً من فتح اتصال جديد
+(وخيط عامل جديد) في كل استعلام:
+
+- اتصال كتابة واحد مخصص: كل عمليات الكتابة تمر عبره بالتسلسل، مما يمنع
+  تعارض الأقفال بين الكتّاب
+- عدة اتصالات قراءة (للقراءة فقط) تخدم الاستعلامات بالتوازي
+
+الاتصال قابل لإعادة الدخول داخل نفس المهمة: إذا طلبت مهمة تحجز اتصال الكتابة
+اتصالاً آخر (قراءة أو كتابة) تحصل على نفس الاتصال، فلا تنتظر نفسها. وإذا لم
+يتم تهيئة المجمع بعد (مثل تشغيل سكربت مستقل) يُفتح اتصال مباشر كالسابق.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, AsyncIterator, List
+
+import aiosqlite
+
+import config
+
+# إعداد المسجل
+logger = logging.getLogger("smm_bot")
+
+# عدد اتصالات القراءة في المجمع
+DB_POOL_READERS = int(os.getenv("DB_POOL_READERS", "4"))
+# مهلة انتظار قفل قاعدة البيانات بالثواني (busy timeout)
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "30"))
+# حجم ذاكرة الصفحات المؤقتة لكل اتصال بالكيلوبايت
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+# حجم الملف المعيّن في الذاكرة (mmap) لكل اتصال بالميغابايت، 0 لتعطيله
+DB_MMAP_SIZE_MB = int(os.getenv("DB_MMAP_SIZE_MB", "128"))
+
+class _Hold:
+    """اتصال تحجزه مهمة معينة"""
+
+    __slots__ = ("connection", "is_writer")
+
+    def __init__(self, connection: aiosqlite.Connection, is_writer: bool):
+        self.connection = connection
+        self.is_writer = is_writer
+
+# حالة المجمع
+_writer: Optional[aiosqlite.Connection] = None
+_writer_lock: Optional[asyncio.Lock] = None
+_readers: List[aiosqlite.Connection] = []
+_idle_readers: Optional[asyncio.Queue] = None
+_holds: Dict[asyncio.Task, _Hold] = {}
+
+# عدادات المراقبة
+_stats = {
+    "writer_acquisitions": 0,
+    "writer_wait_total": 0.0,
+    "writer_wait_max": 0.0,
+    "reader_acquisitions": 0,
+    "reader_wait_total": 0.0,
+    "reader_wait_max": 0.0,
+    "reentrant_uses": 0,
+    "direct_connections": 0,
+    "rollbacks_on_release": 0,
+}
+
+def is_pool_initialized() -> bool:
+    """التحقق مما إذا كان المجمع جاهزًا"""
+    return _writer is not None
+
+def holds_writer() -> bool:
+    """التحقق مما إذا كانت المهمة الحالية تحجز اتصال الكتابة"""
+    hold = _holds.get(asyncio.current_task())
+    return hold is not None and hold.is_writer
+
+async def _apply_pragmas(connection: aiosqlite.Connection) -> None:
+    """
+    ضبط إعدادات الأداء الخاصة بالاتصال
+
+    وضع WAL نفسه دائم ويُفعَّل مرة واحدة عبر migration 8، أما هذه الإعدادات
+    فتُطبق على كل اتصال جديد. synchronous = NORMAL آمن مع WAL (لا يفقد إلا
+    آخر المعاملات عند انقطاع الكهرباء، دون إفساد قاعدة البيانات).
+    """
+    await connection.execute("PRAGMA synchronous = NORMAL")
+    # القيمة السالبة تعني الحجم بالكيلوبايت بدلاً من عدد الصفحات
+    await connection.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    await connection.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE_MB * 1024 * 1024}")
+    await connection.execute("PRAGMA temp_store = MEMORY")
+
+async def _open_connection(readonly: bool) -> aiosqlite.Connection:
+    """فتح اتصال جديد بقاعدة البيانات"""
+    connection = await aiosqlite.connect(config.DB_NAME, timeout=DB_BUSY_TIMEOUT)
+    await _apply_pragmas(connection)
+    if readonly:
+        # منع أي كتابة عرضية عبر اتصالات القراءة
+        await connection.execute("PRAGMA query_only = ON")
+    return connection
+
+async def init_db_pool(readers: int = DB_POOL_READERS) -> None:
+    """
+    تهيئة مجمع الاتصالات (يُستدعى مرة واحدة بعد تطبيق migrations)
+
+    Args:
+        readers: عدد اتصالات القراءة
+    """
+    global _writer, _writer_lock, _idle_readers
+
+    if _writer is not None:
+        return
+
+    _writer = await _open_connection(readonly=False)
+    _writer_lock = asyncio.Lock()
+    _idle_readers = asyncio.Queue()
+    for _ in range(max(1, readers)):
+        connection = await _open_connection(readonly=True)
+        _readers.append(connection)
+        _idle_readers.put_nowait(connection)
+
+    logger.info(f"تم تهيئة مجمع اتصالات قاعدة البيانات: اتصال كتابة واحد و{len(_readers)} اتصالات قراءة")
+
+async def close_db_pool() -> None:
+    """إغلاق جميع اتصالات المجمع"""
+    global _writer, _writer_lock, _idle_readers
+
+    if _writer is None:
+        return
+
+    connections = [_writer] + _readers
+    _writer = None
+    _writer_lock = None
+    _idle_readers = None
+    _readers.clear()
+    _holds.clear()
+
+    for connection in connections:
+        try:
+            await connection.close()
+        except Exception as e:
+            logger.error(f"خطأ أثناء إغلاق اتصال قاعدة البيانات: {e}")
+
+    logger.info("تم إغلاق مجمع اتصالات قاعدة البيانات")
+
+def _record_wait(kind: str, waited: float) -> None:
+    _stats[f"{kind}_acquisitions"] += 1
+    _stats[f"{kind}_wait_total"] += waited
+    if waited > _stats[f"{kind}_wait_max"]:
+        _stats[f"{kind}_wait_max"] = waited
+
+@asynccontextmanager
+async def get_connection(readonly: bool = False) -> AsyncIterator[aiosqlite.Connection]:
+    """
+    الحصول على اتصال من المجمع
+
+    عند تحرير الاتصال يتم التراجع عن أي معاملة لم تُحفظ (كما كان يحدث عند
+    إغلاق الاتصال المؤقت سابقًا) وإعادة row_factory إلى قيمته الأصلية.
+
+    Args:
+        readonly: True لاستخدام اتصال قراءة، False لاتصال الكتابة
+
+    Yields:
+        aiosqlite.Connection: الاتصال
+    """
+    if _writer is None:
+        # المجمع غير مهيأ: اتصال مباشر مؤقت
+        _stats["direct_connections"] += 1
+        async with aiosqlite.connect(config.DB_NAME, timeout=DB_BUSY_TIMEOUT) as db:
+            yield db
+        return
+
+    task = asyncio.current_task()
+    previous = _holds.get(task)
+
+    # إعادة الدخول: المهمة تحجز بالفعل اتصالاً مناسبًا
+    if previous is not None and (readonly or previous.is_writer):
+        _stats["reentrant_uses"] += 1
+        connection = previous.connection
+        row_factory = connection.row_factory
+        try:
+            yield connection
+        finally:
+            connection.row_factory = row_factory
+        return
+
+    start_time = time.monotonic()
+    if readonly:
+        idle_readers = _idle_readers
+        connection = await idle_readers.get()
+        _record_wait("reader", time.monotonic() - start_time)
+    else:
+        writer_lock = _writer_lock
+        await writer_lock.acquire()
+        connection = _writer
+        _record_wait("writer", time.monotonic() - start_time)
+
+    _holds[task] = _Hold(connection, not readonly)
+    row_factory = connection.row_factory
+    try:
+        yield connection
+    finally:
+        try:
+            if connection.in_transaction:
+                _stats["rollbacks_on_release"] += 1
+                await connection.rollback()
+        except Exception as e:
+            logger.error(f"خطأ أثناء تحرير اتصال قاعدة البيانات: {e}")
+        connection.row_factory = row_factory
+
+        if previous is not None:
+            _holds[task] = previous
+        else:
+            _holds.pop(task, None)
+
+        if readonly:
+            idle_readers.put_nowait(connection)
+        else:
+            writer_lock.release()
+
+def get_db_pool_stats() -> Dict[str, Any]:
+    """
+    الحصول على إحصائيات مجمع الاتصالات
+
+    Returns:
+        Dict[str, Any]: عدد مرات الحجز ومتوسط وأقصى زمن انتظار لكل نوع اتصال
+    """
+    writer_acquisitions = _stats["writer_acquisitions"]
+    reader_acquisitions = _stats["reader_acquisitions"]
+    return {
+        **_stats,
+        "initialized": _writer is not None,
+        "readers": len(_readers),
+        "idle_readers": _idle_readers.qsize() if _idle_readers is not None else 0,
+        "writer_busy": _writer_lock.locked() if _writer_lock is not None else False,
+        "writer_wait_avg": _stats["writer_wait_total"] / writer_acquisitions if writer_acquisitions else 0.0,
+        "reader_wait_avg": _stats["reader_wait_total"] / reader_acquisitions if reader_acquisitions else 0.0,
+    }
@@ -0,0 +1,347 @@
+"""
+مصفوفة الأسعار المحسوبة مسبقًا (خدمة × رتبة)
+
+لكل خدمة نشطة ولكل رتبة في سجل الرتب تُحفظ نسبة التعديل والرسوم
+الثابتة والقواعد المطبقة، في جدول service_price_matrix ونسخة منه في الذاكرة.
+حساب سعر طلب يصبح بحثًا واحدًا في الذاكرة:
+
+    السعر النهائي = السعر الأساسي × (1 + النسبة / 100) + الرسوم الثابتة
+
+وهي نفس معادلة calculate_service_price. تُعاد حسابات المصفوفة عند تغير قواعد
+التسعير أو أسعار الخدمات، وعند إعادة بناء جدول التسعير بعد انتهاء صلاحيته إذا
+تغيرت القواعد مباشرة في قاعدة البيانات، ولا تُكتب إلا الصفوف التي تغيرت فعلاً.
+
+ترتيب الأقفال: يُحجز _refresh_lock أولاً ثم اتصال الكتابة من المجمع. لذلك لا
+يجوز استدعاء refresh_price_matrix من مهمة تحجز اتصال الكتابة (يُرفض الاستدعاء
+فورًا)، ومن داخل معاملة تُستخدم schedule_price_matrix_refresh بعد تحرير الاتصال.
+"""
+
+import io
+import csv
+import json
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from database.pool import get_connection, holds_writer
+
+# إعداد المسجل
+logger = logging.getLogger("smm_bot")
+
+# الأعمدة المحفوظة لكل صف، وتُقارن لتحديد الصفوف المتغيرة
+_ENTRY_FIELDS = ("external_id", "category_id", "base_price", "final_price",
+                 "percentage", "fixed_fee", "rank_discount", "rank_name", "applied_rules")
+
+# نسخة الذاكرة: (معرف الخدمة، معرف الرتبة) -> الصف
+_matrix: Dict[Tuple[int, int], Dict[str, Any]] = {}
+# معرف الخدمة لدى المزود (external_id) -> معرف الخدمة المحلي
+_by_external: Dict[int, int] = {}
+_loaded = False
+_refresh_lock = asyncio.Lock()
+# تحديث المصفوفة المجدول في الخلفية، وهل طُلب تحديث جديد أثناء تشغيله
+_refresh_task: Optional[asyncio.Task] = None
+_refresh_requested = False
+
+async def create_price_matrix_table(db) -> None:
+    """إنشاء جدول مصفوفة الأسعار (دون حفظ المعاملة)"""
+    await db.execute('''
+    CREATE TABLE IF NOT EXISTS service_price_matrix (
+        service_id INTEGER NOT NULL,
+        rank_id INTEGER NOT NULL,
+        external_id INTEGER,
+        category_id INTEGER,
+        base_price REAL NOT NULL,
+        final_price REAL NOT NULL,
+        percentage REAL NOT NULL DEFAULT 0,
+        fixed_fee REAL NOT NULL DEFAULT 0,
+        rank_discount REAL NOT NULL DEFAULT 0,
+        rank_name TEXT,
+        applied_rules TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (service_id, rank_id)
+    )
+    ''')
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_price_matrix_external ON service_price_matrix(external_id, rank_id)"
+    )
+
+def _store(entry: Dict[str, Any]) -> None:
+    """حفظ صف في نسخة الذاكرة"""
+    _matrix[(entry["service_id"], entry["rank_id"])] = entry
+    if entry.get("external_id") is not None:
+        _by_external[int(entry["external_id"])] = entry["service_id"]
+
+def _prune_external(service_ids: set) -> None:
+    """إزالة ربط معرفات المزود بالخدمات المحددة إذا لم يعد لها صف في المصفوفة"""
+    live = {
+        (key[0], int(entry["external_id"])) for key, entry in _matrix.items()
+        if key[0] in service_ids and entry.get("external_id") is not None
+    }
+    for external_id, service_id in list(_by_external.items()):
+        if service_id in service_ids and (service_id, external_id) not in live:
+            del _by_external[external_id]
+
+async def load_price_matrix() -> int:
+    """
+    تحميل المصفوفة من قاعدة البيانات إلى الذاكرة (يُستدعى عند بدء التشغيل)
+
+    إذا كان الجدول فارغًا تُبنى المصفوفة كاملة.
+
+    Returns:
+        int: عدد الصفوف المحملة
+    """
+    global _loaded
+
+    async with get_connection(readonly=True) as db:
+        cursor = await db.execute(
+            f"SELECT service_id, rank_id, {', '.join(_ENTRY_FIELDS)} FROM service_price_matrix"
+        )
+        rows = await cursor.fetchall()
+
+    _matrix.clear()
+    _by_external.clear()
+    for row in rows:
+        entry = dict(zip(("service_id", "rank_id") + _ENTRY_FIELDS, row))
+        entry["applied_rules"] = json.loads(entry["applied_rules"]) if entry["applied_rules"] else []
+        _store(entry)
+    _loaded = True
+
+    if not rows:
+        await refresh_price_matrix()
+
+    logger.info(f"تم تحميل مصفوفة الأسعار: {len(_matrix)} صف")
+    return len(_matrix)
+
+async def _compute_entries(services: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """حساب صفوف المصفوفة لقائمة خدمات ولجميع الرتب"""
+    from database.pricing import calculate_prices_bulk, build_applied_rules
+    from database.ranks import get_rank_registry
+
+    entries = []
+    if not services:
+        return entries
+
+    for rank_id in get_rank_registry().by_id:
+        pricing = await calculate_prices_bulk(
+            service_ids=[service["id"] for service in services],
+            base_prices=[service["base_price"] for service in services],
+            category_ids=[service["category_id"] for service in services],
+            user_rank_id=rank_id
+        )
+        for i, service in enumerate(services):
+            entries.append({
+                "service_id": service["id"],
+                "rank_id": rank_id,
+                "external_id": service.get("external_id"),
+                "category_id": service["category_id"],
+                "base_price": service["base_price"],
+                "final_price": pricing["final_prices"][i],
+                "percentage": pricing["percentages"][i],
+                "fixed_fee": pricing["fixed_fees"][i],
+                "rank_discount": pricing["rank_discount"],
+                "rank_name": pricing["rank_name"],
+                "applied_rules": build_applied_rules(
+                    pricing["rules"][i], rank_id, pricing["rank_discount"], pricing["rank_name"]
+                ),
+            })
+    return entries
+
+async def refresh_price_matrix(service_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """
+    إعادة حساب المصفوفة وكتابة الصفوف المتغيرة فقط
+
+    Args:
+        service_ids: الخدمات المطلوب إعادة حسابها (None لجميع الخدمات، وعندها
+            تُحذف أيضًا صفوف الخدمات التي لم تعد نشطة)
+
+    Returns:
+        Dict[str, int]: عدد الصفوف المحدثة والمحذوفة
+
+    Raises:
+        RuntimeError: إذا كانت المهمة الحالية تحجز اتصال الكتابة (انظر ترتيب الأقفال)
+    """
+    if holds_writer():
+        raise RuntimeError("لا يمكن تحديث مصفوفة الأسعار أثناء حجز اتصال الكتابة")
+
+    stats = {"updated": 0, "removed": 0}
+    try:
+        async with _refresh_lock:
+            full = service_ids is None
+            ids = None if full else sorted({int(service_id) for service_id in service_ids})
+            if ids == []:
+                return stats
+
+            async with get_connection(readonly=True) as db:
+                query = "SELECT id, external_id, category_id, base_price FROM services WHERE is_active = 1"
+                params: List[Any] = []
+                if not full:
+                    query += f" AND id IN ({', '.join('?' for _ in ids)})"
+                    params = ids
+                cursor = await db.execute(query, params)
+                services = [
+                    {"id": row[0], "external_id": row[1], "category_id": row[2], "base_price": row[3] or 0}
+                    for row in await cursor.fetchall()
+                ]
+
+            entries = await _compute_entries(services)
+            computed_keys = {(entry["service_id"], entry["rank_id"]) for entry in entries}
+
+            changed = [
+                entry for entry in entries
+                if any(_matrix.get((entry["service_id"], entry["rank_id"]), {}).get(field) != entry[field]
+                       for field in _ENTRY_FIELDS)
+            ]
+
+            # الصفوف التي لم تعد محسوبة (خدمة معطلة أو محذوفة)
+            if full:
+                scope = list(_matrix)
+            else:
+                id_set = set(ids)
+                scope = [key for key in _matrix if key[0] in id_set]
+            stale = [key for key in scope if key not in computed_keys]
+
+            if changed or stale:
+                async with get_connection() as db:
+                    await db.execute("BEGIN IMMEDIATE")
+                    if changed:
+                        await db.executemany(f'''
+                        INSERT INTO service_price_matrix (service_id, rank_id, {', '.join(_ENTRY_FIELDS)}, updated_at)
+                        VALUES (?, ?, {', '.join('?' for _ in _ENTRY_FIELDS)}, CURRENT_TIMESTAMP)
+                        ON CONFLICT (service_id, rank_id) DO UPDATE SET
+                            {', '.join(f"{field} = excluded.{field}" for field in _ENTRY_FIELDS)},
+                            updated_at = CURRENT_TIMESTAMP
+                        ''', [
+                            (entry["service_id"], entry["rank_id"])
+                            + tuple(json.dumps(entry[field], ensure_ascii=False) if field == "applied_rules" else entry[field]
+                                    for field in _ENTRY_FIELDS)
+                            for entry in changed
+                        ])
+                    if stale:
+                        await db.executemany(
+                            "DELETE FROM service_price_matrix WHERE service_id = ? AND rank_id = ?",
+                            stale
+                        )
+                    await db.commit()
+
+            # تحديث نسخة الذاكرة بعد الحفظ فقط
+            for key in stale:
+                _matrix.pop(key, None)
+            for entry in changed:
+                _store(entry)
+            _prune_external({key[0] for key in stale} | {entry["service_id"] for entry in changed})
+
+            stats["updated"] = len(changed)
+            stats["removed"] = len(stale)
+            if changed or stale:
+                logger.info(f"تم تحديث مصفوفة الأسعار: {stats}")
+            return stats
+    except Exception as e:
+        logger.error(f"خطأ في تحديث مصفوفة الأسعار: {e}")
+        return stats
+
+async def _run_scheduled_refreshes() -> None:
+    """تنفيذ التحديثات المطلوبة حتى لا يبقى طلب جديد"""
+    global _refresh_requested
+    while _refresh_requested:
+        _refresh_requested = False
+        await refresh_price_matrix()
+
+def schedule_price_matrix_refresh() -> None:
+    """
+    جدولة تحديث كامل للمصفوفة في الخلفية
+
+    آمن للاستدعاء في أي وقت. إذا كان هناك تحديث جارٍ يُعاد التحديث بعده مرة
+    واحدة، لأن التحديث الجاري ربما حسب الأسعار قبل التعديل الأخير.
+    """
+    global _refresh_task, _refresh_requested
+    _refresh_requested = True
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_run_scheduled_refreshes())
+
+async def _wait_for_scheduled_refresh() -> None:
+    """انتظار التحديث المجدول الجاري (إن وجد)"""
+    if _refresh_task is not None and not _refresh_task.done():
+        await asyncio.shield(_refresh_task)
+
+async def quote_price(service_id: int, rank_id: int, base_price: float,
+                      external: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    حساب سعر طلب من المصفوفة
+
+    Args:
+        service_id: معرف الخدمة (لدى المزود إذا كان external صحيحًا، وإلا المعرف المحلي)
+        rank_id: معرف رتبة المستخدم
+        base_price: السعر الأساسي للطلب (حسب الكمية)
+        external: True إذا كان المعرف هو معرف الخدمة لدى المزود
+
+    Returns:
+        نفس مفاتيح نتيجة calculate_service_price، أو None إذا لم تكن الخدمة في المصفوفة
+    """
+    if not _loaded:
+        await load_price_matrix()
+
+    # التأكد من صلاحية جدول التسعير وانتظار أي تحديث للمصفوفة ناتج عن إعادة بنائه
+    from database.pricing import get_pricing_table
+    await get_pricing_table()
+    await _wait_for_scheduled_refresh()
+
+    local_id = _by_external.get(int(service_id)) if external else int(service_id)
+    entry = _matrix.get((local_id, rank_id)) if local_id is not None else None
+    if entry is None:
+        return None
+
+    final_price = round(base_price * (1 + entry["percentage"] / 100) + entry["fixed_fee"], 4)
+    return {
+        "base_price": base_price,
+        "final_price": final_price,
+        "total_percentage": entry["percentage"],
+        "total_fixed_fee": entry["fixed_fee"],
+        "applied_rules": entry["applied_rules"],
+        "savings": base_price - final_price if final_price < base_price else 0,
+        "rank_discount": entry["rank_discount"],
+        "rank_name": entry["rank_name"],
+    }
+
+async def export_price_matrix_csv() -> str:
+    """
+    تصدير المصفوفة كاملة بصيغة CSV (خدمة واحدة لكل سطر، وعمود سعر لكل رتبة)
+
+    Returns:
+        str: محتوى ملف CSV
+    """
+    from database.ranks import get_rank_registry
+
+    ranks = get_rank_registry().all()
+    if not _loaded:
+        await load_price_matrix()
+    await _wait_for_scheduled_refresh()
+
+    async with get_connection(readonly=True) as db:
+        cursor = await db.execute("SELECT id, name FROM services WHERE is_active = 1 ORDER BY id")
+        names = dict(await cursor.fetchall())
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["service_id", "external_id", "name", "base_price"]
+                    + [f"rank_{rank['id']}_{rank['name']}" for rank in ranks])
+
+    for service_id in sorted({key[0] for key in _matrix}):
+        entries = [_matrix.get((service_id, rank["id"])) for rank in ranks]
+        first = next((entry for entry in entries if entry), None)
+        if first is None:
+            # لا صفوف لهذه الخدمة في الرتب الحالية
+            continue
+        writer.writerow(
+            [service_id, first["external_id"], names.get(service_id, ""), first["base_price"]]
+            + [entry["final_price"] if entry else "" for entry in entries]
+        )
+
+    return output.getvalue()
+
+def get_price_matrix_stats() -> Dict[str, Any]:
+    """إحصائيات نسخة الذاكرة من المصفوفة"""
+    return {
+        "loaded": _loaded,
+        "entries": len(_matrix),
+        "services": len({key[0] for key in _matrix}),
+    }
@@ -4,21 +4,87 @@
 يدير قواعد التسعير بالنسب والرسوم الثابتة حسب المستخدم والخدمة والفئة
 """
 
+import os
+import time
+import asyncio
 import logging
 import sqlite3
-import aiosqlite
 import json
 from typing import Dict, List, Optional, Any, Tuple
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 
-import config
+from database.pool import get_connection
+
+try:
+    # NumPy اختياري: يُستخدم لحساب أسعار الكتالوج كاملًا دفعة واحدة
+    import numpy as np
+except ImportError:
+    np = None
 
 # إعداد المسجل
 logger = logging.getLogger("smm_bot")
 
-# ذاكرة التخزين المؤقت للقواعد
-_pricing_rules_cache = {}
+# مدة صلاحية جدول التسعير المُجمّع بالثواني (لالتقاط أي تعديل مباشر على قاعدة البيانات)
+PRICING_TABLE_TTL = float(os.getenv("PRICING_TABLE_TTL", "300"))
+
+# المفتاح في جدول التسعير: (النطاق، معرف المرجع، معرف الرتبة)
+RuleKey = Tuple[str, Optional[int], Optional[int]]
+
+class CompiledPricingTable:
+    """
+    نسخة في الذاكرة من قواعد التسعير السارية وخصومات الرتب
+
+    القواعد مفهرسة حسب (scope, ref_id, rank_id) فيصبح حساب السعر عدة عمليات
+    بحث في قاموس بدلاً من استعلام لكل مستوى أولوية. الجدول يحتوي فقط القواعد
+    السارية لحظة بنائه، ويُستبدل عند أقرب بداية أو نهاية لفترة صلاحية قاعدة
+    (next_boundary) عبر مجدول التسعير، فلا يفحص البحث أي شرط زمني.
+    """
+
+    def __init__(self, rules: Dict[RuleKey, List[Dict[str, Any]]], ranks: Dict[int, Dict[str, Any]],
+                 scheduled: Optional[Dict[int, Dict[str, Any]]] = None,
+                 next_boundary: Optional[datetime] = None):
+        self.rules = rules
+        self.ranks = ranks
+        # جميع القواعد المفعلة (السارية والمجدولة): المعرف -> القاعدة
+        self.scheduled = scheduled or {}
+        self.active_ids = {rule["id"] for candidates in rules.values() for rule in candidates}
+        # أقرب لحظة (UTC) يتغير عندها مجموع القواعد السارية
+        self.next_boundary = next_boundary
+        self.rules_count = len(self.active_ids)
+        self.built_at = datetime.now()
+
+    def match(self, scope: str, ref_id: Optional[int], rank_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """أول قاعدة سارية للمفتاح المحدد"""
+        candidates = self.rules.get((scope, ref_id, rank_id))
+        return candidates[0] if candidates else None
+
+    def rank(self, rank_id: int) -> Dict[str, Any]:
+        """بيانات الرتبة (الاسم ونسبة الخصم)"""
+        return self.ranks.get(rank_id) or {"id": 6, "name": "جديد", "discount_percentage": 0.0}
+
+# جدول التسعير المُجمّع الحالي (يُستبدل بالكامل عند إعادة البناء)
+_pricing_rules_cache: Optional[CompiledPricingTable] = None
 _cache_expiry = None
+_pricing_build_lock = asyncio.Lock()
+
+# أحداث بدء وانتهاء العروض التي لم يعالجها مجدول التسعير بعد: (الحدث، القاعدة)
+_pending_rule_events: List[Tuple[str, Dict[str, Any]]] = []
+# يُضبط عند تعديل القواعد ليعيد المجدول حساب موعد الاستبدال التالي
+rules_changed_event = asyncio.Event()
+
+def _parse_rule_time(value: Any) -> Optional[datetime]:
+    """تحويل starts_at أو ends_at (بتوقيت UTC كما في CURRENT_TIMESTAMP) إلى datetime"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+        # الأوقات المحددة بفارق توقيت (مثل +03:00) تُحول إلى UTC قبل إزالة المنطقة
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    except ValueError:
+        logger.warning(f"صيغة وقت غير صالحة في قاعدة تسعير: {value}")
+        return None
 
 async def init_pricing_tables():
     """تهيئة جداول التسعير"""
@@ -31,7 +97,7 @@ async def create_pricing_rule(name: str, scope: str, ref_id: int = None,
                             starts_at: str = None, ends_at: str = None) -> int:
     """إنشاء قاعدة تسعير جديدة"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             cursor = await db.execute(
                 """INSERT INTO pricing_rules (name, scope, ref_id, rank_id, percentage, 
                    fixed_fee, created_by, starts_at, ends_at) 
@@ -41,12 +107,12 @@ async def create_pricing_rule(name: str, scope: str, ref_id: int = None,
             )
             await db.commit()
             rule_id = cursor.lastrowid
-            
-            # إلغاء ذاكرة التخزين المؤقت
-            await invalidate_pricing_cache()
-            
-            logger.info(f"تم إنشاء قاعدة تسعير جديدة: {rule_id} - {name}")
-            return rule_id
+        
+        # إلغاء ذاكرة التخزين المؤقت (بعد تحرير اتصال الكتابة)
+        await invalidate_pricing_cache()
+        
+        logger.info(f"تم إنشاء قاعدة تسعير جديدة: {rule_id} - {name}")
+        return rule_id
     except Exception as e:
         logger.error(f"خطأ في إنشاء قاعدة التسعير {name}: {e}")
         return -1
@@ -55,17 +121,26 @@ async def get_pricing_rules(scope: str = None, ref_id: int = None,
                           rank_id: int = None, active_only: bool = True) -> List[Dict[str, Any]]:
     """الحصول على قواعد التسعير"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        if active_only:
+            # القواعد السارية محفوظة في جدول التسعير المُجمّع
+            table = await get_pricing_table()
+            rules = [
+                dict(rule) for candidates in table.rules.values() for rule in candidates
+                if (not scope or rule["scope"] == scope)
+                and (ref_id is None or rule["ref_id"] == ref_id)
+                and (rank_id is None or rule["rank_id"] == rank_id)
+            ]
+            # نفس ترتيب الاستعلام: النطاق تنازليًا ثم الرتبة تصاعديًا (NULL أولاً)
+            rules.sort(key=lambda rule: (rule["rank_id"] is not None, rule["rank_id"] or 0, rule["id"]))
+            rules.sort(key=lambda rule: rule["scope"], reverse=True)
+            return rules
+        
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             query = "SELECT * FROM pricing_rules WHERE 1=1"
             params = []
             
-            if active_only:
-                query += " AND is_active = 1"
-                query += " AND (starts_at IS NULL OR starts_at <= CURRENT_TIMESTAMP)"
-                query += " AND (ends_at IS NULL OR ends_at >= CURRENT_TIMESTAMP)"
-            
             if scope:
                 query += " AND scope = ?"
                 params.append(scope)
@@ -88,14 +163,109 @@ async def get_pricing_rules(scope: str = None, ref_id: int = None,
         logger.error(f"خطأ في جلب قواعد التسعير: {e}")
         return []
 
+def _pricing_table_fresh() -> bool:
+    return (_pricing_rules_cache is not None and _cache_expiry is not None
+            and time.monotonic() < _cache_expiry)
+
+async def build_pricing_table(force: bool = True) -> CompiledPricingTable:
+    """
+    تحميل جميع القواعد النشطة والرتب وبناء جدول تسعير جديد ثم استبدال الحالي به
+
+    يُبنى الجدول كاملاً قبل استبداله، فلا يرى أي حساب سعر جدولاً نصف مبني.
+
+    Args:
+        force: False لتخطي البناء إذا بنت مهمة أخرى جدولاً صالحًا أثناء الانتظار
+    """
+    global _pricing_rules_cache, _cache_expiry
+
+    async with _pricing_build_lock:
+        if not force and _pricing_table_fresh():
+            return _pricing_rules_cache
+
+        rules: Dict[RuleKey, List[Dict[str, Any]]] = {}
+        ranks: Dict[int, Dict[str, Any]] = {}
+        scheduled: Dict[int, Dict[str, Any]] = {}
+        boundaries = []
+        now = datetime.utcnow()
+
+        async with get_connection(readonly=True) as db:
+            db.row_factory = sqlite3.Row
+
+            cursor = await db.execute(
+                "SELECT * FROM pricing_rules WHERE is_active = 1 ORDER BY id ASC"
+            )
+            for row in await cursor.fetchall():
+                rule = dict(row)
+                scheduled[rule["id"]] = rule
+
+                starts_at = _parse_rule_time(rule["starts_at"])
+                ends_at = _parse_rule_time(rule["ends_at"])
+                # القاعدة سارية طوال الثانية ends_at (كما في مقارنة CURRENT_TIMESTAMP سابقًا)
+                expires_at = ends_at + timedelta(seconds=1) if ends_at else None
+
+                if starts_at and starts_at > now:
+                    boundaries.append(starts_at)
+                    continue
+                if expires_at and expires_at <= now:
+                    continue
+                if expires_at:
+                    boundaries.append(expires_at)
+
+                # القواعد العامة لا ترتبط بمرجع
+                ref_id = None if rule["scope"] == "global" else rule["ref_id"]
+                rules.setdefault((rule["scope"], ref_id, rule["rank_id"]), []).append(rule)
+
+        # الرتب من السجل المحمّل في الذاكرة
+        from database.ranks import get_rank_registry
+        for rank in get_rank_registry().all():
+            ranks[rank["id"]] = rank
+
+        table = CompiledPricingTable(rules, ranks, scheduled, min(boundaries) if boundaries else None)
+        previous = _pricing_rules_cache
+        _pricing_rules_cache = table
+
+        # القواعد التي بدأت أو انتهت فترتها (وليست قواعد أُضيفت أو عُطلت يدويًا)
+        if previous is not None:
+            for rule_id in table.active_ids - previous.active_ids:
+                if rule_id in previous.scheduled:
+                    _pending_rule_events.append(("started", table.scheduled[rule_id]))
+            for rule_id in previous.active_ids - table.active_ids:
+                if rule_id in table.scheduled:
+                    _pending_rule_events.append(("ended", table.scheduled[rule_id]))
+        _cache_expiry = time.monotonic() + PRICING_TABLE_TTL
+        logger.info(f"تم بناء جدول التسعير: {table.rules_count} قاعدة نشطة و{len(ranks)} رتبة")
+        return table
+
+def pop_pricing_rule_events() -> List[Tuple[str, Dict[str, Any]]]:
+    """سحب أحداث بدء وانتهاء العروض المتراكمة منذ آخر استدعاء"""
+    events = list(_pending_rule_events)
+    _pending_rule_events.clear()
+    return events
+
+async def get_pricing_table() -> CompiledPricingTable:
+    """الحصول على جدول التسعير المُجمّع (يُبنى عند أول استخدام أو بعد انتهاء صلاحيته)"""
+    if _pricing_table_fresh():
+        return _pricing_rules_cache
+
+    previous = _pricing_rules_cache
+    table = await build_pricing_table(force=False)
+
+    # إعادة البناء بعد انتهاء الصلاحية قد تلتقط تعديلاً مباشرًا على القواعد،
+    # فتُحدَّث مصفوفة الأسعار أيضًا (في الخلفية لأن تحديثها يستخدم هذا الجدول)
+    if (previous is not None and table is not previous
+            and (table.active_ids != previous.active_ids or table.scheduled != previous.scheduled)):
+        from database.price_matrix import schedule_price_matrix_refresh
+        schedule_price_matrix_refresh()
+    return table
+
 async def calculate_service_price(service_id: int, base_price: float, 
                                 user_rank_id: int = 6, category_id: int = None) -> Dict[str, Any]:
     """حساب السعر النهائي للخدمة حسب قواعد التسعير وخصومات الرتب"""
     try:
-        # أولاً، الحصول على خصم الرتبة من نظام الرتب الجديد
-        from database.ranks import get_rank_by_id
+        table = await get_pricing_table()
         
-        rank_info = await get_rank_by_id(user_rank_id)
+        # أولاً، الحصول على خصم الرتبة من نظام الرتب الجديد
+        rank_info = table.rank(user_rank_id)
         rank_discount = rank_info.get('discount_percentage', 0.0)
         
         # الحصول على قواعد التسعير مع الأولوية
@@ -133,12 +303,10 @@ async def calculate_service_price(service_id: int, base_price: float,
             if priority is None:
                 continue
                 
-            scope, ref_id, rank_id = priority
-            rules = await get_pricing_rules(scope=scope, ref_id=ref_id, rank_id=rank_id)
+            rule = table.match(*priority)
             
-            if rules:
+            if rule:
                 # تطبيق أول قاعدة نشطة
-                rule = rules[0]
                 total_percentage += rule.get('percentage', 0)
                 total_fixed_fee += rule.get('fixed_fee', 0)
                 applied_rules.append({
@@ -184,6 +352,162 @@ async def calculate_service_price(service_id: int, base_price: float,
             'rank_name': 'غير محدد'
         }
 
+def _active_rules_by_ref(table: CompiledPricingTable, scope: str,
+                         rank_id: Optional[int]) -> Dict[int, Dict[str, Any]]:
+    """القواعد السارية لنطاق ورتبة محددين: معرف المرجع -> القاعدة"""
+    active = {}
+    for key_scope, ref_id, key_rank in table.rules:
+        if key_scope == scope and key_rank == rank_id and ref_id is not None:
+            rule = table.match(scope, ref_id, rank_id)
+            if rule:
+                active[ref_id] = rule
+    return active
+
+def _resolve_rules_vectorized(ids, levels: List[Dict[int, Dict[str, Any]]],
+                              rule_index: List[Dict[str, Any]], resolved) -> None:
+    """
+    تعيين رقم أول قاعدة متطابقة لكل عنصر من ids حسب ترتيب المستويات
+
+    لكل مستوى تُرتب معرفات المراجع ويُبحث عن جميع العناصر دفعة واحدة عبر
+    searchsorted. resolved تحمل رقم القاعدة في rule_index أو -1 إذا لم تتطابق.
+    """
+    for level in levels:
+        if not level:
+            continue
+        refs = np.array(sorted(level), dtype=np.int64)
+        numbers = np.empty(len(refs), dtype=np.int64)
+        for i, ref_id in enumerate(refs.tolist()):
+            numbers[i] = len(rule_index)
+            rule_index.append(level[ref_id])
+
+        positions = np.minimum(np.searchsorted(refs, ids), len(refs) - 1)
+        matched = (refs[positions] == ids) & (resolved < 0) & (ids > 0)
+        resolved[matched] = numbers[positions[matched]]
+
+async def calculate_prices_bulk(service_ids: List[int], base_prices: List[float],
+                                category_ids: List[Optional[int]],
+                                user_rank_id: int = 6) -> Dict[str, Any]:
+    """
+    حساب الأسعار النهائية لعدد كبير من الخدمات في استدعاء واحد
+
+    يطبق نفس أولوية calculate_service_price (خدمة+رتبة > خدمة > فئة+رتبة > فئة >
+    عام+رتبة > عام) من جدول التسعير المُجمّع، وتُحسب النسب والرسوم والأسعار
+    بعمليات NumPy على الكتالوج كاملًا. بدون NumPy تُحسب بحلقة عادية.
+
+    Args:
+        service_ids: معرفات الخدمات
+        base_prices: الأسعار الأساسية بنفس الترتيب
+        category_ids: معرفات الفئات بنفس الترتيب (None إذا لم تكن معروفة)
+        user_rank_id: معرف رتبة المستخدم
+
+    Returns:
+        Dict[str, Any]: final_prices و savings و percentages و fixed_fees و rules
+        (القاعدة المطبقة لكل خدمة أو None) كقوائم بنفس ترتيب المدخلات، مع
+        rank_discount و rank_name
+    """
+    table = await get_pricing_table()
+    rank_info = table.rank(user_rank_id)
+    rank_discount = rank_info.get('discount_percentage', 0.0) or 0.0
+
+    service_levels = [
+        _active_rules_by_ref(table, 'service', user_rank_id),
+        _active_rules_by_ref(table, 'service', None),
+    ]
+    category_levels = [
+        _active_rules_by_ref(table, 'category', user_rank_id),
+        _active_rules_by_ref(table, 'category', None),
+    ]
+    global_rule = table.match('global', None, user_rank_id) or table.match('global', None, None)
+
+    count = len(service_ids)
+    # خصم الرتبة يُطبق دائمًا كنسبة سالبة قبل القاعدة المطابقة
+    base_discount = -rank_discount if rank_discount > 0 else 0.0
+
+    if np is None:
+        rules = []
+        for service_id, category_id in zip(service_ids, category_ids):
+            rule = None
+            for level in service_levels:
+                rule = level.get(service_id)
+                if rule:
+                    break
+            if rule is None and category_id:
+                for level in category_levels:
+                    rule = level.get(category_id)
+                    if rule:
+                        break
+            rules.append(rule or global_rule)
+
+        final_prices, savings, percentages, fixed_fees = [], [], [], []
+        for base_price, rule in zip(base_prices, rules):
+            percentage = base_discount + (rule.get('percentage', 0) if rule else 0)
+            fixed_fee = rule.get('fixed_fee', 0) if rule else 0
+            final_price = round(base_price * (1 + percentage / 100) + fixed_fee, 4)
+            final_prices.append(final_price)
+            savings.append(base_price - final_price if final_price < base_price else 0)
+            percentages.append(percentage)
+            fixed_fees.append(fixed_fee)
+    else:
+        services = np.asarray(service_ids, dtype=np.int64).reshape(count)
+        categories = np.array([category_id or 0 for category_id in category_ids], dtype=np.int64).reshape(count)
+        prices = np.asarray(base_prices, dtype=np.float64).reshape(count)
+
+        rule_index: List[Dict[str, Any]] = []
+        resolved = np.full(count, -1, dtype=np.int64)
+        _resolve_rules_vectorized(services, service_levels, rule_index, resolved)
+        _resolve_rules_vectorized(categories, category_levels, rule_index, resolved)
+        if global_rule:
+            resolved[resolved < 0] = len(rule_index)
+            rule_index.append(global_rule)
+
+        # جدول نسب ورسوم القواعد المطابقة، مع صف أخير صفري للخدمات بدون قاعدة
+        rule_percentages = np.array([rule.get('percentage', 0) or 0 for rule in rule_index] + [0.0])
+        rule_fees = np.array([rule.get('fixed_fee', 0) or 0 for rule in rule_index] + [0.0])
+        resolved[resolved < 0] = len(rule_index)
+
+        percentages_array = base_discount + rule_percentages[resolved]
+        fees_array = rule_fees[resolved]
+        final_array = np.round(prices * (1 + percentages_array / 100) + fees_array, 4)
+        savings_array = np.where(final_array < prices, prices - final_array, 0.0)
+
+        final_prices = final_array.tolist()
+        savings = savings_array.tolist()
+        percentages = percentages_array.tolist()
+        fixed_fees = fees_array.tolist()
+        rules = [rule_index[number] if number < len(rule_index) else None for number in resolved.tolist()]
+
+    return {
+        'final_prices': final_prices,
+        'savings': savings,
+        'percentages': percentages,
+        'fixed_fees': fixed_fees,
+        'rules': rules,
+        'rank_discount': rank_discount,
+        'rank_name': rank_info.get('name', 'غير محدد')
+    }
+
+def build_applied_rules(rule: Optional[Dict[str, Any]], user_rank_id: int,
+                       rank_discount: float, rank_name: str) -> List[Dict[str, Any]]:
+    """بناء قائمة القواعد المطبقة بنفس صيغة calculate_service_price"""
+    applied_rules = []
+    if rank_discount > 0:
+        applied_rules.append({
+            'id': f'rank_{user_rank_id}',
+            'name': f'خصم رتبة {rank_name}',
+            'scope': 'rank_discount',
+            'percentage': -rank_discount,
+            'fixed_fee': 0
+        })
+    if rule:
+        applied_rules.append({
+            'id': rule['id'],
+            'name': rule['name'],
+            'scope': rule['scope'],
+            'percentage': rule['percentage'],
+            'fixed_fee': rule['fixed_fee']
+        })
+    return applied_rules
+
 async def get_pricing_preview(user_rank_id: int = 6) -> Dict[str, Any]:
     """معاينة التسعير لجميع الخدمات حسب رتبة المستخدم"""
     try:
@@ -192,6 +516,23 @@ async def get_pricing_preview(user_rank_id: int = 6) -> Dict[str, Any]:
         categories = await get_categories()
         preview = {'categories': [], 'total_services': 0, 'total_savings': 0}
         
+        # جلب جميع الخدمات مرة واحدة وتسعيرها دفعة واحدة
+        services_by_category: Dict[int, List[Dict[str, Any]]] = {}
+        for service in await get_services():
+            services_by_category.setdefault(service['category_id'], []).append(service)
+        
+        services = []
+        for category in categories:
+            services.extend(services_by_category.get(category['id'], []))
+        
+        pricing = await calculate_prices_bulk(
+            service_ids=[service['id'] for service in services],
+            base_prices=[service['base_price'] for service in services],
+            category_ids=[service['category_id'] for service in services],
+            user_rank_id=user_rank_id
+        )
+        
+        position = 0
         for category in categories:
             category_data = {
                 'id': category['id'],
@@ -200,31 +541,29 @@ async def get_pricing_preview(user_rank_id: int = 6) -> Dict[str, Any]:
                 'category_savings': 0
             }
             
-            services = await get_services(category_id=category['id'])
+            category_services = services_by_category.get(category['id'], [])
             
-            for service in services:
-                pricing = await calculate_service_price(
-                    service_id=service['id'],
-                    base_price=service['base_price'],
-                    user_rank_id=user_rank_id,
-                    category_id=category['id']
-                )
-                
+            for service in category_services:
+                savings = pricing['savings'][position]
                 service_data = {
                     'id': service['id'],
                     'name': service['name'],
-                    'base_price': pricing['base_price'],
-                    'final_price': pricing['final_price'],
-                    'savings': pricing['savings'],
-                    'applied_rules': pricing['applied_rules']
+                    'base_price': service['base_price'],
+                    'final_price': pricing['final_prices'][position],
+                    'savings': savings,
+                    'applied_rules': build_applied_rules(
+                        pricing['rules'][position], user_rank_id,
+                        pricing['rank_discount'], pricing['rank_name']
+                    )
                 }
+                position += 1
                 
                 category_data['services'].append(service_data)
-                category_data['category_savings'] += pricing['savings']
-                preview['total_savings'] += pricing['savings']
+                category_data['category_savings'] += savings
+                preview['total_savings'] += savings
             
             preview['categories'].append(category_data)
-            preview['total_services'] += len(services)
+            preview['total_services'] += len(category_services)
         
         return preview
         
@@ -237,7 +576,7 @@ async def update_pricing_rule(rule_id: int, name: str = None, percentage: float
                             starts_at: str = None, ends_at: str = None) -> bool:
     """تحديث قاعدة تسعير"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             # بناء استعلام التحديث ديناميكياً
             updates = []
             params = []
@@ -275,12 +614,12 @@ async def update_pricing_rule(rule_id: int, name: str = None, percentage: float
             query = f"UPDATE pricing_rules SET {', '.join(updates)} WHERE id = ?"
             await db.execute(query, params)
             await db.commit()
-            
-            # إلغاء ذاكرة التخزين المؤقت
-            await invalidate_pricing_cache()
-            
-            logger.info(f"تم تحديث قاعدة التسعير {rule_id}")
-            return True
+        
+        # إلغاء ذاكرة التخزين المؤقت (بعد تحرير اتصال الكتابة)
+        await invalidate_pricing_cache()
+        
+        logger.info(f"تم تحديث قاعدة التسعير {rule_id}")
+        return True
     except Exception as e:
         logger.error(f"خطأ في تحديث قاعدة التسعير {rule_id}: {e}")
         return False
@@ -288,15 +627,15 @@ async def update_pricing_rule(rule_id: int, name: str = None, percentage: float
 async def delete_pricing_rule(rule_id: int) -> bool:
     """حذف قاعدة تسعير"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             await db.execute("DELETE FROM pricing_rules WHERE id = ?", (rule_id,))
             await db.commit()
-            
-            # إلغاء ذاكرة التخزين المؤقت
-            await invalidate_pricing_cache()
-            
-            logger.info(f"تم حذف قاعدة التسعير {rule_id}")
-            return True
+        
+        # إلغاء ذاكرة التخزين المؤقت (بعد تحرير اتصال الكتابة)
+        await invalidate_pricing_cache()
+        
+        logger.info(f"تم حذف قاعدة التسعير {rule_id}")
+        return True
     except Exception as e:
         logger.error(f"خطأ في حذف قاعدة التسعير {rule_id}: {e}")
         return False
@@ -304,7 +643,7 @@ async def delete_pricing_rule(rule_id: int) -> bool:
 async def get_pricing_rule_by_id(rule_id: int) -> Optional[Dict[str, Any]]:
     """الحصول على قاعدة تسعير بواسطة المعرف"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             cursor = await db.execute("SELECT * FROM pricing_rules WHERE id = ?", (rule_id,))
@@ -316,16 +655,28 @@ async def get_pricing_rule_by_id(rule_id: int) -> Optional[Dict[str, Any]]:
         return None
 
 async def invalidate_pricing_cache():
-    """إلغاء ذاكرة التخزين المؤقت للتسعير"""
-    global _pricing_rules_cache, _cache_expiry
-    _pricing_rules_cache.clear()
-    _cache_expiry = None
-    logger.debug("تم إلغاء ذاكرة التخزين المؤقت للتسعير")
+    """إعادة بناء جدول التسعير المُجمّع بعد تعديل القواعد أو الرتب"""
+    global _cache_expiry
+    try:
+        await build_pricing_table()
+    except Exception as e:
+        # يُعاد البناء عند أول حساب سعر تالٍ
+        _cache_expiry = None
+        logger.error(f"خطأ في إعادة بناء جدول التسعير: {e}")
+        return
+
+    # قد تضيف القاعدة المعدلة موعد بدء أو انتهاء أقرب
+    rules_changed_event.set()
+
+    # تحديث صفوف مصفوفة الأسعار التي تأثرت بالتعديل (في الخلفية، فلا ينتظر
+    # المستدعي إعادة حساب الكتالوج كاملاً لكل الرتب)
+    from database.price_matrix import schedule_price_matrix_refresh
+    schedule_price_matrix_refresh()
 
 async def get_pricing_statistics() -> Dict[str, Any]:
     """الحصول على إحصائيات التسعير"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             # عدد القواعد النشطة
@@ -2,13 +2,15 @@
 وحدة إدارة رتب المستخدمين
 """
 
+import os
+import asyncio
 import logging
 import sqlite3
-import aiosqlite
+from bisect import bisect_right
 from typing import Dict, List, Optional, Any, Tuple
 
-import config
-from database.core import get_user
+from database.pool import get_connection
+from database.core import get_user, invalidate_user_cache
 
 # إعداد المسجل
 logger = logging.getLogger("smm_bot")
@@ -33,6 +35,115 @@ RANKS = {
     6: "جديد",       # 0+ مشتريات، بدون خصم
 }
 
+# الرتبة الافتراضية للمستخدمين الجدد
+DEFAULT_RANK_ID = 6
+
+# عدد المستخدمين في كل معاملة عند إعادة حساب الرتب دفعة واحدة
+RANK_UPDATE_CHUNK = int(os.getenv("RANK_UPDATE_CHUNK", "5000"))
+
+# الرتبة المستحقة لصف المستخدم: أعلى حد أدنى لا يتجاوز عدد مشترياته
+# (عند التساوي تُفضل الرتبة الأعلى، مثل RankRegistry.resolve)
+RANK_FOR_PURCHASES_SQL = f'''COALESCE((
+        SELECT r.id FROM ranks r
+        WHERE COALESCE(r.min_purchases, 0) <= COALESCE(users.completed_purchases, 0)
+        ORDER BY COALESCE(r.min_purchases, 0) DESC, r.id ASC
+        LIMIT 1
+    ), {DEFAULT_RANK_ID})'''
+
+# الرتب الافتراضية (نفس بيانات migration 5) قبل تحميلها من قاعدة البيانات:
+# (المعرف، الاسم، الرمز، الحد الأدنى للمشتريات، نسبة الخصم، الميزات)
+DEFAULT_RANKS = [
+    (1, "VIP", "👑", 200, 5.0, "DISCOUNT,PRIORITY,SPECIAL_OFFER,ALL"),
+    (2, "ماسي", "💎", 100, 10.0, "DISCOUNT,PRIORITY,SPECIAL_OFFER"),
+    (3, "ذهبي", "🥇", 75, 15.0, "DISCOUNT,PRIORITY"),
+    (4, "فضي", "🥈", 50, 20.0, "DISCOUNT"),
+    (5, "برونزي", "🥉", 25, 0.0, ""),
+    (6, "جديد", "🆕", 0, 0.0, ""),
+]
+
+class RankRegistry:
+    """
+    نسخة في الذاكرة من جدول الرتب
+
+    تحدد الرتبة المناسبة لعدد المشتريات بالبحث الثنائي (bisect) في قائمة
+    min_purchases المرتبة، وتقدم الأسماء والرموز والخصومات بدون قاعدة البيانات.
+    """
+
+    def __init__(self, ranks: List[Dict[str, Any]]):
+        self.by_id: Dict[int, Dict[str, Any]] = {}
+        for rank in ranks:
+            rank = dict(rank)
+            # تحويل سلسلة الميزات إلى قائمة
+            features = rank.get("features") or ""
+            rank["features"] = features.split(",") if isinstance(features, str) and features else list(features or [])
+            rank["min_purchases"] = rank.get("min_purchases") or 0
+            rank["discount_percentage"] = rank.get("discount_percentage") or 0.0
+            self.by_id[rank["id"]] = rank
+
+        # عند تساوي الحد الأدنى تُفضل الرتبة الأعلى (المعرف الأصغر)
+        ordered = sorted(self.by_id.values(), key=lambda rank: (rank["min_purchases"], -rank["id"]))
+        self._thresholds = [rank["min_purchases"] for rank in ordered]
+        self._rank_ids = [rank["id"] for rank in ordered]
+
+    @classmethod
+    def from_defaults(cls) -> "RankRegistry":
+        return cls([
+            {"id": rank_id, "name": name, "emoji": emoji, "min_purchases": min_purchases,
+             "discount_percentage": discount, "features": features}
+            for rank_id, name, emoji, min_purchases, discount, features in DEFAULT_RANKS
+        ])
+
+    def resolve(self, purchases: Optional[int]) -> int:
+        """معرف الرتبة المناسبة لعدد المشتريات المكتملة"""
+        index = bisect_right(self._thresholds, purchases or 0) - 1
+        return self._rank_ids[index] if index >= 0 else DEFAULT_RANK_ID
+
+    def get(self, rank_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """بيانات الرتبة أو None إذا لم تكن موجودة"""
+        return self.by_id.get(rank_id)
+
+    def all(self) -> List[Dict[str, Any]]:
+        """جميع الرتب مرتبة حسب المعرف"""
+        return [self.by_id[rank_id] for rank_id in sorted(self.by_id)]
+
+# السجل الحالي (يُستبدل بالكامل عند إعادة التحميل)
+_registry = RankRegistry.from_defaults()
+
+async def read_ranks(db) -> List[Dict[str, Any]]:
+    """قراءة جدول الرتب باستخدام اتصال قائم"""
+    cursor = await db.execute("SELECT * FROM ranks ORDER BY id ASC")
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in await cursor.fetchall()]
+
+async def load_rank_registry() -> RankRegistry:
+    """
+    تحميل الرتب من قاعدة البيانات (عند بدء التشغيل وبعد تعديل المشرف للرتب)
+
+    Returns:
+        RankRegistry: السجل المحمّل
+    """
+    global _registry
+
+    try:
+        async with get_connection(readonly=True) as db:
+            ranks = await read_ranks(db)
+        if ranks:
+            _registry = RankRegistry(ranks)
+            logger.info(f"تم تحميل سجل الرتب: {len(ranks)} رتبة")
+        else:
+            logger.warning("جدول الرتب فارغ، يتم استخدام الرتب الافتراضية")
+    except Exception as e:
+        logger.error(f"خطأ في تحميل سجل الرتب: {e}")
+    return _registry
+
+def get_rank_registry() -> RankRegistry:
+    """الحصول على سجل الرتب الحالي"""
+    return _registry
+
+def _copy_rank(rank: Dict[str, Any]) -> Dict[str, Any]:
+    """نسخة من بيانات الرتبة حتى لا يغير المستدعي السجل"""
+    return {**rank, "features": list(rank.get("features") or [])}
+
 async def init_ranks():
     """تهيئة جدول الرتب في قاعدة البيانات (مُعطل - يتم استخدام المigrations بدلاً منه)"""
     # هذه الدالة معطلة لتجنب التضارب مع نظام المigrations الجديد
@@ -41,68 +152,42 @@ async def init_ranks():
 
 async def get_all_ranks() -> List[Dict[str, Any]]:
     """الحصول على قائمة جميع الرتب"""
-    try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
-            db.row_factory = sqlite3.Row
-            cursor = await db.execute("SELECT * FROM ranks ORDER BY id ASC")
-            ranks = await cursor.fetchall()
-
-            # تحويل الرتب إلى قائمة من القواميس
-            result = []
-            for rank in ranks:
-                rank_dict = dict(rank)
-                # تحويل سلسلة الميزات إلى قائمة
-                features_str = rank_dict.get("features", "")
-                features = features_str.split(",") if features_str else []
-                rank_dict["features"] = features
-                result.append(rank_dict)
-
-            return result
-    except Exception as e:
-        logger.error(f"خطأ في الحصول على قائمة الرتب: {e}")
-        return []
+    return [_copy_rank(rank) for rank in _registry.all()]
 
 def get_rank_emoji(rank_id: int) -> str:
     """الحصول على رمز الرتبة"""
+    rank = _registry.get(rank_id)
+    if rank and rank.get("emoji"):
+        return rank["emoji"]
     return RANK_EMOJIS.get(rank_id, "🆕")  # استخدام رمز جديد كافتراضي
 
 def get_rank_name(rank_id: int) -> str:
     """الحصول على اسم الرتبة"""
+    rank = _registry.get(rank_id)
+    if rank and rank.get("name"):
+        return rank["name"]
     return RANKS.get(rank_id, "جديد")  # استخدام جديد كافتراضي
 
 async def get_user_rank(user_id: int) -> Dict[str, Any]:
     """الحصول على رتبة المستخدم"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
-            db.row_factory = sqlite3.Row
-
-            # الحصول على معرف رتبة المستخدم
-            cursor = await db.execute("SELECT rank_id FROM users WHERE user_id = ?", (user_id,))
-            result = await cursor.fetchone()
-
-            if not result:
-                # المستخدم غير موجود، استخدام الرتبة الافتراضية (جديد)
-                return {"id": 6, "name": "جديد", "features": []}
+        # الحصول على معرف رتبة المستخدم (من الذاكرة المؤقتة إن وجد)
+        user = await get_user(user_id)
 
-            rank_id = result["rank_id"] or 6  # استخدام 6 (جديد) إذا كانت القيمة NULL
+        if not user:
+            # المستخدم غير موجود، استخدام الرتبة الافتراضية (جديد)
+            return {"id": 6, "name": "جديد", "features": []}
 
-            # الحصول على معلومات الرتبة
-            cursor = await db.execute("SELECT * FROM ranks WHERE id = ?", (rank_id,))
-            rank = await cursor.fetchone()
+        rank_id = user.get("rank_id") or 6  # استخدام 6 (جديد) إذا كانت القيمة NULL
 
-            if not rank:
-                # الرتبة غير موجودة، استخدام الرتبة الافتراضية (جديد)
-                return {"id": 6, "name": "جديد", "features": []}
+        # الحصول على معلومات الرتبة من السجل
+        rank = _registry.get(rank_id)
 
-            # تحويل الرتبة إلى قاموس
-            rank_dict = dict(rank)
-
-            # تحويل سلسلة الميزات إلى قائمة
-            features_str = rank_dict.get("features", "")
-            features = features_str.split(",") if features_str else []
-            rank_dict["features"] = features
+        if not rank:
+            # الرتبة غير موجودة، استخدام الرتبة الافتراضية (جديد)
+            return {"id": 6, "name": "جديد", "features": []}
 
-            return rank_dict
+        return _copy_rank(rank)
     except Exception as e:
         logger.error(f"خطأ في الحصول على رتبة المستخدم: {e}")
         return {"id": 6, "name": "جديد", "features": []}
@@ -110,7 +195,7 @@ async def get_user_rank(user_id: int) -> Dict[str, Any]:
 async def update_user_rank(user_id: int, rank_id: int) -> bool:
     """تحديث رتبة المستخدم"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             # التحقق من وجود المستخدم
             cursor = await db.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
             if not await cursor.fetchone():
@@ -118,14 +203,14 @@ async def update_user_rank(user_id: int, rank_id: int) -> bool:
                 return False
 
             # التحقق من وجود الرتبة
-            cursor = await db.execute("SELECT id FROM ranks WHERE id = ?", (rank_id,))
-            if not await cursor.fetchone():
+            if _registry.get(rank_id) is None:
                 logger.warning(f"محاولة تعيين رتبة غير موجودة: {rank_id}")
                 return False
 
             # تحديث رتبة المستخدم
             await db.execute("UPDATE users SET rank_id = ? WHERE user_id = ?", (rank_id, user_id))
             await db.commit()
+            invalidate_user_cache(user_id)
 
             logger.info(f"تم تحديث رتبة المستخدم {user_id} إلى {rank_id}")
             return True
@@ -133,64 +218,114 @@ async def update_user_rank(user_id: int, rank_id: int) -> bool:
         logger.error(f"خطأ في تحديث رتبة المستخدم: {e}")
         return False
 
-async def update_users_ranks():
-    """تحديث رتب المستخدمين حسب عدد المشتريات المكتملة"""
+async def recompute_ranks(db, after_id: Optional[int] = None,
+                          until_id: Optional[int] = None) -> Dict[Tuple[Optional[int], int], int]:
+    """
+    إعادة حساب رتب المستخدمين بعبارة UPDATE واحدة (دون حفظ المعاملة)
+
+    Args:
+        db: اتصال قاعدة البيانات (داخل معاملة)
+        after_id: تبدأ الفترة بعد هذا المستخدم (None من البداية)
+        until_id: آخر مستخدم ضمن الفترة (None حتى النهاية)
+
+    Returns:
+        Dict: (الرتبة القديمة، الرتبة الجديدة) -> عدد المستخدمين المنقولين
+    """
+    conditions = []
+    params: List[Any] = []
+    if after_id is not None:
+        conditions.append("user_id > ?")
+        params.append(after_id)
+    if until_id is not None:
+        conditions.append("user_id <= ?")
+        params.append(until_id)
+    conditions.append(f"rank_id IS NOT {RANK_FOR_PURCHASES_SQL}")
+    where = " AND ".join(conditions)
+
+    # حصر الانتقالات قبل التحديث لإعداد التقرير
+    cursor = await db.execute(f'''
+    SELECT rank_id, {RANK_FOR_PURCHASES_SQL}, COUNT(*)
+    FROM users
+    WHERE {where}
+    GROUP BY 1, 2
+    ''', params)
+    moves = {(old_rank, new_rank): count for old_rank, new_rank, count in await cursor.fetchall()}
+
+    if moves:
+        await db.execute(f"UPDATE users SET rank_id = {RANK_FOR_PURCHASES_SQL} WHERE {where}", params)
+    return moves
+
+async def update_users_ranks(chunk_size: int = RANK_UPDATE_CHUNK) -> Optional[Dict[str, Any]]:
+    """
+    تحديث رتب المستخدمين حسب عدد المشتريات المكتملة
+
+    يُعاد الحساب على دفعات متتالية من user_id، كل دفعة في معاملة قصيرة مستقلة
+    حتى لا يُحجز قفل الكتابة عن محدث الطلبات وبقية العمليات طوال التحديث.
+
+    Args:
+        chunk_size: عدد المستخدمين في كل دفعة
+
+    Returns:
+        Dict: users و moved و promoted و demoted، و moves:
+        (الرتبة القديمة، الرتبة الجديدة) -> العدد. None عند الفشل
+    """
+    summary = {"users": 0, "moved": 0, "promoted": 0, "demoted": 0, "moves": {}}
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
-            db.row_factory = sqlite3.Row
-
-            # الحصول على جميع الرتب مرتبة تنازلياً حسب عدد المشتريات
-            cursor = await db.execute("SELECT id, min_purchases FROM ranks ORDER BY min_purchases DESC")
-            ranks = await cursor.fetchall()
-
-            # الحصول على جميع المستخدمين
-            cursor = await db.execute("SELECT user_id, completed_purchases FROM users")
-            users = await cursor.fetchall()
-
-            # تحديث رتبة كل مستخدم
-            for user in users:
-                user_id = user["user_id"]
-                purchases = user["completed_purchases"] or 0
-
-                # تحديد الرتبة المناسبة
-                new_rank_id = 6  # جديد (افتراضي)
-                for rank in ranks:
-                    if purchases >= rank["min_purchases"]:
-                        new_rank_id = rank["id"]
-                        break
-
-                # تحديث الرتبة إذا كانت مختلفة
-                await db.execute(
-                    "UPDATE users SET rank_id = ? WHERE user_id = ? AND (rank_id IS NULL OR rank_id != ?)",
-                    (new_rank_id, user_id, new_rank_id)
+        after_id = None
+        while True:
+            async with get_connection() as db:
+                # حدود الدفعة التالية حسب المفتاح الأساسي
+                cursor = await db.execute('''
+                SELECT COUNT(*), MAX(user_id) FROM (
+                    SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?
                 )
-
-            await db.commit()
-            logger.info("تم تحديث رتب المستخدمين بنجاح")
-            return True
+                ''', (after_id if after_id is not None else -1, chunk_size))
+                count, until_id = await cursor.fetchone()
+                if not count:
+                    break
+
+                await db.execute("BEGIN IMMEDIATE")
+                moves = await recompute_ranks(db, after_id, until_id)
+                await db.commit()
+
+            if moves:
+                invalidate_user_cache()
+            summary["users"] += count
+            for key, moved in moves.items():
+                summary["moves"][key] = summary["moves"].get(key, 0) + moved
+
+            after_id = until_id
+            # إفساح المجال لبقية المهام بين الدفعات
+            await asyncio.sleep(0)
+
+        for (old_rank, new_rank), moved in summary["moves"].items():
+            old_info = _registry.get(old_rank)
+            new_info = _registry.get(new_rank)
+            old_min = old_info["min_purchases"] if old_info else 0
+            new_min = new_info["min_purchases"] if new_info else 0
+            summary["moved"] += moved
+            summary["promoted" if new_min > old_min else "demoted"] += moved
+
+        logger.info(
+            f"تم تحديث رتب المستخدمين: {summary['moved']} من {summary['users']} "
+            f"(ترقية {summary['promoted']}، تخفيض {summary['demoted']})"
+        )
+        return summary
     except Exception as e:
         logger.error(f"خطأ في تحديث رتب المستخدمين: {e}")
-        return False
+        return None
 
 async def get_rank_by_id(rank_id: int) -> Dict[str, Any]:
     """Gets rank details by ID."""
-    try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
-            db.row_factory = sqlite3.Row
-            cursor = await db.execute("SELECT * FROM ranks WHERE id = ?", (rank_id,))
-            result = await cursor.fetchone()
-            if result:
-                return dict(result)
-            else:
-                return {"id": 6, "name": "جديد", "emoji": "🆕"}
-    except Exception as e:
-        logger.error(f"Error getting rank by ID: {e}")
-        return {"id": 6, "name": "جديد", "emoji": "🆕"}
+    rank = _registry.get(rank_id)
+    if rank:
+        return _copy_rank(rank)
+    return {"id": 6, "name": "جديد", "emoji": "🆕"}
 
 async def increment_user_purchases_and_check_rank(user_id: int) -> Dict[str, Any]:
     """زيادة عدد المشتريات المكتملة للمستخدم وفحص إمكانية الترقية التلقائية"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             db.row_factory = sqlite3.Row
             
             # زيادة عدد المشتريات المكتملة
@@ -214,17 +349,7 @@ async def increment_user_purchases_and_check_rank(user_id: int) -> Dict[str, Any
             current_rank_id = user["rank_id"]
             
             # تحديد الرتبة الجديدة المناسبة
-            new_rank_id = 6  # جديد (افتراضي)
-            if purchases >= 200:
-                new_rank_id = 1  # VIP
-            elif purchases >= 100:
-                new_rank_id = 2  # ماسي
-            elif purchases >= 75:
-                new_rank_id = 3  # ذهبي
-            elif purchases >= 50:
-                new_rank_id = 4  # فضي
-            elif purchases >= 25:
-                new_rank_id = 5  # برونزي
+            new_rank_id = _registry.resolve(purchases)
             
             # فحص إذا كانت هناك ترقية
             upgraded = False
@@ -239,25 +364,17 @@ async def increment_user_purchases_and_check_rank(user_id: int) -> Dict[str, Any
                 )
                 
                 # الحصول على معلومات الرتب للإشعار
-                cursor = await db.execute(
-                    "SELECT name, emoji, discount_percentage FROM ranks WHERE id = ?",
-                    (current_rank_id,)
-                )
-                old_rank_info = await cursor.fetchone()
-                
-                cursor = await db.execute(
-                    "SELECT name, emoji, discount_percentage FROM ranks WHERE id = ?",
-                    (new_rank_id,)
-                )
-                new_rank_info = await cursor.fetchone()
+                old_rank_info = _registry.get(current_rank_id)
+                new_rank_info = _registry.get(new_rank_id)
                 
                 upgraded = True
-                old_rank = dict(old_rank_info) if old_rank_info else None
-                new_rank = dict(new_rank_info) if new_rank_info else None
+                old_rank = {key: old_rank_info[key] for key in ("name", "emoji", "discount_percentage")} if old_rank_info else None
+                new_rank = {key: new_rank_info[key] for key in ("name", "emoji", "discount_percentage")} if new_rank_info else None
                 
                 logger.info(f"تمت ترقية المستخدم {user_id} من {current_rank_id} إلى {new_rank_id}")
             
             await db.commit()
+            invalidate_user_cache(user_id)
             
             return {
                 "upgraded": upgraded,
@@ -274,18 +391,12 @@ async def increment_user_purchases_and_check_rank(user_id: int) -> Dict[str, Any
 async def get_user_rank_discount(user_id: int) -> float:
     """الحصول على نسبة الخصم للمستخدم حسب رتبته"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
-            db.row_factory = sqlite3.Row
-            
-            cursor = await db.execute("""
-                SELECT r.discount_percentage 
-                FROM users u 
-                JOIN ranks r ON u.rank_id = r.id 
-                WHERE u.user_id = ?
-            """, (user_id,))
-            
-            result = await cursor.fetchone()
-            return result["discount_percentage"] if result else 0.0
+        user = await get_user(user_id)
+        if not user or user.get("rank_id") is None:
+            return 0.0
+
+        rank = _registry.get(user["rank_id"])
+        return rank["discount_percentage"] if rank else 0.0
             
     except Exception as e:
         logger.error(f"خطأ في الحصول على خصم المستخدم {user_id}: {e}")
@@ -294,13 +405,10 @@ async def get_user_rank_discount(user_id: int) -> float:
 async def get_user_purchases_count(user_id: int) -> int:
     """الحصول على عدد المشتريات المكتملة للمستخدم"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
-            cursor = await db.execute(
-                "SELECT completed_purchases FROM users WHERE user_id = ?",
-                (user_id,)
-            )
-            result = await cursor.fetchone()
-            return result[0] if result and result[0] is not None else 0
+        user = await get_user(user_id)
+        if not user or user.get("completed_purchases") is None:
+            return 0
+        return user["completed_purchases"]
             
     except Exception as e:
         logger.error(f"خطأ في الحصول على عدد مشتريات المستخدم {user_id}: {e}")
@@ -318,7 +426,7 @@ async def get_user_completed_purchases(user_id: int) -> int:
 async def create_ranks_table():
     """إنشاء جدول الرتب إذا لم يكن موجودًا"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             # إنشاء جدول الرتب
             await db.execute("""
             CREATE TABLE IF NOT EXISTS ranks (
@@ -0,0 +1,239 @@
+"""
+جداول تجميع المبيعات (rollups)
+
+تحتفظ بعدد الطلبات ومجموع مبالغها لكل (يوم أو ساعة، خدمة، حالة)، وتُحدَّث
+تدريجيًا داخل نفس معاملة إنشاء الطلب أو تغيير حالته. بذلك تصبح تقارير البيع
+(اليوم، الأسبوع، الشهر، العام) مجموعًا لعدد صغير من صفوف التجميع بدلاً من
+المرور على جدول الطلبات كاملًا.
+
+يُنسب الطلب دائمًا إلى يوم وساعة إنشائه (created_at كما هو مخزن)، وعند تغيير
+حالته يُنقل من صف الحالة القديمة إلى صف الحالة الجديدة في نفس الفترة.
+
+لإعادة بناء الجداول من سجل الطلبات:
+    python -m database.rollups
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from database.pool import get_connection
+
+# إعداد المسجل
+logger = logging.getLogger("smm_bot")
+
+# جداول التجميع ودالة استخراج الفترة من created_at لكل منها
+ROLLUP_TABLES = {
+    "order_rollup_daily": ("day", "substr(created_at, 1, 10)"),
+    "order_rollup_hourly": ("hour", "substr(created_at, 1, 13)"),
+}
+
+async def create_rollup_tables(db) -> None:
+    """إنشاء جداول التجميع (دون حفظ المعاملة)"""
+    for table, (period, _) in ROLLUP_TABLES.items():
+        await db.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            {period} TEXT NOT NULL,
+            service_id INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            total_amount REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY ({period}, service_id, status)
+        )
+        ''')
+
+async def get_order_row_ids(db, order_ids: Iterable[str]) -> List[int]:
+    """
+    المعرفات الداخلية (id) لصفوف الطلبات التي تحمل معرفات المزود المحددة
+
+    معرف المزود (order_id) قد يتكرر، لذلك تُعاد كل الصفوف المطابقة، وهي نفس
+    الصفوف التي تغيرها عبارة UPDATE ... WHERE order_id = ?
+    """
+    order_ids = list({str(order_id) for order_id in order_ids})
+    row_ids = []
+    for i in range(0, len(order_ids), 500):
+        chunk = order_ids[i:i + 500]
+        cursor = await db.execute(
+            f"SELECT id FROM orders WHERE order_id IN ({', '.join('?' for _ in chunk)})",
+            chunk
+        )
+        row_ids.extend(row[0] for row in await cursor.fetchall())
+    return row_ids
+
+async def apply_order_rollup(db, row_ids: Iterable[int], sign: int = 1) -> None:
+    """
+    إضافة طلبات إلى جداول التجميع أو طرحها منها حسب حالتها الحالية
+
+    تُستدعى ضمن معاملة قائمة ولا تقوم بالحفظ: عند تغيير الحالة تُطرح الطلبات
+    (sign = -1) قبل التحديث ثم تُضاف (sign = 1) بعده.
+
+    Args:
+        db: اتصال قاعدة البيانات (داخل معاملة)
+        row_ids: المعرفات الداخلية للطلبات (المفتاح الأساسي id وليس معرف المزود)
+        sign: 1 للإضافة، -1 للطرح
+    """
+    params = [(sign, sign, int(row_id)) for row_id in row_ids]
+    if not params:
+        return
+
+    for table, (period, period_expr) in ROLLUP_TABLES.items():
+        # WHERE في SELECT ضروري لتمييز ON CONFLICT عن صيغة الربط
+        await db.executemany(f'''
+        INSERT INTO {table} ({period}, service_id, status, order_count, total_amount)
+        SELECT {period_expr}, COALESCE(service_id, 0), COALESCE(status, 'pending'), ?, ? * COALESCE(amount, 0)
+        FROM orders
+        WHERE id = ? AND created_at IS NOT NULL
+        ON CONFLICT ({period}, service_id, status) DO UPDATE SET
+            order_count = order_count + excluded.order_count,
+            total_amount = total_amount + excluded.total_amount
+        ''', params)
+
+async def rebuild_order_rollups(db) -> None:
+    """إعادة بناء جداول التجميع بالكامل من جدول الطلبات (دون حفظ المعاملة)"""
+    await create_rollup_tables(db)
+    for table, (period, period_expr) in ROLLUP_TABLES.items():
+        await db.execute(f"DELETE FROM {table}")
+        await db.execute(f'''
+        INSERT INTO {table} ({period}, service_id, status, order_count, total_amount)
+        SELECT {period_expr}, COALESCE(service_id, 0), COALESCE(status, 'pending'), COUNT(*), COALESCE(SUM(amount), 0)
+        FROM orders
+        WHERE created_at IS NOT NULL
+        GROUP BY 1, 2, 3
+        ''')
+
+async def backfill_order_rollups() -> bool:
+    """
+    إعادة بناء جداول التجميع من سجل الطلبات في معاملة واحدة
+
+    Returns:
+        True إذا نجحت العملية، False إذا فشلت
+    """
+    try:
+        async with get_connection() as db:
+            await db.execute("BEGIN IMMEDIATE")
+            await rebuild_order_rollups(db)
+            await db.commit()
+        logger.info("تم إعادة بناء جداول تجميع المبيعات")
+        return True
+    except Exception as e:
+        logger.error(f"خطأ في إعادة بناء جداول تجميع المبيعات: {e}")
+        return False
+
+async def get_sales_totals(start_day: Optional[str] = None, end_day: Optional[str] = None) -> Dict[str, Any]:
+    """
+    مجموع الطلبات ومبالغها في فترة من الأيام
+
+    Args:
+        start_day: أول يوم (YYYY-MM-DD) ضمن الفترة، None من البداية
+        end_day: اليوم الذي تنتهي عنده الفترة (غير مشمول)، None حتى الآن
+
+    Returns:
+        Dict[str, Any]: count و amount
+    """
+    conditions = []
+    params = []
+    if start_day:
+        conditions.append("day >= ?")
+        params.append(start_day)
+    if end_day:
+        conditions.append("day < ?")
+        params.append(end_day)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    async with get_connection(readonly=True) as db:
+        cursor = await db.execute(
+            f"SELECT COALESCE(SUM(order_count), 0), COALESCE(SUM(total_amount), 0) FROM order_rollup_daily {where}",
+            params
+        )
+        count, amount = await cursor.fetchone()
+        return {"count": count, "amount": amount}
+
+async def get_hourly_sales(day: str) -> List[Dict[str, Any]]:
+    """
+    المبيعات لكل ساعة في يوم معين
+
+    Args:
+        day: اليوم بصيغة YYYY-MM-DD
+
+    Returns:
+        List[Dict[str, Any]]: hour و count و amount لكل ساعة فيها طلبات
+    """
+    async with get_connection(readonly=True) as db:
+        cursor = await db.execute('''
+        SELECT hour, SUM(order_count), SUM(total_amount)
+        FROM order_rollup_hourly
+        WHERE hour >= ? AND hour < ?
+        GROUP BY hour
+        ORDER BY hour
+        ''', (day, f"{day}~"))
+        return [
+            {"hour": hour, "count": count, "amount": amount}
+            for hour, count, amount in await cursor.fetchall()
+            if count
+        ]
+
+async def get_sales_by_service(start_day: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    الخدمات الأعلى مبيعًا منذ يوم معين
+
+    Args:
+        start_day: أول يوم ضمن الفترة، None لكل الفترات
+        limit: عدد الخدمات
+
+    Returns:
+        List[Dict[str, Any]]: service_id و count و amount
+    """
+    where = "WHERE day >= ?" if start_day else ""
+    params = [start_day] if start_day else []
+    async with get_connection(readonly=True) as db:
+        cursor = await db.execute(f'''
+        SELECT service_id, SUM(order_count) AS count, SUM(total_amount) AS amount
+        FROM order_rollup_daily
+        {where}
+        GROUP BY service_id
+        HAVING count > 0
+        ORDER BY amount DESC
+        LIMIT ?
+        ''', params + [limit])
+        return [
+            {"service_id": service_id, "count": count, "amount": amount}
+            for service_id, count, amount in await cursor.fetchall()
+        ]
+
+async def get_sales_by_status(start_day: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    عدد الطلبات ومبالغها لكل حالة منذ يوم معين
+
+    Args:
+        start_day: أول يوم ضمن الفترة، None لكل الفترات
+
+    Returns:
+        Dict[str, Dict[str, Any]]: الحالة -> count و amount
+    """
+    where = "WHERE day >= ?" if start_day else ""
+    params = [start_day] if start_day else []
+    async with get_connection(readonly=True) as db:
+        cursor = await db.execute(f'''
+        SELECT status, SUM(order_count), SUM(total_amount)
+        FROM order_rollup_daily
+        {where}
+        GROUP BY status
+        ''', params)
+        return {
+            status: {"count": count, "amount": amount}
+            for status, count, amount in await cursor.fetchall()
+            if count
+        }
+
+# إعادة بناء الجداول عند تشغيل الملف مباشرة
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    result = asyncio.run(backfill_order_rollups())
+    print(f"نتيجة إعادة البناء: {'نجاح' if result else 'فشل'}")
+    sys.exit(0 if result else 1)
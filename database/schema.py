@@ -0,0 +1,73 @@
+"""
+قدرات بنية قاعدة البيانات
+
+تُقرأ بنية الجداول مرة واحدة عند بدء التشغيل (بعد تطبيق migrations) وتُحفظ في
+الذاكرة، فتستخدمها دوال بناء الاستعلامات بدلاً من تنفيذ PRAGMA table_info مع
+كل طلب. أي تعديل على البنية يتم عبر نظام migrations فقط.
+"""
+
+import logging
+from typing import Dict, FrozenSet, Optional
+
+from database.pool import get_connection
+
+# إعداد المسجل
+logger = logging.getLogger("smm_bot")
+
+class SchemaCapabilities:
+    """أسماء أعمدة كل جدول كما كانت عند بدء التشغيل"""
+
+    def __init__(self, tables: Optional[Dict[str, FrozenSet[str]]] = None):
+        self.tables = tables or {}
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.tables)
+
+    def has_table(self, table: str) -> bool:
+        """التحقق من وجود جدول"""
+        if not self.loaded:
+            # لم تُحمّل البنية بعد (مثل سكربت مستقل): نفترض أن جميع migrations مطبقة
+            return True
+        return table in self.tables
+
+    def has_column(self, table: str, column: str) -> bool:
+        """التحقق من وجود عمود في جدول"""
+        if not self.loaded:
+            return True
+        return column in self.tables.get(table, frozenset())
+
+    def columns(self, table: str) -> FrozenSet[str]:
+        """الحصول على أعمدة جدول"""
+        return self.tables.get(table, frozenset())
+
+# القدرات الحالية (تُستبدل بالكامل عند إعادة التحميل)
+_capabilities = SchemaCapabilities()
+
+async def load_schema_capabilities() -> SchemaCapabilities:
+    """
+    قراءة بنية جميع الجداول من قاعدة البيانات (يُستدعى بعد تطبيق migrations)
+
+    Returns:
+        SchemaCapabilities: القدرات المحمّلة
+    """
+    global _capabilities
+
+    tables = {}
+    async with get_connection(readonly=True) as db:
+        cursor = await db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )
+        table_names = [row[0] for row in await cursor.fetchall()]
+
+        for table in table_names:
+            cursor = await db.execute(f"PRAGMA table_info({table})")
+            tables[table] = frozenset(column[1] for column in await cursor.fetchall())
+
+    _capabilities = SchemaCapabilities(tables)
+    logger.info(f"تم تحميل بنية قاعدة البيانات: {len(tables)} جدول")
+    return _capabilities
+
+def get_schema_capabilities() -> SchemaCapabilities:
+    """الحصول على قدرات البنية المحمّلة عند بدء التشغيل"""
+    return _capabilities
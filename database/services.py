@@ -4,12 +4,11 @@
 
 import logging
 import sqlite3
-import aiosqlite
 import json
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 
-import config
+from database.pool import get_connection
 
 # إعداد المسجل
 logger = logging.getLogger("smm_bot")
@@ -22,7 +21,7 @@ async def init_services_tables():
 async def create_category(name: str, description: str = None, visibility_min_rank: int = 5) -> int:
     """إنشاء فئة جديدة"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             cursor = await db.execute(
                 """INSERT INTO categories (name, description, visibility_min_rank) 
                    VALUES (?, ?, ?)""",
@@ -39,7 +38,7 @@ async def create_category(name: str, description: str = None, visibility_min_ran
 async def get_categories(include_inactive: bool = False, min_rank: int = 5) -> List[Dict[str, Any]]:
     """الحصول على قائمة الفئات"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             query = "SELECT * FROM categories WHERE 1=1"
@@ -67,7 +66,7 @@ async def create_or_update_service(external_id: int, category_id: int, name: str
                                  raw_api_data: dict = None) -> int:
     """إنشاء أو تحديث خدمة"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             # فحص إذا كانت الخدمة موجودة
             cursor = await db.execute(
                 "SELECT id FROM services WHERE external_id = ?", (external_id,)
@@ -110,7 +109,7 @@ async def get_services(category_id: int = None, include_inactive: bool = False,
                       min_rank: int = 5) -> List[Dict[str, Any]]:
     """الحصول على قائمة الخدمات"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             query = """
@@ -155,7 +154,7 @@ async def get_services(category_id: int = None, include_inactive: bool = False,
 async def get_service_by_id(service_id: int) -> Optional[Dict[str, Any]]:
     """الحصول على خدمة بواسطة المعرف"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             cursor = await db.execute(
@@ -183,7 +182,7 @@ async def get_service_by_id(service_id: int) -> Optional[Dict[str, Any]]:
 async def get_service_by_external_id(external_id: int) -> Optional[Dict[str, Any]]:
     """الحصول على خدمة بواسطة المعرف الخارجي"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection(readonly=True) as db:
             db.row_factory = sqlite3.Row
             
             cursor = await db.execute(
@@ -211,7 +210,7 @@ async def get_service_by_external_id(external_id: int) -> Optional[Dict[str, Any
 async def update_service_visibility(service_id: int, is_active: bool, visibility_min_rank: int = None) -> bool:
     """تحديث ظهور الخدمة"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             if visibility_min_rank is not None:
                 await db.execute(
                     "UPDATE services SET is_active = ?, visibility_min_rank = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
@@ -224,7 +223,11 @@ async def update_service_visibility(service_id: int, is_active: bool, visibility
                 )
             await db.commit()
             logger.info(f"تم تحديث ظهور الخدمة {service_id}: active={is_active}")
-            return True
+        
+        # إضافة الخدمة إلى مصفوفة الأسعار أو حذفها منها
+        from database.price_matrix import refresh_price_matrix
+        await refresh_price_matrix([service_id])
+        return True
     except Exception as e:
         logger.error(f"خطأ في تحديث ظهور الخدمة {service_id}: {e}")
         return False
@@ -232,7 +235,7 @@ async def update_service_visibility(service_id: int, is_active: bool, visibility
 async def update_category_visibility(category_id: int, is_active: bool, visibility_min_rank: int = None) -> bool:
     """تحديث ظهور الفئة"""
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             if visibility_min_rank is not None:
                 await db.execute(
                     "UPDATE categories SET is_active = ?, visibility_min_rank = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
@@ -253,6 +256,7 @@ async def update_category_visibility(category_id: int, is_active: bool, visibili
 async def sync_services_from_api(api_services: List[Dict]) -> Dict[str, int]:
     """مزامنة الخدمات من API الخارجي"""
     stats = {"created": 0, "updated": 0, "errors": 0}
+    synced_service_ids = []
     
     try:
         # إنشاء فئة افتراضية إذا لم تكن موجودة
@@ -300,6 +304,7 @@ async def sync_services_from_api(api_services: List[Dict]) -> Dict[str, int]:
                 )
                 
                 if service_id != -1:
+                    synced_service_ids.append(service_id)
                     # فحص إذا كانت خدمة جديدة أم محدثة
                     existing = await get_service_by_external_id(external_id)
                     if existing and existing['id'] == service_id:
@@ -314,6 +319,10 @@ async def sync_services_from_api(api_services: List[Dict]) -> Dict[str, int]:
                 stats["errors"] += 1
         
         logger.info(f"اكتملت مزامنة الخدمات: {stats}")
+        
+        # إعادة حساب أسعار الخدمات المتزامنة (تُكتب فقط الصفوف التي تغير سعرها)
+        from database.price_matrix import refresh_price_matrix
+        await refresh_price_matrix(synced_service_ids)
         return stats
         
     except Exception as e:
@@ -4,7 +4,6 @@
 
 import logging
 import sqlite3
-import aiosqlite
 from datetime import datetime
 from typing import Dict, Any, Optional, List, Tuple
 
@@ -19,8 +18,10 @@ from aiogram.types import (
 from aiogram.enums import ParseMode
 
 import config
+from database.pool import get_connection
 from database.core import get_user, update_user_balance, get_all_users
 from database.deposit import get_pending_deposits, approve_deposit, reject_deposit, get_deposit_by_id, get_all_deposits, get_deposit_stats, refund_deposit
+from database.deposit import get_deposits_page, count_deposits
 from keyboards import reply, inline
 from states.order import AdminState
 from utils.common import format_money, validate_number, format_deposit_info, format_user_info, format_amount_with_currency
@@ -151,19 +152,16 @@ async def pending_deposits_quick(message: Message, state: FSMContext):
     if message.from_user.id not in config.ADMIN_IDS:
         return
 
-    # الحصول على طلبات الإيداع المعلقة
-    deposits, total = await get_pending_deposits()
+    # بدء عرض طلبات الإيداع المعلقة من الصفحة الأولى
+    total = await _start_deposits_listing(state, "pending")
 
-    if not deposits:
+    if not total:
         await message.answer(
             "📭 لا توجد طلبات إيداع معلقة حاليًا.",
             reply_markup=reply.get_admin_main_keyboard()
         )
         return
 
-    # تخزين البيانات في الحالة
-    await state.update_data(deposits=deposits, total_deposits=total, page=1)
-
     # عرض طلبات الإيداع
     await display_deposits_page(message, state)
 
@@ -374,10 +372,10 @@ async def show_statistics(message: Message):
 @router.message(F.text == "👥 المستخدمين")
 async def manage_users(message: Message, state: FSMContext):
     """معالج إدارة المستخدمين"""
-    # الحصول على قائمة المستخدمين
-    users, total = await get_all_users()
+    # بدء عرض المستخدمين من الصفحة الأولى
+    total = await _start_users_listing(state)
 
-    if not users:
+    if not total:
         try:
             # جلب لوحة المفاتيح مع شارات الإشعارات المتحركة
             admin_keyboard = reply.get_admin_keyboard()
@@ -394,38 +392,57 @@ async def manage_users(message: Message, state: FSMContext):
             )
         return
 
-    # تخزين البيانات في الحالة
-    await state.update_data(users=users, total_users=total, page=1)
-
     # عرض المستخدمين
     await display_users_page(message, state)
 
     # تعيين حالة إدارة المستخدمين
     await state.set_state(AdminState.managing_users)
 
+async def _start_users_listing(state: FSMContext) -> int:
+    """
+    بدء عرض قائمة المستخدمين من الصفحة الأولى
+
+    Returns:
+        int: العدد الإجمالي للمستخدمين
+    """
+    from database.core import get_user_count
+    total = await get_user_count()
+    await state.update_data(total_users=total, page=1, page_cursors=[None])
+    return total
+
+async def _load_users_page(state: FSMContext, per_page: int = 5) -> Tuple[List[Dict[str, Any]], int, int, bool]:
+    """
+    جلب الصفحة الحالية من المستخدمين بالمؤشر وحفظ مؤشر الصفحة التالية
+
+    Returns:
+        (مستخدمو الصفحة، رقم الصفحة، عدد الصفحات، هل توجد صفحة تالية)
+    """
+    from database.core import get_users_page
+    data = await state.get_data()
+    total_users = data.get("total_users", 0)
+    page_cursors = data.get("page_cursors", [None])
+    page = max(1, min(data.get("page", 1), len(page_cursors)))
+
+    users, next_cursor = await get_users_page(page_cursors[page - 1], per_page)
+    page_cursors = page_cursors[:page] + ([next_cursor] if next_cursor else [])
+    await state.update_data(page=page, page_cursors=page_cursors)
+
+    total_pages = max((total_users + per_page - 1) // per_page, len(page_cursors), 1)
+    return users, page, total_pages, next_cursor is not None
+
 async def display_users_page(message: Message, state: FSMContext):
     """عرض صفحة من المستخدمين"""
     # الحصول على البيانات
     data = await state.get_data()
-    users = data.get("users", [])
     total_users = data.get("total_users", 0)
-    page = data.get("page", 1)
-    per_page = 5  # عدد المستخدمين في الصفحة الواحدة
-
-    # حساب عدد الصفحات
-    total_pages = (total_users + per_page - 1) // per_page
+    users, page, total_pages, has_next = await _load_users_page(state)
 
     # إنشاء نص المستخدمين
     users_text = f"👥 <b>قائمة المستخدمين ({total_users}):</b>\n"
     users_text += f"📄 <b>الصفحة:</b> {page}/{total_pages}\n\n"
 
-    # حساب نطاق المستخدمين للصفحة الحالية
-    start_idx = (page - 1) * per_page
-    end_idx = min(start_idx + per_page, len(users))
-
     # إضافة معلومات المستخدمين
-    for i in range(start_idx, end_idx):
-        user = users[i]
+    for user in users:
         user_id = user.get("user_id", "غير محدد")
         username = user.get("username", "غير محدد")
         full_name = user.get("full_name", "غير محدد")
@@ -452,7 +469,7 @@ async def display_users_page(message: Message, state: FSMContext):
 
     navigation.append(KeyboardButton(text=f"📄 {page}/{total_pages}"))
 
-    if page < total_pages:
+    if has_next:
         navigation.append(KeyboardButton(text="التالي ▶️"))
 
     if navigation:
@@ -478,11 +495,8 @@ async def process_users_management(message: Message, state: FSMContext):
     """معالج إدارة المستخدمين"""
     # الحصول على البيانات
     data = await state.get_data()
-    users = data.get("users", [])
-    total_users = data.get("total_users", 0)
     page = data.get("page", 1)
-    per_page = 5
-    total_pages = (total_users + per_page - 1) // per_page
+    page_cursors = data.get("page_cursors", [None])
 
     # التحقق من الأمر
     if message.text == "🔙 العودة":
@@ -495,7 +509,7 @@ async def process_users_management(message: Message, state: FSMContext):
         return
     elif message.text == "التالي ▶️":
         # الانتقال للصفحة التالية
-        if page < total_pages:
+        if page < len(page_cursors):
             await state.update_data(page=page + 1)
             await display_users_page(message, state)
         else:
@@ -785,7 +799,7 @@ async def update_user_balance_and_notify(context, user_id: int, amount: float, a
         return False, None
 
     # تحديث الرصيد
-    success = await update_user_balance(user_id, amount, action)
+    success = await update_user_balance(user_id, amount, action, reason="admin")
 
     if not success:
         if isinstance(context, Message):
@@ -917,7 +931,7 @@ async def process_add_balance(message: Message, user_id: int, amount: float):
         return
 
     # إضافة الرصيد
-    success = await update_user_balance(user_id, amount, "add")
+    success = await update_user_balance(user_id, amount, "add", reason="admin")
 
     if not success:
         await message.answer(
@@ -968,7 +982,7 @@ async def process_subtract_balance(message: Message, user_id: int, amount: float
         return
 
     # خصم الرصيد
-    success = await update_user_balance(user_id, amount, "subtract")
+    success = await update_user_balance(user_id, amount, "subtract", reason="admin")
 
     if not success:
         await message.answer(
@@ -991,48 +1005,69 @@ async def process_subtract_balance(message: Message, user_id: int, amount: float
 @router.message(F.text == "📦 طلبات الإيداع")
 async def show_pending_deposits(message: Message, state: FSMContext):
     """معالج عرض طلبات الإيداع المعلقة"""
-    # الحصول على طلبات الإيداع المعلقة
-    deposits, total = await get_pending_deposits()
+    # بدء عرض طلبات الإيداع المعلقة من الصفحة الأولى
+    total = await _start_deposits_listing(state, "pending")
 
-    if not deposits:
+    if not total:
         await message.answer(
             "📭 لا توجد طلبات إيداع معلقة حاليًا.",
             reply_markup=reply.get_admin_keyboard()
         )
         return
 
-    # تخزين البيانات في الحالة
-    await state.update_data(deposits=deposits, total_deposits=total, page=1)
-
     # عرض طلبات الإيداع
     await display_deposits_page(message, state)
 
     # تعيين حالة إدارة طلبات الإيداع
     await state.set_state(AdminState.managing_deposits)
 
+async def _start_deposits_listing(state: FSMContext, status: Optional[str]) -> int:
+    """
+    بدء عرض قائمة طلبات الإيداع من الصفحة الأولى
+
+    يُحفظ في الحالة العدد الإجمالي ومؤشرات الصفحات التي تمت زيارتها فقط،
+    وتُجلب كل صفحة من قاعدة البيانات عند عرضها.
+
+    Returns:
+        int: العدد الإجمالي لطلبات الإيداع
+    """
+    total = await count_deposits(status=status)
+    await state.update_data(total_deposits=total, page=1, page_cursors=[None])
+    return total
+
+async def _load_deposits_page(state: FSMContext, status: Optional[str],
+                              per_page: int = 5) -> Tuple[List[Dict[str, Any]], int, int, bool]:
+    """
+    جلب الصفحة الحالية من طلبات الإيداع بالمؤشر وحفظ مؤشر الصفحة التالية
+
+    Returns:
+        (طلبات الصفحة، رقم الصفحة، عدد الصفحات، هل توجد صفحة تالية)
+    """
+    data = await state.get_data()
+    total_deposits = data.get("total_deposits", 0)
+    page_cursors = data.get("page_cursors", [None])
+    page = max(1, min(data.get("page", 1), len(page_cursors)))
+
+    deposits, next_cursor = await get_deposits_page(status=status, cursor=page_cursors[page - 1], limit=per_page)
+    page_cursors = page_cursors[:page] + ([next_cursor] if next_cursor else [])
+    await state.update_data(page=page, page_cursors=page_cursors)
+
+    total_pages = max((total_deposits + per_page - 1) // per_page, len(page_cursors), 1)
+    return deposits, page, total_pages, next_cursor is not None
+
 async def display_deposits_page(message: Message, state: FSMContext):
     """عرض صفحة من طلبات الإيداع"""
     # الحصول على البيانات
     data = await state.get_data()
-    deposits = data.get("deposits", [])
     total_deposits = data.get("total_deposits", 0)
-    page = data.get("page", 1)
-    per_page = 5  # عدد الطلبات في الصفحة الواحدة
-
-    # حساب عدد الصفحات
-    total_pages = (total_deposits + per_page - 1) // per_page
+    deposits, page, total_pages, has_next = await _load_deposits_page(state, "pending")
 
     # إنشاء نص طلبات الإيداع
     deposits_text = f"📦 <b>طلبات الإيداع المعلقة ({total_deposits}):</b>\n"
     deposits_text += f"📄 <b>الصفحة:</b> {page}/{total_pages}\n\n"
 
-    # حساب نطاق الطلبات للصفحة الحالية
-    start_idx = (page - 1) * per_page
-    end_idx = min(start_idx + per_page, len(deposits))
-
     # إضافة معلومات طلبات الإيداع
-    for i in range(start_idx, end_idx):
-        deposit = deposits[i]
+    for deposit in deposits:
         deposit_id = deposit.get("id", "غير محدد")
         user_id = deposit.get("user_id", "غير محدد")
         username = deposit.get("username", "غير محدد")
@@ -1070,7 +1105,7 @@ async def display_deposits_page(message: Message, state: FSMContext):
     
     navigation.append(KeyboardButton(text=f"📄 {page}/{total_pages}"))
     
-    if page < total_pages:
+    if has_next:
         navigation.append(KeyboardButton(text="التالي ▶️"))
     
     if navigation:
@@ -1111,11 +1146,8 @@ async def process_deposits_navigation(message: Message, state: FSMContext):
     
     # الحصول على البيانات
     data = await state.get_data()
-    deposits = data.get("deposits", [])
-    total_deposits = data.get("total_deposits", 0)
     page = data.get("page", 1)
-    per_page = 5
-    total_pages = (total_deposits + per_page - 1) // per_page
+    page_cursors = data.get("page_cursors", [None])
     
     # التحقق من الأمر
     if message.text == "العودة" or message.text == "🔙 العودة":
@@ -1127,8 +1159,8 @@ async def process_deposits_navigation(message: Message, state: FSMContext):
         )
         return
     elif message.text == "التالي":
-        # الانتقال للصفحة التالية
-        if page < total_pages:
+        # الانتقال للصفحة التالية (يوجد مؤشر لها فقط إذا لم تكن الحالية الأخيرة)
+        if page < len(page_cursors):
             await state.update_data(page=page + 1)
             await display_deposits_page(message, state)
         else:
@@ -1189,14 +1221,6 @@ async def process_deposits_management(message: Message, state: FSMContext):
         await display_deposits_page(message, state)
         return
     
-    # الحصول على البيانات
-    data = await state.get_data()
-    deposits = data.get("deposits", [])
-    total_deposits = data.get("total_deposits", 0)
-    page = data.get("page", 1)
-    per_page = 5
-    total_pages = (total_deposits + per_page - 1) // per_page
-
     # تحقق مما إذا كان النص يبدأ بـ "قبول" أو "رفض" وتوجيهه للدالة المناسبة
     if message.text.startswith("قبول ") or message.text.startswith("✅ قبول "):
         parts = message.text.split()
@@ -1213,8 +1237,7 @@ async def process_deposits_management(message: Message, state: FSMContext):
                         parse_mode=ParseMode.HTML
                     )
                     # تحديث قائمة طلبات الإيداع
-                    deposits, total = await get_pending_deposits()
-                    await state.update_data(deposits=deposits, total_deposits=total, page=1)
+                    await _start_deposits_listing(state, "pending")
                     await display_deposits_page(message, state)
                     return
                 else:
@@ -1237,8 +1260,7 @@ async def process_deposits_management(message: Message, state: FSMContext):
                         parse_mode=ParseMode.HTML
                     )
                     # تحديث قائمة طلبات الإيداع
-                    deposits, total = await get_pending_deposits()
-                    await state.update_data(deposits=deposits, total_deposits=total, page=1)
+                    await _start_deposits_listing(state, "pending")
                     await display_deposits_page(message, state)
                     return
                 else:
@@ -1256,14 +1278,10 @@ async def process_deposits_management(message: Message, state: FSMContext):
         )
         return
 
-    # البحث عن طلب الإيداع في القائمة
-    deposit_data = None
-    for deposit in deposits:
-        if deposit.get("id") == deposit_id:
-            deposit_data = deposit
-            break
+    # البحث عن طلب الإيداع ضمن الطلبات المعلقة (القائمة تُجلب صفحة بصفحة)
+    deposit_data = await get_deposit_by_id(deposit_id)
 
-    if not deposit_data:
+    if not deposit_data or deposit_data.get("status") != "pending":
         await message.answer(
             "⚠️ طلب الإيداع غير موجود في القائمة الحالية."
         )
@@ -1357,8 +1375,7 @@ async def approve_deposit_request(message: Message, state: FSMContext):
     )
 
     # تحديث قائمة طلبات الإيداع
-    deposits, total = await get_pending_deposits()
-    await state.update_data(deposits=deposits, total_deposits=total, page=1)
+    await _start_deposits_listing(state, "pending")
 
     # عرض طلبات الإيداع المحدثة
     await display_deposits_page(message, state)
@@ -1409,8 +1426,7 @@ async def reject_deposit_request(message: Message, state: FSMContext):
     )
 
     # تحديث قائمة طلبات الإيداع
-    deposits, total = await get_pending_deposits()
-    await state.update_data(deposits=deposits, total_deposits=total, page=1)
+    await _start_deposits_listing(state, "pending")
 
     # عرض طلبات الإيداع المحدثة
     await display_deposits_page(message, state)
@@ -1589,20 +1605,16 @@ async def confirm_refund_deposit(message: Message, state: FSMContext):
 async def show_all_deposits(message: Message, state: FSMContext):
     """معالج عرض جميع طلبات الإيداع"""
     try:
-        # الحصول على كل طلبات الإيداع
-        from database.deposit import get_all_deposits
-        deposits, total = await get_all_deposits()
+        # بدء عرض جميع طلبات الإيداع من الصفحة الأولى
+        total = await _start_deposits_listing(state, None)
 
-        if not deposits:
+        if not total:
             await message.answer(
                 "📭 لا توجد طلبات إيداع مسجلة حاليًا.",
                 reply_markup=reply.get_admin_keyboard()
             )
             return
 
-        # تخزين البيانات في الحالة
-        await state.update_data(deposits=deposits, total_deposits=total, page=1)
-
         # عرض طلبات الإيداع
         await display_all_deposits_page(message, state)
 
@@ -1619,25 +1631,15 @@ async def display_all_deposits_page(message: Message, state: FSMContext):
     """عرض صفحة من جميع طلبات الإيداع"""
     # الحصول على البيانات
     data = await state.get_data()
-    deposits = data.get("deposits", [])
     total_deposits = data.get("total_deposits", 0)
-    page = data.get("page", 1)
-    per_page = 5  # عدد الطلبات في الصفحة الواحدة
-
-    # حساب عدد الصفحات
-    total_pages = (total_deposits + per_page - 1) // per_page
+    deposits, page, total_pages, _ = await _load_deposits_page(state, None)
 
     # إنشاء نص طلبات الإيداع
     deposits_text = f"📥 <b>جميع طلبات الإيداع ({total_deposits}):</b>\n"
     deposits_text += f"📄 <b>الصفحة:</b> {page}/{total_pages}\n\n"
 
-    # حساب نطاق الطلبات للصفحة الحالية
-    start_idx = (page - 1) * per_page
-    end_idx = min(start_idx + per_page, len(deposits))
-
     # إضافة معلومات طلبات الإيداع
-    for i in range(start_idx, end_idx):
-        deposit = deposits[i]
+    for deposit in deposits:
         deposit_id = deposit.get("id", "غير محدد")
         user_id = deposit.get("user_id", "غير محدد")
         username = deposit.get("username", "غير محدد")
@@ -1683,11 +1685,8 @@ async def process_all_deposits_management(message: Message, state: FSMContext):
     """معالج إدارة جميع طلبات الإيداع"""
     # الحصول على البيانات
     data = await state.get_data()
-    deposits = data.get("deposits", [])
-    total_deposits = data.get("total_deposits", 0)
     page = data.get("page", 1)
-    per_page = 5
-    total_pages = (total_deposits + per_page - 1) // per_page
+    page_cursors = data.get("page_cursors", [None])
 
     # التحقق من الأمر
     if message.text == "العودة":
@@ -1700,7 +1699,7 @@ async def process_all_deposits_management(message: Message, state: FSMContext):
         return
     elif message.text == "التالي":
         # الانتقال للصفحة التالية
-        if page < total_pages:
+        if page < len(page_cursors):
             await state.update_data(page=page + 1)
             await display_all_deposits_page(message, state)
         else:
@@ -2061,22 +2060,67 @@ async def back_to_ranks_list(callback: CallbackQuery, state: FSMContext):
 
 @router.callback_query(lambda c: c.data == "update_all_ranks")
 async def update_all_ranks_callback(callback: CallbackQuery, state: FSMContext):
-    """معالج تحديث رتب المستخدمين (معطل)"""
+    """معالج طلب تحديث رتب جميع المستخدمين (يطلب التأكيد أولاً)"""
     # التحقق من صلاحيات المشرف
     if callback.from_user.id not in config.ADMIN_IDS:
         await callback.answer("⛔ غير مصرح لك بهذا الإجراء", show_alert=True)
         return
 
-    # إظهار رسالة تنبيه
+    # تأكيد إعادة الحساب لأنها تستبدل الرتب المعينة يدوياً
     await callback.message.edit_text(
-        "ℹ️ <b>تغيير نظام الرتب</b>\n\n"
-        "تم تغيير نظام الرتب ليتم تعيين الرتب يدوياً فقط من قبل المشرفين.\n"
-        "لتعيين رتبة لمستخدم، يرجى استخدام خيار 'إدارة المستخدمين' والبحث عن المستخدم المطلوب.",
+        "🔁 <b>تحديث رتب جميع المستخدمين</b>\n\n"
+        "سيتم إعادة حساب رتبة كل مستخدم حسب عدد مشترياته المكتملة.\n\n"
+        "⚠️ <b>تحذير:</b> الرتب التي عينها المشرفون يدوياً سيتم استبدالها بالرتبة "
+        "المستحقة حسب المشتريات. هل أنت متأكد من رغبتك في المتابعة؟",
         parse_mode=ParseMode.HTML,
-        reply_markup=inline.get_back_button("manage_ranks")
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ نعم، تحديث الرتب", callback_data="confirm_update_all_ranks"),
+                InlineKeyboardButton(text="❌ إلغاء", callback_data="manage_ranks")
+            ]
+        ])
     )
 
-    await callback.answer("تم تغيير نظام الرتب")
+    await callback.answer()
+
+@router.callback_query(lambda c: c.data == "confirm_update_all_ranks")
+async def confirm_update_all_ranks_callback(callback: CallbackQuery, state: FSMContext):
+    """معالج تأكيد تحديث رتب جميع المستخدمين حسب عدد المشتريات المكتملة"""
+    # التحقق من صلاحيات المشرف
+    if callback.from_user.id not in config.ADMIN_IDS:
+        await callback.answer("⛔ غير مصرح لك بهذا الإجراء", show_alert=True)
+        return
+
+    await callback.answer("⏳ جاري تحديث رتب المستخدمين...")
+
+    from database.ranks import update_users_ranks, get_rank_emoji, get_rank_name
+    summary = await update_users_ranks()
+
+    if summary is None:
+        await callback.message.edit_text(
+            "❌ حدث خطأ أثناء تحديث رتب المستخدمين. يرجى المحاولة مرة أخرى.",
+            reply_markup=inline.get_back_button("manage_ranks")
+        )
+        return
+
+    # تفاصيل الانتقالات بين الرتب
+    moves_text = ""
+    for (old_rank, new_rank), count in sorted(summary["moves"].items(), key=lambda item: -item[1]):
+        moves_text += (
+            f"• {get_rank_emoji(old_rank)} {get_rank_name(old_rank)} ← "
+            f"{get_rank_emoji(new_rank)} {get_rank_name(new_rank)}: {count}\n"
+        )
+
+    await callback.message.edit_text(
+        f"✅ <b>تم تحديث رتب المستخدمين</b>\n\n"
+        f"👥 <b>عدد المستخدمين:</b> {summary['users']}\n"
+        f"🔄 <b>تغيرت رتبهم:</b> {summary['moved']}\n"
+        f"⬆️ <b>ترقية:</b> {summary['promoted']}\n"
+        f"⬇️ <b>تخفيض:</b> {summary['demoted']}\n"
+        + (f"\n{moves_text}" if moves_text else ""),
+        parse_mode=ParseMode.HTML,
+        reply_markup=inline.get_back_button("manage_ranks")
+    )
 
 @router.callback_query(lambda c: c.data.startswith("edit_rank_name_"))
 async def edit_rank_name_callback(callback: CallbackQuery, state: FSMContext):
@@ -2146,7 +2190,7 @@ async def process_edit_rank_name(message: Message, state: FSMContext):
 
     # تحديث اسم الرتبة
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             await db.execute(
                 "UPDATE ranks SET name = ? WHERE id = ?",
                 (new_name, rank_id)
@@ -2158,25 +2202,31 @@ async def process_edit_rank_name(message: Message, state: FSMContext):
             cursor = await db.execute("SELECT * FROM ranks WHERE id = ?", (rank_id,))
             updated_rank = await cursor.fetchone()
 
-            if updated_rank:
-                from database.ranks import get_rank_emoji
-                emoji = get_rank_emoji(rank_id)
-
-                # إرسال رسالة التأكيد
-                await message.answer(
-                    f"✅ <b>تم تحديث اسم الرتبة بنجاح!</b>\n\n"
-                    f"🔹 <b>الرتبة:</b> {emoji} {new_name}",
-                    parse_mode=ParseMode.HTML,
-                    reply_markup=reply.get_admin_keyboard()
-                )
-
-                # تسجيل العملية
-                logger.info(f"تعديل اسم الرتبة: المشرف: {message.from_user.id}, الرتبة: {rank_id}, الاسم الجديد: {new_name}")
-            else:
-                await message.answer(
-                    "⚠️ لم يتم العثور على الرتبة. يرجى المحاولة مرة أخرى.",
-                    reply_markup=reply.get_admin_keyboard()
-                )
+        # اسم الرتبة جزء من سجل الرتب وجدول التسعير المُجمّع
+        from database.ranks import load_rank_registry
+        from database.pricing import invalidate_pricing_cache
+        await load_rank_registry()
+        await invalidate_pricing_cache()
+
+        if updated_rank:
+            from database.ranks import get_rank_emoji
+            emoji = get_rank_emoji(rank_id)
+
+            # إرسال رسالة التأكيد
+            await message.answer(
+                f"✅ <b>تم تحديث اسم الرتبة بنجاح!</b>\n\n"
+                f"🔹 <b>الرتبة:</b> {emoji} {new_name}",
+                parse_mode=ParseMode.HTML,
+                reply_markup=reply.get_admin_keyboard()
+            )
+
+            # تسجيل العملية
+            logger.info(f"تعديل اسم الرتبة: المشرف: {message.from_user.id}, الرتبة: {rank_id}, الاسم الجديد: {new_name}")
+        else:
+            await message.answer(
+                "⚠️ لم يتم العثور على الرتبة. يرجى المحاولة مرة أخرى.",
+                reply_markup=reply.get_admin_keyboard()
+            )
     except Exception as e:
         logger.error(f"خطأ في تحديث اسم الرتبة: {e}")
         await message.answer(
@@ -2264,7 +2314,7 @@ async def process_edit_rank_features(message: Message, state: FSMContext):
 
     # تحديث ميزات الرتبة
     try:
-        async with aiosqlite.connect(config.DB_NAME) as db:
+        async with get_connection() as db:
             features_str = ",".join(new_features)
             await db.execute(
                 "UPDATE ranks SET features = ? WHERE id = ?",
@@ -2277,29 +2327,33 @@ async def process_edit_rank_features(message: Message, state: FSMContext):
             cursor = await db.execute("SELECT * FROM ranks WHERE id = ?", (rank_id,))
             updated_rank = await cursor.fetchone()
 
-            if updated_rank:
-                from database.ranks import get_rank_emoji
-                emoji = get_rank_emoji(rank_id)
-
-                # تنسيق الميزات للعرض
-                features_display = ", ".join(new_features) if new_features else "لا توجد ميزات خاصة"
-
-                # إرسال رسالة التأكيد
-                await message.answer(
-                    f"✅ <b>تم تحديث ميزات الرتبة بنجاح!</b>\n\n"
-                    f"🔹 <b>الرتبة:</b> {emoji} {updated_rank['name']}\n"
-                    f"🔹 <b>الميزات الجديدة:</b> {features_display}",
-                    parse_mode=ParseMode.HTML,
-                    reply_markup=reply.get_admin_keyboard()
-                )
-
-                # تسجيل العملية
-                logger.info(f"تعديل ميزات الرتبة: المشرف: {message.from_user.id}, الرتبة: {rank_id}, الميزات الجديدة: {features_str}")
-            else:
-                await message.answer(
-                    "⚠️ لم يتم العثور على الرتبة. يرجى المحاولة مرة أخرى.",
-                    reply_markup=reply.get_admin_keyboard()
-                )
+        # تحديث سجل الرتب في الذاكرة
+        from database.ranks import load_rank_registry
+        await load_rank_registry()
+
+        if updated_rank:
+            from database.ranks import get_rank_emoji
+            emoji = get_rank_emoji(rank_id)
+
+            # تنسيق الميزات للعرض
+            features_display = ", ".join(new_features) if new_features else "لا توجد ميزات خاصة"
+
+            # إرسال رسالة التأكيد
+            await message.answer(
+                f"✅ <b>تم تحديث ميزات الرتبة بنجاح!</b>\n\n"
+                f"🔹 <b>الرتبة:</b> {emoji} {updated_rank['name']}\n"
+                f"🔹 <b>الميزات الجديدة:</b> {features_display}",
+                parse_mode=ParseMode.HTML,
+                reply_markup=reply.get_admin_keyboard()
+            )
+
+            # تسجيل العملية
+            logger.info(f"تعديل ميزات الرتبة: المشرف: {message.from_user.id}, الرتبة: {rank_id}, الميزات الجديدة: {features_str}")
+        else:
+            await message.answer(
+                "⚠️ لم يتم العثور على الرتبة. يرجى المحاولة مرة أخرى.",
+                reply_markup=reply.get_admin_keyboard()
+            )
     except Exception as e:
         logger.error(f"خطأ في تحديث ميزات الرتبة: {e}")
         await message.answer(
@@ -2428,10 +2482,10 @@ async def admin_stats_callback(callback: CallbackQuery):
 @router.callback_query(lambda c: c.data == "admin_users")
 async def admin_users_callback(callback: CallbackQuery, state: FSMContext):
     """معالج زر المستخدمين الإنلاين"""
-    # استرجاع المستخدمين
-    users, total = await get_all_users()
+    # بدء عرض المستخدمين وجلب الصفحة الأولى فقط
+    total = await _start_users_listing(state)
 
-    if not users:
+    if not total:
         await callback.message.edit_text(
             "⚠️ لا يوجد مستخدمون مسجلون حاليًا.",
             reply_markup=inline.get_back_button("admin_menu")
@@ -2439,8 +2493,7 @@ async def admin_users_callback(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
 
-    # تخزين البيانات في الحالة
-    await state.update_data(users=users, total_users=total, page=1)
+    users, _, _, _ = await _load_users_page(state)
 
     # إنشاء نص المستخدمين مشابه لـ display_users_page ولكن مع لوحة مفاتيح إنلاين
     users_text = f"👥 <b>قائمة المستخدمين ({total}):</b>\n"
@@ -2493,10 +2546,10 @@ async def admin_users_callback(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(lambda c: c.data == "admin_deposits")
 async def admin_deposits_callback(callback: CallbackQuery, state: FSMContext):
     """معالج زر طلبات الإيداع الإنلاين"""
-    # الحصول على طلبات الإيداع المعلقة
-    deposits, total = await get_pending_deposits()
+    # بدء عرض طلبات الإيداع المعلقة وجلب الصفحة الأولى فقط
+    total = await _start_deposits_listing(state, "pending")
 
-    if not deposits:
+    if not total:
         await callback.message.edit_text(
             "📭 لا توجد طلبات إيداع معلقة حاليًا.",
             reply_markup=inline.get_back_button("admin_menu")
@@ -2504,8 +2557,7 @@ async def admin_deposits_callback(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
 
-    # تخزين البيانات في الحالة
-    await state.update_data(deposits=deposits, total_deposits=total, page=1)
+    deposits, _, _, _ = await _load_deposits_page(state, "pending")
 
     # إنشاء نص طلبات الإيداع مشابه لـ display_deposits_page
     deposits_text = f"📦 <b>طلبات الإيداع المعلقة ({total}):</b>\n"
@@ -2563,11 +2615,10 @@ async def admin_deposits_callback(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(lambda c: c.data == "admin_orders")
 async def admin_orders_callback(callback: CallbackQuery, state: FSMContext):
     """معالج زر إدارة الطلبات الإنلاين"""
-    # الحصول على قائمة الطلبات
-    from database.core import get_all_orders
-    orders, total = await get_all_orders()
+    # بدء عرض الطلبات وجلب الصفحة الأولى فقط
+    total = await _start_orders_listing(state)
 
-    if not orders:
+    if not total:
         await callback.message.edit_text(
             "⚠️ لا توجد طلبات مسجلة حاليًا.",
             reply_markup=inline.get_back_button("admin_menu")
@@ -2575,8 +2626,7 @@ async def admin_orders_callback(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
 
-    # تخزين البيانات في الحالة
-    await state.update_data(orders=orders, total_orders=total, page=1)
+    orders, _, _, _ = await _load_orders_page(state)
 
     # إنشاء نص الطلبات مشابه لـ display_orders_page
     orders_text = f"🛒 <b>قائمة الطلبات ({total}):</b>\n"
@@ -2797,49 +2847,69 @@ async def show_sales_report(message: Message):
 @router.message(F.text == "🛒 إدارة الطلبات")
 async def manage_orders(message: Message, state: FSMContext):
     """معالج إدارة الطلبات"""
-    # الحصول على قائمة الطلبات
-    from database.core import get_all_orders
-    orders, total = await get_all_orders()
+    # بدء عرض الطلبات من الصفحة الأولى
+    total = await _start_orders_listing(state)
 
-    if not orders:
+    if not total:
         await message.answer(
             "⚠️ لا توجد طلبات مسجلة حاليًا.",
             reply_markup=reply.get_admin_keyboard()
         )
         return
 
-    # تخزين البيانات في الحالة
-    await state.update_data(orders=orders, total_orders=total, page=1)
-
     # عرض الطلبات
     await display_orders_page(message, state)
 
     # تعيين حالة إدارة الطلبات
     await state.set_state(AdminState.managing_orders)
 
+async def _start_orders_listing(state: FSMContext, status: Optional[str] = None, filter_name: str = "all") -> int:
+    """
+    بدء عرض قائمة الطلبات من الصفحة الأولى (مع التصفية حسب الحالة)
+
+    Returns:
+        int: العدد الإجمالي للطلبات
+    """
+    from database.core import count_orders
+    total = await count_orders(status)
+    await state.update_data(
+        orders_status=status, filter=filter_name, total_orders=total, page=1, page_cursors=[None]
+    )
+    return total
+
+async def _load_orders_page(state: FSMContext, per_page: int = 5) -> Tuple[List[Dict[str, Any]], int, int, bool]:
+    """
+    جلب الصفحة الحالية من الطلبات بالمؤشر وحفظ مؤشر الصفحة التالية
+
+    Returns:
+        (طلبات الصفحة، رقم الصفحة، عدد الصفحات، هل توجد صفحة تالية)
+    """
+    from database.core import get_orders_page
+    data = await state.get_data()
+    total_orders = data.get("total_orders", 0)
+    page_cursors = data.get("page_cursors", [None])
+    page = max(1, min(data.get("page", 1), len(page_cursors)))
+
+    orders, next_cursor = await get_orders_page(data.get("orders_status"), page_cursors[page - 1], per_page)
+    page_cursors = page_cursors[:page] + ([next_cursor] if next_cursor else [])
+    await state.update_data(page=page, page_cursors=page_cursors)
+
+    total_pages = max((total_orders + per_page - 1) // per_page, len(page_cursors), 1)
+    return orders, page, total_pages, next_cursor is not None
+
 async def display_orders_page(message: Message, state: FSMContext):
     """عرض صفحة من الطلبات"""
     # الحصول على البيانات
     data = await state.get_data()
-    orders = data.get("orders", [])
     total_orders = data.get("total_orders", 0)
-    page = data.get("page", 1)
-    per_page = 5  # عدد الطلبات في الصفحة الواحدة
-
-    # حساب عدد الصفحات
-    total_pages = (total_orders + per_page - 1) // per_page
+    orders, page, total_pages, has_next = await _load_orders_page(state)
 
     # إنشاء نص الطلبات
     orders_text = f"🛒 <b>قائمة الطلبات ({total_orders}):</b>\n"
     orders_text += f"📄 <b>الصفحة:</b> {page}/{total_pages}\n\n"
 
-    # حساب نطاق الطلبات للصفحة الحالية
-    start_idx = (page - 1) * per_page
-    end_idx = min(start_idx + per_page, len(orders))
-
     # إضافة معلومات الطلبات
-    for i in range(start_idx, end_idx):
-        order = orders[i]
+    for order in orders:
         order_id = order.get("order_id", "غير محدد")
         user_id = order.get("user_id", "غير محدد")
         username = order.get("username", "غير محدد")
@@ -2881,7 +2951,7 @@ async def display_orders_page(message: Message, state: FSMContext):
 
     navigation.append(KeyboardButton(text=f"📄 {page}/{total_pages}"))
 
-    if page < total_pages:
+    if has_next:
         navigation.append(KeyboardButton(text="التالي ▶️"))
 
     if navigation:
@@ -2923,8 +2993,7 @@ async def process_orders_management(message: Message, state: FSMContext):
     # الحصول على البيانات
     data = await state.get_data()
     page = data.get("page", 1)
-
-    from database.core import get_all_orders
+    page_cursors = data.get("page_cursors", [None])
 
     # التحقق من الأمر
     if message.text == "🔙 العودة":
@@ -2936,11 +3005,12 @@ async def process_orders_management(message: Message, state: FSMContext):
         )
         return
     elif message.text == "التالي ▶️":
-        # الانتقال للصفحة التالية
-        page += 1
-        await state.update_data(page=page)
-        # تحديث الطلبات الحالية
-        await display_orders_page(message, state)
+        # الانتقال للصفحة التالية (يوجد مؤشر لها فقط إذا لم تكن الحالية الأخيرة)
+        if page < len(page_cursors):
+            await state.update_data(page=page + 1)
+            await display_orders_page(message, state)
+        else:
+            await message.answer("⚠️ أنت بالفعل في الصفحة الأخيرة.")
         return
     elif message.text == "◀️ السابق":
         # الانتقال للصفحة السابقة
@@ -2955,38 +3025,32 @@ async def process_orders_management(message: Message, state: FSMContext):
     # تصفية حسب الحالة
     elif message.text == "🔄 الكل":
         # عرض جميع الطلبات
-        orders, total = await get_all_orders()
-        await state.update_data(orders=orders, total_orders=total, page=1, filter="all")
+        await _start_orders_listing(state, None, "all")
         await display_orders_page(message, state)
         return
     elif message.text == "🕒 معلق":
         # عرض الطلبات المعلقة
-        orders, total = await get_all_orders(status="Pending")
-        await state.update_data(orders=orders, total_orders=total, page=1, filter="pending")
+        await _start_orders_listing(state, "Pending", "pending")
         await display_orders_page(message, state)
         return
     elif message.text == "⏳ قيد المعالجة":
         # عرض الطلبات قيد المعالجة
-        orders, total = await get_all_orders(status="Processing")
-        await state.update_data(orders=orders, total_orders=total, page=1, filter="processing")
+        await _start_orders_listing(state, "Processing", "processing")
         await display_orders_page(message, state)
         return
     elif message.text == "✅ مكتمل":
         # عرض الطلبات المكتملة
-        orders, total = await get_all_orders(status="Completed")
-        await state.update_data(orders=orders, total_orders=total, page=1, filter="completed")
+        await _start_orders_listing(state, "Completed", "completed")
         await display_orders_page(message, state)
         return
     elif message.text == "❌ ملغي":
         # عرض الطلبات الملغاة
-        orders, total = await get_all_orders(status="Canceled")
-        await state.update_data(orders=orders, total_orders=total, page=1, filter="canceled")
+        await _start_orders_listing(state, "Canceled", "canceled")
         await display_orders_page(message, state)
         return
     elif message.text == "⚠️ فشل":
         # عرض الطلبات الفاشلة
-        orders, total = await get_all_orders(status="Failed")
-        await state.update_data(orders=orders, total_orders=total, page=1, filter="failed")
+        await _start_orders_listing(state, "Failed", "failed")
         await display_orders_page(message, state)
         return
     elif message.text.startswith("📄 "):
@@ -3965,6 +4029,38 @@ async def monitor_system(message: Message):
         cpu_percent = psutil.cpu_percent()
         memory_info = psutil.virtual_memory()
         disk_info = psutil.disk_usage('/')
+
+        # إحصائيات ذاكرة الكتالوج المؤقتة
+        from services.catalog import get_catalog_stats
+        catalog_stats = get_catalog_stats()
+        catalog_age = catalog_stats["age"]
+        catalog_age_text = f"{int(catalog_age)} ثانية" if catalog_age is not None else "غير محمل"
+
+        # إحصائيات مجمع اتصالات API
+        from services.api import get_api_pool_stats, get_api_health, get_api_rate_limit_stats
+        pool_stats = get_api_pool_stats()
+        api_health = get_api_health()
+        rate_stats = get_api_rate_limit_stats()
+        rate_text = "، ".join(
+            f"{name}: {stats['waiting']} ينتظر ({stats['avg_wait']:.2f} ث)"
+            for name, stats in rate_stats.items()
+        )
+        breaker_states = {
+            "closed": "🟢 يعمل",
+            "half_open": "🟡 قيد التجربة",
+            "open": "🔴 متوقف مؤقتًا",
+        }
+        breaker_text = breaker_states.get(api_health["state"], api_health["state"])
+        if api_health["retry_in"] is not None:
+            breaker_text += f" (إعادة المحاولة بعد {int(api_health['retry_in'])} ثانية)"
+
+        # إحصائيات مجمع اتصالات قاعدة البيانات
+        from database.pool import get_db_pool_stats
+        db_pool_stats = get_db_pool_stats()
+        
+        # إحصائيات الذاكرة المؤقتة للمستخدمين
+        from database.core import get_user_cache_stats
+        user_cache_stats = get_user_cache_stats()
         
         system_info = (
             f"🖥️ <b>حالة النظام:</b>\n\n"
@@ -3975,6 +4071,28 @@ async def monitor_system(message: Message):
             f"🔹 <b>عدد المستخدمين:</b> {user_count}\n"
             f"🔹 <b>عمليات الإيداع:</b> {deposit_count}\n"
             f"🔹 <b>الطلبات:</b> {order_count}\n\n"
+            f"📦 <b>كتالوج الخدمات:</b>\n"
+            f"🔹 <b>عدد الخدمات:</b> {catalog_stats['services_count']} (عمر النسخة: {catalog_age_text})\n"
+            f"🔹 <b>إصابات/قديمة/إخفاقات:</b> {catalog_stats['hits']}/{catalog_stats['stale_hits']}/{catalog_stats['misses']}\n"
+            f"🔹 <b>زمن آخر تحديث:</b> {catalog_stats['last_refresh_latency']:.2f} ثانية "
+            f"(المتوسط {catalog_stats['avg_refresh_latency']:.2f})\n\n"
+            f"🌐 <b>اتصالات API:</b>\n"
+            f"🔹 <b>المستخدمة/الخاملة:</b> {pool_stats['in_use']}/{pool_stats['idle']} "
+            f"(الحد {pool_stats['limit']}، لكل خادم {pool_stats['limit_per_host']})\n"
+            f"🔹 <b>الطلبات الجارية:</b> {pool_stats['in_flight']} (الذروة {pool_stats['peak_in_flight']}، الإجمالي {pool_stats['requests']})\n"
+            f"🔹 <b>الطلبات المدمجة:</b> {pool_stats['coalesced']}\n"
+            f"🔹 <b>حالة المزود:</b> {breaker_text}\n"
+            f"🔹 <b>إخفاقات مؤقتة/إعادة محاولة/مرفوضة:</b> {api_health['transient_failures']}/"
+            f"{api_health['retries']}/{api_health['short_circuited']}\n"
+            f"🔹 <b>تحديد المعدل:</b> {rate_text}\n\n"
+            f"🗄️ <b>قاعدة البيانات:</b>\n"
+            f"🔹 <b>اتصالات القراءة الخاملة:</b> {db_pool_stats['idle_readers']}/{db_pool_stats['readers']}\n"
+            f"🔹 <b>انتظار الكتابة:</b> {db_pool_stats['writer_wait_avg'] * 1000:.1f} مللي ثانية "
+            f"(الأقصى {db_pool_stats['writer_wait_max'] * 1000:.1f})\n"
+            f"🔹 <b>انتظار القراءة:</b> {db_pool_stats['reader_wait_avg'] * 1000:.1f} مللي ثانية "
+            f"(الأقصى {db_pool_stats['reader_wait_max'] * 1000:.1f})\n"
+            f"🔹 <b>ذاكرة المستخدمين المؤقتة:</b> {user_cache_stats['size']}/{user_cache_stats['max_size']} "
+            f"(نسبة الإصابة {user_cache_stats['hit_rate'] * 100:.1f}%)\n\n"
             f"🕒 <b>زمن تشغيل النظام:</b> {int(psutil.boot_time())} ثانية"
         )
         
@@ -2,13 +2,14 @@
 معالجات إدارة الخدمات والفئات للمشرف
 """
 
+import html
 import logging
 from typing import Dict, Any, List
 
 from aiogram import Router, F
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
 from aiogram.enums import ParseMode
 
 import config
@@ -17,7 +18,8 @@ from database.services import (
     update_category_visibility, update_service_visibility,
     create_category
 )
-from database.pricing import calculate_service_price
+from database.pricing import calculate_prices_bulk
+from database.price_matrix import export_price_matrix_csv, get_price_matrix_stats
 from database.ranks import get_all_ranks
 from services.api import get_services as get_api_services
 from states.order import AdminState
@@ -289,6 +291,7 @@ async def services_price_preview(callback: CallbackQuery, state: FSMContext):
             callback_data=f"services_preview_{rank['id']}"
         )])
     
+    keyboard_rows.append([InlineKeyboardButton(text="📥 تصدير مصفوفة الأسعار", callback_data="services_export_price_matrix")])
     keyboard_rows.append([InlineKeyboardButton(text="🔙 العودة", callback_data="services_management")])
     
     await callback.message.edit_text(
@@ -331,17 +334,18 @@ async def show_services_price_preview(callback: CallbackQuery, state: FSMContext
         total_savings = 0
         services_with_discount = 0
         
-        for i, service in enumerate(services[:5]):
-            pricing = await calculate_service_price(
-                service_id=service['id'],
-                base_price=service['base_price'],
-                user_rank_id=rank_id,
-                category_id=service['category_id']
-            )
-            
-            original = pricing['base_price']
-            final = pricing['final_price']
-            savings = pricing['savings']
+        sample = services[:5]
+        pricing = await calculate_prices_bulk(
+            service_ids=[service['id'] for service in sample],
+            base_prices=[service['base_price'] for service in sample],
+            category_ids=[service['category_id'] for service in sample],
+            user_rank_id=rank_id
+        )
+        
+        for i, service in enumerate(sample):
+            original = service['base_price']
+            final = pricing['final_prices'][i]
+            savings = pricing['savings'][i]
             
             if savings > 0:
                 services_with_discount += 1
@@ -375,6 +379,98 @@ async def show_services_price_preview(callback: CallbackQuery, state: FSMContext
         logger.error(f"خطأ في معاينة أسعار الخدمات: {e}")
         await callback.answer("❌ حدث خطأ أثناء تحميل معاينة الأسعار.")
 
+@router.callback_query(F.data == "services_export_price_matrix")
+async def export_price_matrix_handler(callback: CallbackQuery, state: FSMContext):
+    """تصدير مصفوفة الأسعار (خدمة × رتبة) كملف CSV"""
+    if callback.from_user.id not in config.ADMIN_IDS:
+        return
+    
+    try:
+        content = await export_price_matrix_csv()
+        stats = get_price_matrix_stats()
+        
+        await callback.message.answer_document(
+            BufferedInputFile(content.encode("utf-8-sig"), filename="price_matrix.csv"),
+            caption=f"📥 مصفوفة الأسعار: {stats['services']} خدمة × الرتب ({stats['entries']} سعر)"
+        )
+        await callback.answer()
+        
+    except Exception as e:
+        logger.error(f"خطأ في تصدير مصفوفة الأسعار: {e}")
+        await callback.answer("❌ حدث خطأ أثناء تصدير مصفوفة الأسعار.")
+
+@router.callback_query(F.data.startswith("services_full_preview_"))
+async def show_services_full_price_preview(callback: CallbackQuery, state: FSMContext):
+    """عرض أسعار جميع الخدمات النشطة لرتبة محددة (محسوبة دفعة واحدة)"""
+    if callback.from_user.id not in config.ADMIN_IDS:
+        return
+    
+    try:
+        rank_id = int(callback.data.split("_")[-1])
+        
+        services = await get_services(include_inactive=False)
+        if not services:
+            await callback.answer("❌ لا توجد خدمات نشطة للمعاينة.")
+            return
+        
+        pricing = await calculate_prices_bulk(
+            service_ids=[service['id'] for service in services],
+            base_prices=[service['base_price'] for service in services],
+            category_ids=[service['category_id'] for service in services],
+            user_rank_id=rank_id
+        )
+        
+        from database.ranks import get_rank_name, get_rank_emoji
+        rank_emoji = get_rank_emoji(rank_id)
+        rank_name = html.escape(get_rank_name(rank_id))
+        
+        lines = []
+        current_category = None
+        for i, service in enumerate(services):
+            if service.get('category_name') != current_category:
+                current_category = service.get('category_name')
+                lines.append(f"\n📂 <b>{html.escape(current_category or 'بدون فئة')}</b>")
+            
+            # أسماء الخدمات والفئات قادمة من المزود وقد تحتوي على رموز HTML
+            service_name = html.escape(service['name'][:35])
+            final = pricing['final_prices'][i]
+            if pricing['savings'][i] > 0:
+                lines.append(f"🔸 {service_name} - <s>${service['base_price']:.2f}</s> ${final:.2f}")
+            else:
+                lines.append(f"🔸 {service_name} - ${final:.2f}")
+        
+        lines.append(
+            f"\n📊 <b>الإجمالي:</b> {len(services)} خدمة، "
+            f"{sum(1 for savings in pricing['savings'] if savings > 0)} مخفضة، "
+            f"وفورات ${sum(pricing['savings']):.2f}"
+        )
+        
+        # تقسيم القائمة إلى رسائل ضمن حد طول رسائل تيليجرام
+        messages = []
+        text = f"📄 <b>أسعار جميع الخدمات - {rank_emoji} {rank_name}</b>\n"
+        for line in lines:
+            if len(text) + len(line) + 1 > 4000:
+                messages.append(text)
+                text = ""
+            text += line + "\n"
+        messages.append(text)
+        
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🔙 العودة", callback_data=f"services_preview_{rank_id}")]
+        ])
+        
+        for i, part in enumerate(messages):
+            await callback.message.answer(
+                part,
+                parse_mode=ParseMode.HTML,
+                reply_markup=keyboard if i == len(messages) - 1 else None
+            )
+        await callback.answer()
+        
+    except Exception as e:
+        logger.error(f"خطأ في عرض أسعار جميع الخدمات: {e}")
+        await callback.answer("❌ حدث خطأ أثناء تحميل أسعار الخدمات.")
+
 # إضافة callback لإدارة الخدمات (placeholder)
 @router.callback_query(F.data == "services_management")
 async def back_to_services_management(callback: CallbackQuery, state: FSMContext):
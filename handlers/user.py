@@ -18,7 +18,8 @@ from database.core import get_user, update_user_balance
 from database.deposit import create_deposit_request, update_deposit_receipt
 from utils.common import format_money, validate_number
 import config
-from services.api import get_services, organize_services_by_category, add_order, check_order_status, get_user_orders
+from services.api import add_order, check_order_status, get_user_orders
+from services.catalog import CatalogSnapshot, get_catalog_snapshot, pin_snapshot, get_pinned_snapshot, release_snapshot
 
 # إنشاء مسجل
 logger = logging.getLogger("smm_bot")
@@ -78,29 +79,51 @@ async def cmd_start(message: Message):
         reply_markup=keyboard
     )
 
+async def _get_order_snapshot(state: FSMContext, user_id: int) -> Optional[CatalogSnapshot]:
+    """الحصول على لقطة الكتالوج التي بدأت بها جلسة الطلب الحالية"""
+    data = await state.get_data()
+    snapshot = get_pinned_snapshot(user_id, data.get("catalog_version"))
+
+    if snapshot is None:
+        # تم تحرير اللقطة (جلسة قديمة): الانتقال إلى أحدث لقطة
+        snapshot = await get_catalog_snapshot()
+        if snapshot is not None:
+            pin_snapshot(user_id, snapshot)
+            await state.update_data(catalog_version=snapshot.version)
+
+    return snapshot
+
+async def _get_selected_service(state: FSMContext, user_id: int) -> Dict[str, Any]:
+    """الحصول على الخدمة المختارة من لقطة الكتالوج بواسطة معرفها المخزن"""
+    data = await state.get_data()
+    snapshot = await _get_order_snapshot(state, user_id)
+    if snapshot is None:
+        return {}
+    return snapshot.get_service(data.get("selected_service_id")) or {}
+
+async def _clear_order_state(state: FSMContext, user_id: int) -> None:
+    """إنهاء جلسة الطلب وتحرير لقطة الكتالوج المحجوزة"""
+    release_snapshot(user_id)
+    await state.clear()
+
 @router.message(F.text == "🔄 طلب جديد")
 async def new_order(message: Message, state: FSMContext):
     """معالج طلب جديد"""
-    # الحصول على الخدمات من API
-    services = await get_services()
+    # الحصول على أحدث لقطة من الكتالوج المشترك (يتم تحديثه في الخلفية)
+    snapshot = await get_catalog_snapshot()
 
-    if not services:
+    if not snapshot or not snapshot.services:
         await message.answer("⚠️ عذرًا، لا يمكن الحصول على قائمة الخدمات حاليًا. يرجى المحاولة لاحقًا.")
         return
 
-    # تنظيم الخدمات حسب الفئة
-    categories = organize_services_by_category(services)
-
-    # تخزين الخدمات في حالة المستخدم للاستخدام لاحقًا
-    await state.update_data(categories=categories)
-
-    # إنشاء قائمة بأسماء الفئات
-    category_names = list(categories.keys())
+    # حجز اللقطة للجلسة وتخزين رقم إصدارها فقط في حالة المستخدم
+    pin_snapshot(message.from_user.id, snapshot)
+    await state.update_data(catalog_version=snapshot.version)
 
     # عرض الفئات للمستخدم
     await message.answer(
         "🔍 يرجى اختيار الفئة المطلوبة:",
-        reply_markup=reply.get_categories_keyboard([(i, name) for i, name in enumerate(category_names)])
+        reply_markup=reply.get_categories_keyboard([(i, name) for i, name in enumerate(snapshot.category_names)])
     )
 
     # تعيين حالة اختيار الفئة
@@ -109,27 +132,27 @@ async def new_order(message: Message, state: FSMContext):
 @router.message(OrderState.selecting_category)
 async def process_category_selection(message: Message, state: FSMContext):
     """معالج اختيار الفئة"""
-    # الحصول على البيانات المخزنة
-    data = await state.get_data()
-    categories = data.get("categories", {})
-    category_names = list(categories.keys())
-
     # التحقق من صحة اختيار الفئة
     if message.text == "🔙 العودة":
         # العودة للقائمة الرئيسية
-        await state.clear()
+        await _clear_order_state(state, message.from_user.id)
         await message.answer(
             "🔄 تم العودة إلى القائمة الرئيسية.",
             reply_markup=reply.get_main_keyboard()
         )
         return
 
+    # الحصول على لقطة الكتالوج الخاصة بالجلسة
+    snapshot = await _get_order_snapshot(state, message.from_user.id)
+    if snapshot is None:
+        await message.answer("⚠️ عذرًا، لا يمكن الحصول على قائمة الخدمات حاليًا. يرجى المحاولة لاحقًا.")
+        await _clear_order_state(state, message.from_user.id)
+        return
+
+    category_names = snapshot.category_names
+
     # البحث عن الفئة المختارة
-    selected_category = None
-    for name in category_names:
-        if message.text == name:
-            selected_category = name
-            break
+    selected_category = message.text if message.text in snapshot.categories else None
 
     if not selected_category:
         await message.answer(
@@ -142,14 +165,14 @@ async def process_category_selection(message: Message, state: FSMContext):
     await state.update_data(selected_category=selected_category)
 
     # الحصول على خدمات الفئة المختارة
-    services = categories.get(selected_category, [])
+    services = snapshot.get_category(selected_category)
 
     if not services:
         await message.answer(
             "⚠️ لا توجد خدمات متاحة في هذه الفئة حاليًا.",
             reply_markup=reply.get_main_keyboard()
         )
-        await state.clear()
+        await _clear_order_state(state, message.from_user.id)
         return
 
     # عرض عنوان الخدمات
@@ -174,34 +197,29 @@ async def process_service_selection(message: Message, state: FSMContext):
         # إذا كان العودة، نعود للفئات، وإلا نعود للقائمة الرئيسية
         if message.text == "🔙 العودة":
             # العودة لاختيار الفئات
-            # الحصول على الخدمات من API
-            services = await get_services()
+            # الحصول على أحدث لقطة من الكتالوج المشترك (يتم تحديثه في الخلفية)
+            snapshot = await get_catalog_snapshot()
 
-            if not services:
+            if not snapshot or not snapshot.services:
                 await message.answer("⚠️ عذرًا، لا يمكن الحصول على قائمة الخدمات حاليًا. يرجى المحاولة لاحقًا.")
-                await state.clear()
+                await _clear_order_state(state, message.from_user.id)
                 return
 
-            # تنظيم الخدمات حسب الفئة
-            categories = organize_services_by_category(services)
-
-            # تخزين الخدمات في حالة المستخدم للاستخدام لاحقًا
-            await state.update_data(categories=categories)
-
-            # إنشاء قائمة بأسماء الفئات
-            category_names = list(categories.keys())
+            # حجز اللقطة للجلسة وتخزين رقم إصدارها فقط في حالة المستخدم
+            pin_snapshot(message.from_user.id, snapshot)
+            await state.update_data(catalog_version=snapshot.version)
 
             # عرض الفئات للمستخدم
             await message.answer(
                 "🔍 يرجى اختيار الفئة المطلوبة:",
-                reply_markup=reply.get_categories_keyboard([(i, name) for i, name in enumerate(category_names)])
+                reply_markup=reply.get_categories_keyboard([(i, name) for i, name in enumerate(snapshot.category_names)])
             )
 
             # تعيين حالة اختيار الفئة
             await state.set_state(OrderState.selecting_category)
         else:
             # إلغاء الطلب كليًا
-            await state.clear()
+            await _clear_order_state(state, message.from_user.id)
             await message.answer(
                 "🔄 تم إلغاء الطلب والعودة إلى القائمة الرئيسية.",
                 reply_markup=reply.get_main_keyboard()
@@ -210,50 +228,12 @@ async def process_service_selection(message: Message, state: FSMContext):
 
     # الحصول على البيانات المخزنة
     data = await state.get_data()
-    categories = data.get("categories", {})
     selected_category = data.get("selected_category", "")
+    snapshot = await _get_order_snapshot(state, message.from_user.id)
 
-    # البحث عن الخدمة المختارة
-    services = categories.get(selected_category, [])
-    selected_service = None
-
-    # استخراج رقم الخدمة من النص المحدد باستخدام تعبير منتظم
-    import re
-    service_id = None
-
-    # البحث عن رقم بعده نقطة في بداية النص (مثل "123. اسم الخدمة")
-    match = re.match(r'(\d+)\.', message.text)
-    if match:
-        service_id = int(match.group(1))
-
-    # البحث عن الخدمة بناءً على الرقم
-    if service_id:
-        for service in services:
-            if service.get("service") == service_id:
-                selected_service = service
-                break
-
-    # إذا لم نجد حسب الرقم، نبحث في النص الكامل
-    if not selected_service:
-        # نبحث عن كل النص بنفس الصيغة
-        for service in services:
-            service_id = service.get("service", "غير محدد")
-            name = service.get("name", "غير محدد")
-            price = service.get("rate", "غير محدد")
-
-            # تحديد نوع التسعير للمطابقة مع نص الزر
-            try:
-                max_order = int(service.get("max", 0)) if isinstance(service.get("max"), str) else service.get("max", 0)
-                price_format = "للباقة" if max_order == 1 else "لكل 1000"
-            except (ValueError, TypeError):
-                price_format = "لكل 1000"
-
-            # نفس الصيغة المستخدمة للزر مع نوع التسعير
-            button_text = f"{service_id}. {name} ({price}$ {price_format})"
-
-            if message.text.strip() == button_text:
-                selected_service = service
-                break
+    # البحث عن الخدمة المختارة عبر فهرس اللقطة (نص الزر أو رقم الخدمة)
+    services = snapshot.get_category(selected_category) if snapshot else ()
+    selected_service = snapshot.find_service(selected_category, message.text) if snapshot else None
 
     if not selected_service:
         # عرض الخدمات مرة أخرى مع رسالة خطأ
@@ -263,8 +243,8 @@ async def process_service_selection(message: Message, state: FSMContext):
         )
         return
 
-    # تخزين الخدمة المختارة
-    await state.update_data(selected_service=selected_service)
+    # تخزين معرف الخدمة المختارة فقط (تفاصيلها موجودة في لقطة الكتالوج)
+    await state.update_data(selected_service_id=selected_service.get("service"))
 
     # عرض تفاصيل الخدمة
     from utils.common import format_service_info
@@ -286,7 +266,7 @@ async def process_link_input(message: Message, state: FSMContext):
     """معالج إدخال الرابط"""
     # إلغاء الطلب
     if message.text == "❌ إلغاء":
-        await state.clear()
+        await _clear_order_state(state, message.from_user.id)
         await message.answer(
             "🔄 تم إلغاء الطلب والعودة إلى القائمة الرئيسية.",
             reply_markup=reply.get_main_keyboard()
@@ -306,9 +286,8 @@ async def process_link_input(message: Message, state: FSMContext):
     # تخزين الرابط
     await state.update_data(link=link)
 
-    # الحصول على البيانات المخزنة
-    data = await state.get_data()
-    selected_service = data.get("selected_service", {})
+    # الحصول على الخدمة المختارة
+    selected_service = await _get_selected_service(state, message.from_user.id)
 
     # الحصول على الحد الأدنى والأقصى للطلب
     min_order = selected_service.get("min", MIN_ORDER)
@@ -330,7 +309,7 @@ async def process_quantity_input(message: Message, state: FSMContext):
     """معالج إدخال الكمية"""
     # إلغاء الطلب
     if message.text == "❌ إلغاء":
-        await state.clear()
+        await _clear_order_state(state, message.from_user.id)
         await message.answer(
             "🔄 تم إلغاء الطلب والعودة إلى القائمة الرئيسية.",
             reply_markup=reply.get_main_keyboard()
@@ -349,7 +328,7 @@ async def process_quantity_input(message: Message, state: FSMContext):
 
     # الحصول على البيانات المخزنة
     data = await state.get_data()
-    selected_service = data.get("selected_service", {})
+    selected_service = await _get_selected_service(state, message.from_user.id)
 
     # الحصول على الحد الأدنى والأقصى للطلب
     try:
@@ -406,17 +385,21 @@ async def process_quantity_input(message: Message, state: FSMContext):
         # الحصول على رتبة المستخدم
         from database.ranks import get_user_rank
         from database.pricing import calculate_service_price
+        from database.price_matrix import quote_price
         
         user_rank = await get_user_rank(message.from_user.id)
         user_rank_id = user_rank.get('id', 6)  # افتراضي: جديد
         service_id = selected_service.get('service', 0)
         
-        # حساب السعر النهائي مع الخصومات
-        pricing_result = await calculate_service_price(
-            service_id=service_id,
-            base_price=base_price,
-            user_rank_id=user_rank_id
-        )
+        # حساب السعر النهائي مع الخصومات من مصفوفة الأسعار المحسوبة مسبقًا
+        pricing_result = await quote_price(service_id, user_rank_id, base_price)
+        if pricing_result is None:
+            # الخدمة غير موجودة في الكتالوج المحلي بعد
+            pricing_result = await calculate_service_price(
+                service_id=service_id,
+                base_price=base_price,
+                user_rank_id=user_rank_id
+            )
         
         final_price = pricing_result['final_price']
         rank_discount = pricing_result.get('rank_discount', 0.0)
@@ -467,7 +450,7 @@ async def process_quantity_input(message: Message, state: FSMContext):
             "⚠️ حدث خطأ في استرجاع بيانات حسابك. يرجى المحاولة مرة أخرى لاحقًا.",
             reply_markup=reply.get_main_keyboard()
         )
-        await state.clear()
+        await _clear_order_state(state, message.from_user.id)
         return
 
     # التحقق من صحة قيمة الرصيد
@@ -534,7 +517,7 @@ async def process_quantity_input(message: Message, state: FSMContext):
         )
 
         # إنهاء العملية
-        await state.clear()
+        await _clear_order_state(state, message.from_user.id)
         return
 
     # إذا كان الرصيد كافياً
@@ -562,7 +545,7 @@ async def process_order_confirmation(message: Message, state: FSMContext):
         try:
             # الحصول على البيانات المخزنة
             data = await state.get_data()
-            selected_service = data.get("selected_service", {})
+            selected_service = await _get_selected_service(state, message.from_user.id)
             link = data.get("link", "")
             quantity = data.get("quantity", 0)
             price = data.get("price", 0)
@@ -583,7 +566,7 @@ async def process_order_confirmation(message: Message, state: FSMContext):
                     "❌ حدث خطأ أثناء الاتصال بنظام الطلبات. يرجى المحاولة مرة أخرى لاحقًا.",
                     reply_markup=reply.get_main_keyboard()
                 )
-                await state.clear()
+                await _clear_order_state(state, message.from_user.id)
                 return
 
             if "error" in order_result:
@@ -592,7 +575,7 @@ async def process_order_confirmation(message: Message, state: FSMContext):
                     f"❌ حدث خطأ أثناء إرسال الطلب: {error_message}",
                     reply_markup=reply.get_main_keyboard()
                 )
-                await state.clear()
+                await _clear_order_state(state, message.from_user.id)
                 return
 
             if "order" not in order_result:
@@ -600,7 +583,7 @@ async def process_order_confirmation(message: Message, state: FSMContext):
                     "❌ حدث خطأ في إنشاء الطلب. يرجى التحقق من البيانات والمحاولة مرة أخرى.",
                     reply_markup=reply.get_main_keyboard()
                 )
-                await state.clear()
+                await _clear_order_state(state, message.from_user.id)
                 return
 
             # استخراج معرف الطلب
@@ -616,7 +599,7 @@ async def process_order_confirmation(message: Message, state: FSMContext):
                     "❌ حدث خطأ أثناء خصم المبلغ من رصيدك. يرجى التواصل مع الإدارة.",
                     reply_markup=reply.get_main_keyboard()
                 )
-                await state.clear()
+                await _clear_order_state(state, message.from_user.id)
                 return
 
             # إنشاء سجل للطلب في قاعدة البيانات (إذا كانت هناك وظيفة كهذه)
@@ -689,7 +672,7 @@ async def process_order_confirmation(message: Message, state: FSMContext):
         return
 
     # إنهاء العملية
-    await state.clear()
+    await _clear_order_state(state, message.from_user.id)
 
 @router.message(F.text == "🔍 طلباتي السابقة")
 async def show_my_orders(message: Message, state: FSMContext):
@@ -697,19 +680,19 @@ async def show_my_orders(message: Message, state: FSMContext):
     user_id = message.from_user.id
 
     try:
-        # الحصول على طلبات المستخدم من قاعدة البيانات المحلية
-        from database.core import get_user_orders as get_local_orders
-        orders, total = await get_local_orders(user_id)
+        # عدد طلبات المستخدم في قاعدة البيانات المحلية (الصفحات نفسها تُجلب عند العرض)
+        from database.core import count_user_orders
+        total = await count_user_orders(user_id)
 
-        if not orders:
+        if not total:
             await message.answer(
                 "📭 لا توجد طلبات سابقة لديك حتى الآن.",
                 reply_markup=reply.get_main_keyboard()
             )
             return
 
-        # تخزين البيانات في الحالة
-        await state.update_data(orders=orders, total=total, page=1)
+        # تخزين البيانات في الحالة (مؤشر كل صفحة تمت زيارتها، الأولى بدون مؤشر)
+        await state.update_data(total=total, page=1, page_cursors=[None])
 
         # عرض الصفحة الأولى
         await display_orders_page(message, state)
@@ -727,25 +710,24 @@ async def display_orders_page(message: Message, state: FSMContext):
     """عرض صفحة من الطلبات السابقة"""
     # الحصول على البيانات
     data = await state.get_data()
-    orders = data.get("orders", [])
     total = data.get("total", 0)
-    page = data.get("page", 1)
+    page_cursors = data.get("page_cursors", [None])
+    page = max(1, min(data.get("page", 1), len(page_cursors)))
     per_page = 5  # عدد العناصر في الصفحة
 
-    # حساب عدد الصفحات
-    total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+    # جلب الصفحة الحالية فقط بالمؤشر، وحفظ مؤشر الصفحة التالية
+    from database.core import get_user_orders_page
+    orders, next_cursor = await get_user_orders_page(message.from_user.id, page_cursors[page - 1], per_page)
+    page_cursors = page_cursors[:page] + ([next_cursor] if next_cursor else [])
+    await state.update_data(page_cursors=page_cursors)
 
-    # تأكد من أن الصفحة ضمن النطاق
-    page = max(1, min(page, total_pages))
+    # حساب عدد الصفحات
+    total_pages = max((total + per_page - 1) // per_page, len(page_cursors), 1)
 
     # إنشاء رسالة بالطلبات
     orders_text = f"📋 <b>طلباتك السابقة ({total}):</b>\n"
     orders_text += f"📄 <b>الصفحة:</b> {page}/{total_pages}\n\n"
 
-    # حساب النطاق للصفحة الحالية
-    start_idx = (page - 1) * per_page
-    end_idx = min(start_idx + per_page, len(orders))
-
     # تنسيق حالة الطلب
     status_map = {
         "pending": "⏳ قيد الانتظار",
@@ -759,8 +741,7 @@ async def display_orders_page(message: Message, state: FSMContext):
     }
 
     # إضافة الطلبات
-    for i in range(start_idx, end_idx):
-        order = orders[i]
+    for order in orders:
         # استخراج المعلومات بشكل صحيح مع التحقق من وجود القيم
         order_id = order.get("order_id", "غير محدد")
         service_id = order.get("service_id", "غير محدد")
@@ -893,14 +874,10 @@ async def next_orders_page(message: Message, state: FSMContext):
     """معالج الانتقال للصفحة التالية من الطلبات"""
     data = await state.get_data()
     page = data.get("page", 1)
-    total = data.get("total", 0)
-    per_page = 5
-    
-    # حساب إجمالي الصفحات
-    total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+    page_cursors = data.get("page_cursors", [None])
     
-    # تحديث الصفحة
-    if page < total_pages:
+    # تحديث الصفحة (يوجد مؤشر للصفحة التالية فقط إذا لم تكن الحالية الأخيرة)
+    if page < len(page_cursors):
         await state.update_data(page=page+1)
     
     # عرض الصفحة
@@ -1471,19 +1448,19 @@ async def show_deposit_history(message: Message, state: FSMContext):
     try:
         user_id = message.from_user.id
 
-        # الحصول على طلبات إيداع المستخدم
-        from database.deposit import get_user_deposits
-        deposits, total = await get_user_deposits(user_id)
+        # عدد طلبات إيداع المستخدم (الصفحات نفسها تُجلب عند العرض)
+        from database.deposit import count_deposits
+        total = await count_deposits(user_id=user_id)
 
-        if not deposits:
+        if not total:
             await message.answer(
                 "📭 لا توجد طلبات إيداع سابقة لديك حتى الآن.",
                 reply_markup=reply.get_main_keyboard()
             )
             return
 
-        # تخزين البيانات في الحالة
-        await state.update_data(deposits=deposits, total=total, page=1)
+        # تخزين البيانات في الحالة (مؤشر كل صفحة تمت زيارتها، الأولى بدون مؤشر)
+        await state.update_data(total=total, page=1, page_cursors=[None])
 
         # عرض الصفحة الأولى
         await display_deposits_page(message, state)
@@ -1502,28 +1479,28 @@ async def display_deposits_page(message: Message, state: FSMContext):
     """عرض صفحة من تاريخ الإيداعات"""
     # الحصول على البيانات
     data = await state.get_data()
-    deposits = data.get("deposits", [])
     total = data.get("total", 0)
-    page = data.get("page", 1)
+    page_cursors = data.get("page_cursors", [None])
+    page = max(1, min(data.get("page", 1), len(page_cursors)))
     per_page = 5  # عدد العناصر في الصفحة
 
-    # حساب عدد الصفحات
-    total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+    # جلب الصفحة الحالية فقط بالمؤشر، وحفظ مؤشر الصفحة التالية
+    from database.deposit import get_deposits_page
+    deposits, next_cursor = await get_deposits_page(
+        user_id=message.from_user.id, cursor=page_cursors[page - 1], limit=per_page
+    )
+    page_cursors = page_cursors[:page] + ([next_cursor] if next_cursor else [])
+    await state.update_data(page_cursors=page_cursors)
 
-    # تأكد من أن الصفحة ضمن النطاق
-    page = max(1, min(page, total_pages))
+    # حساب عدد الصفحات
+    total_pages = max((total + per_page - 1) // per_page, len(page_cursors), 1)
 
     # إنشاء رسالة بطلبات الإيداع
     deposits_text = f"📋 <b>تاريخ الإيداعات ({total}):</b>\n"
     deposits_text += f"📄 <b>الصفحة:</b> {page}/{total_pages}\n\n"
 
-    # حساب النطاق للصفحة الحالية
-    start_idx = (page - 1) * per_page
-    end_idx = min(start_idx + per_page, len(deposits))
-
     # إضافة الإيداعات
-    for i in range(start_idx, end_idx):
-        deposit = deposits[i]
+    for deposit in deposits:
         status_map = {
             "pending": "🕒 قيد الانتظار",
             "approved": "✅ تمت الموافقة",
@@ -1574,14 +1551,10 @@ async def next_deposits_page(message: Message, state: FSMContext):
     """معالج الانتقال للصفحة التالية من الإيداعات"""
     data = await state.get_data()
     page = data.get("page", 1)
-    total = data.get("total", 0)
-    per_page = 5
-    
-    # حساب إجمالي الصفحات
-    total_pages = (total + per_page - 1) // per_page if total > 0 else 1
+    page_cursors = data.get("page_cursors", [None])
     
-    # تحديث الصفحة
-    if page < total_pages:
+    # تحديث الصفحة (يوجد مؤشر للصفحة التالية فقط إذا لم تكن الحالية الأخيرة)
+    if page < len(page_cursors):
         await state.update_data(page=page+1)
     
     # عرض الصفحة
@@ -7,6 +7,7 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemo
 
 # Add this import if config.py is not already imported.
 import config
+from utils.common import format_service_button_text
 
 # تعريف الأزرار المشتركة
 _BACK_BUTTON = KeyboardButton(text="🔙 العودة للقائمة الرئيسية")
@@ -288,19 +289,8 @@ def get_services_keyboard(services: List[dict]) -> ReplyKeyboardMarkup:
     """
     keyboard = []
     for service in services:
-        service_id = service.get("service", "غير محدد")
-        name = service.get("name", "غير محدد")
-        price = service.get("rate", "غير محدد")
-
-        # تحديد نوع التسعير وتنسيق السعر
-        try:
-            max_order = int(service.get("max", 0)) if isinstance(service.get("max"), str) else service.get("max", 0)
-            price_format = "للباقة" if max_order == 1 else "لكل 1000"
-        except (ValueError, TypeError):
-            price_format = "لكل 1000"
-
-        # تنسيق نص الزر مع نوع التسعير
-        button_text = f"{service_id}. {name} ({price}$ {price_format})"
+        # نفس نص الزر المستخدم في فهرس لقطة الكتالوج للبحث عن الخدمة
+        button_text = format_service_button_text(service)
 
         keyboard.append([KeyboardButton(text=button_text)])
 
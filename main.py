@@ -14,7 +14,7 @@ import aiosqlite
 from aiogram import Dispatcher
 
 import config
-from bot import bot, dp, cleanup_resources, start_order_updater
+from bot import bot, dp, cleanup_resources, start_order_updater, start_catalog_refresher, start_pricing_scheduler
 from database import init_all_db
 from handlers import admin_router, user_router
 from utils.common import setup_logging
@@ -71,10 +71,18 @@ async def main():
         from handlers import pricing_router
         dp.include_router(pricing_router)
         
+        # بدء مهمة تحديث كتالوج الخدمات
+        logger.info("جاري بدء مهمة تحديث كتالوج الخدمات...")
+        await start_catalog_refresher()
+
         # بدء مهمة تحديث حالة الطلبات
         logger.info("جاري بدء مهمة تحديث حالة الطلبات...")
         await start_order_updater()
 
+        # بدء مجدول فترات صلاحية قواعد التسعير
+        logger.info("جاري بدء مجدول قواعد التسعير...")
+        await start_pricing_scheduler()
+
         # بدء استقبال التحديثات
         logger.info(f"بدء تشغيل البوت: @{(await bot.get_me()).username}")
         await dp.start_polling(bot)
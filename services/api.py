@@ -9,7 +9,11 @@ import os
 import logging
 import aiohttp
 import json
-from typing import Dict, List, Any, Optional
+import time
+import heapq
+import random
+import itertools
+from typing import Dict, List, Any, Optional, Tuple
 import asyncio
 from dotenv import load_dotenv
 
@@ -23,42 +27,495 @@ logger = logging.getLogger("smm_bot")
 API_KEY = os.getenv("API_KEY")
 API_URL = os.getenv("API_URL", "https://garren.store/api/v2")
 
+# إعدادات مجمع الاتصالات مع المزود
+API_POOL_LIMIT = int(os.getenv("API_POOL_LIMIT", "100"))                   # الحد الأقصى لإجمالي الاتصالات
+API_POOL_LIMIT_PER_HOST = int(os.getenv("API_POOL_LIMIT_PER_HOST", "30"))  # الحد الأقصى للاتصالات بنفس الخادم
+API_KEEPALIVE_TIMEOUT = float(os.getenv("API_KEEPALIVE_TIMEOUT", "60"))    # مدة إبقاء الاتصال الخامل مفتوحًا
+API_DNS_CACHE_TTL = int(os.getenv("API_DNS_CACHE_TTL", "300"))             # مدة تخزين نتائج DNS مؤقتًا
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "5"))         # مهلة إنشاء الاتصال (بما فيها TLS)
+API_READ_TIMEOUT = float(os.getenv("API_READ_TIMEOUT", "25"))              # مهلة قراءة الاستجابة
+API_TOTAL_TIMEOUT = float(os.getenv("API_TOTAL_TIMEOUT", "30"))            # المهلة الإجمالية للطلب
+
+# سياسة دمج الطلبات المتطابقة المتزامنة لكل إجراء (القراءة فقط آمنة للدمج)
+COALESCE_POLICY = {
+    "services": True,
+    "balance": True,
+    "status": True,
+    "add": False,
+    "refill": False,
+    "cancel": False,
+}
+# إجراءات لها آثار جانبية لا يتم دمجها حتى لو طُلب ذلك صراحة
+NEVER_COALESCE = frozenset({"add", "refill", "cancel"})
+
+# سياسة إعادة المحاولة لكل إجراء: إجراءات القراءة فقط يُعاد إرسالها بعد الفشل المؤقت،
+# أما الإجراءات التي تنشئ أو تعدل شيئًا فتُرسل مرة واحدة فقط لتجنب تكرار التنفيذ
+DEFAULT_RETRY_POLICY = {"attempts": 1, "base_delay": 0.5, "max_delay": 5.0}
+RETRY_POLICY = {
+    "services": {"attempts": 3, "base_delay": 1.0, "max_delay": 8.0},
+    "balance": {"attempts": 3, "base_delay": 0.5, "max_delay": 4.0},
+    "status": {"attempts": 3, "base_delay": 0.5, "max_delay": 4.0},
+    "add": {"attempts": 1, "base_delay": 0.0, "max_delay": 0.0},
+}
+
+# تحديد معدل الطلبات نحو المزود: (رمز في الثانية، السعة القصوى) لكل فئة إجراءات.
+# القيم قابلة للتعديل عبر API_RATE_<CLASS> و API_BURST_<CLASS>، والمعدل 0 يعطل الدلو
+RATE_LIMIT_DEFAULTS = {
+    "global": (10.0, 20.0),
+    "orders": (5.0, 10.0),
+    "catalog": (1.0, 2.0),
+    "account": (2.0, 4.0),
+    "status": (4.0, 8.0),
+}
+ACTION_CLASSES = {
+    "add": "orders",
+    "refill": "orders",
+    "cancel": "orders",
+    "services": "catalog",
+    "balance": "account",
+    "status": "status",
+}
+# أولوية كل فئة عند الانتظار (الرقم الأصغر أولاً): طلبات المستخدمين قبل الاستعلام الخلفي
+ACTION_CLASS_PRIORITY = {
+    "orders": 0,
+    "account": 1,
+    "catalog": 1,
+    "status": 2,
+}
+
+# إعدادات قاطع الدائرة
+API_BREAKER_FAILURE_THRESHOLD = int(os.getenv("API_BREAKER_FAILURE_THRESHOLD", "5"))
+API_BREAKER_RECOVERY_TIMEOUT = float(os.getenv("API_BREAKER_RECOVERY_TIMEOUT", "30"))
+API_BREAKER_HALF_OPEN_MAX_CALLS = int(os.getenv("API_BREAKER_HALF_OPEN_MAX_CALLS", "1"))
+
 # جلسة HTTP عامة للاستخدام في جميع الطلبات
 _session = None
+_connector = None
+
+# عدادات مراقبة مجمع الاتصالات
+_pool_stats = {
+    "requests": 0,
+    "in_flight": 0,
+    "peak_in_flight": 0,
+    "sessions_created": 0,
+    "coalesced": 0,
+}
+
+# عدادات إعادة المحاولة وقاطع الدائرة
+_resilience_stats = {
+    "retries": 0,
+    "transient_failures": 0,
+    "short_circuited": 0,
+}
+
+# الطلبات الجارية القابلة للدمج: مفتاح الطلب -> المهمة
+_inflight: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], asyncio.Future] = {}
 
 async def init_api_session():
     """
     تهيئة جلسة API للاتصال بالخدمة الخارجية
-    
+
+    تستخدم الجلسة مجمع اتصالات مشترك يعيد استخدام الاتصالات المفتوحة
+    (keep-alive) ويخزن نتائج DNS مؤقتًا لتجنب تكرار المصافحة مع الخادم.
+
     Returns:
         aiohttp.ClientSession: جلسة الاتصال
     """
-    global _session
-    if _session is None:
-        _session = aiohttp.ClientSession()
-        logger.info("تم تهيئة جلسة API")
+    global _session, _connector
+    if _session is None or _session.closed:
+        _connector = aiohttp.TCPConnector(
+            limit=API_POOL_LIMIT,
+            limit_per_host=API_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=API_DNS_CACHE_TTL,
+            use_dns_cache=True,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=API_TOTAL_TIMEOUT,
+            connect=API_CONNECT_TIMEOUT,
+            sock_read=API_READ_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(connector=_connector, timeout=timeout)
+        _pool_stats["sessions_created"] += 1
+        logger.info(
+            f"تم تهيئة جلسة API (حد الاتصالات: {API_POOL_LIMIT}، لكل خادم: {API_POOL_LIMIT_PER_HOST}، "
+            f"keep-alive: {API_KEEPALIVE_TIMEOUT} ثانية)"
+        )
     return _session
 
 async def close_api_session():
     """إغلاق جلسة API وتحرير الموارد"""
-    global _session
+    global _session, _connector
     if _session:
         await _session.close()
         _session = None
+        _connector = None
         logger.info("تم إغلاق جلسة API")
 
-async def make_api_request(action: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+def get_api_pool_stats() -> Dict[str, Any]:
+    """
+    الحصول على إحصائيات مجمع اتصالات API
+
+    Returns:
+        Dict[str, Any]: الحدود المضبوطة وعدد الاتصالات المستخدمة والخاملة والطلبات الجارية
+    """
+    in_use = 0
+    idle = 0
+    if _connector is not None and not _connector.closed:
+        # aiohttp لا يوفر واجهة عامة لهذه الأرقام، لذلك نقرأها بحذر
+        in_use = len(getattr(_connector, "_acquired", ()))
+        idle = sum(len(conns) for conns in getattr(_connector, "_conns", {}).values())
+
+    return {
+        **_pool_stats,
+        "limit": API_POOL_LIMIT,
+        "limit_per_host": API_POOL_LIMIT_PER_HOST,
+        "in_use": in_use,
+        "idle": idle,
+        "session_open": _session is not None and not _session.closed,
+        "inflight_keys": len(_inflight),
+    }
+
+class APITransientError(Exception):
+    """فشل مؤقت في النقل (مهلة، انقطاع اتصال، خطأ من جهة الخادم) يمكن إعادة المحاولة بعده"""
+
+class CircuitBreaker:
+    """
+    قاطع دائرة لحماية البوت من انتظار مزود معطل
+
+    - closed: الطلبات تمر بشكل طبيعي
+    - open: بعد عدد من الإخفاقات المتتالية يتم رفض الطلبات فورًا
+    - half_open: بعد مهلة التعافي يُسمح بعدد محدود من الطلبات التجريبية،
+      نجاحها يغلق الدائرة وفشلها يعيد فتحها
+    """
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float, half_open_max_calls: int):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._trial_calls = 0
+
+    def allow_request(self) -> bool:
+        """التحقق مما إذا كان يُسمح بإرسال طلب الآن"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                return False
+            self.state = "half_open"
+            self._trial_calls = 0
+            logger.info("قاطع دائرة API في وضع التجربة (half-open)")
+
+        if self.state == "half_open":
+            if self._trial_calls >= self.half_open_max_calls:
+                return False
+            self._trial_calls += 1
+
+        return True
+
+    def record_success(self) -> None:
+        """تسجيل طلب وصل إلى المزود بنجاح"""
+        if self.state != "closed":
+            logger.info("تم إغلاق قاطع دائرة API بعد نجاح الطلب التجريبي")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._trial_calls = 0
+
+    def record_failure(self) -> None:
+        """تسجيل فشل نقل"""
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(
+                    f"تم فتح قاطع دائرة API بعد {self.consecutive_failures} إخفاقات متتالية، "
+                    f"سيتم رفض الطلبات لمدة {self.recovery_timeout} ثانية"
+                )
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release_trial(self) -> None:
+        """تحرير طلب تجريبي انتهى بدون نتيجة (مثل الإلغاء)"""
+        if self.state == "half_open" and self._trial_calls > 0:
+            self._trial_calls -= 1
+
+    def get_state(self) -> Dict[str, Any]:
+        """الحصول على حالة القاطع للمراقبة"""
+        retry_in = None
+        if self.state == "open":
+            retry_in = max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "retry_in": retry_in,
+        }
+
+_breaker = CircuitBreaker(
+    failure_threshold=API_BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout=API_BREAKER_RECOVERY_TIMEOUT,
+    half_open_max_calls=API_BREAKER_HALF_OPEN_MAX_CALLS,
+)
+
+class TokenBucket:
+    """
+    محدد معدل من نوع دلو الرموز (token bucket) مع أولوية للمنتظرين
+
+    يمتلئ الدلو بمعدل ثابت حتى سعته القصوى، وكل طلب يستهلك رمزًا واحدًا.
+    عند نفاد الرموز ينتظر الطلب في طابور أولوية، فتُمنح الرموز الجديدة
+    للطلبات ذات الأولوية الأعلى (الرقم الأصغر) أولاً.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float):
+        self.name = name
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.waits = 0
+        self.total_wait = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _dispatch(self) -> None:
+        """منح الرموز المتاحة للمنتظرين حسب الأولوية وجدولة المنحة التالية"""
+        self._timer = None
+        self._refill()
+
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                # منتظر تم إلغاؤه
+                heapq.heappop(self._waiters)
+                continue
+            if self.tokens < 1:
+                break
+            heapq.heappop(self._waiters)
+            self.tokens -= 1
+            future.set_result(None)
+
+        if self._waiters:
+            delay = (1 - self.tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, priority: int = 0) -> float:
+        """
+        الحصول على رمز واحد
+
+        Args:
+            priority: أولوية الطلب (الرقم الأصغر يُخدم أولاً)
+
+        Returns:
+            float: مدة الانتظار بالثواني
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._timer is None:
+            self._dispatch()
+
+        start_time = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # تم منح الرمز قبل الإلغاء مباشرة: إعادته للدلو
+                self.tokens = min(self.capacity, self.tokens + 1)
+            raise
+
+        waited = time.monotonic() - start_time
+        self.waits += 1
+        self.total_wait += waited
+        return waited
+
+    def get_stats(self) -> Dict[str, Any]:
+        """الحصول على إحصائيات الدلو"""
+        self._refill()
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "tokens": round(self.tokens, 2),
+            "waiting": sum(1 for _, _, future in self._waiters if not future.done()),
+            "waits": self.waits,
+            "avg_wait": self.total_wait / self.waits if self.waits else 0.0,
+        }
+
+def _build_rate_limiters() -> Dict[str, TokenBucket]:
+    """إنشاء دلاء الرموز لكل فئة من الإجراءات بالإضافة إلى الدلو العام"""
+    return {
+        name: TokenBucket(
+            name,
+            float(os.getenv(f"API_RATE_{name.upper()}", str(rate))),
+            float(os.getenv(f"API_BURST_{name.upper()}", str(burst))),
+        )
+        for name, (rate, burst) in RATE_LIMIT_DEFAULTS.items()
+    }
+
+_rate_limiters = _build_rate_limiters()
+
+async def _acquire_rate_limit(action: str) -> None:
+    """انتظار رمز من دلو فئة الإجراء ثم من الدلو العام"""
+    action_class = ACTION_CLASSES.get(action, "account")
+    priority = ACTION_CLASS_PRIORITY.get(action_class, 1)
+    waited = await _rate_limiters[action_class].acquire(priority)
+    waited += await _rate_limiters["global"].acquire(priority)
+    if waited > 0.5:
+        logger.debug(f"انتظر طلب API ({action}) {waited:.2f} ثانية بسبب تحديد المعدل")
+
+def get_api_rate_limit_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    الحصول على إحصائيات محدد معدل طلبات API
+
+    Returns:
+        Dict[str, Dict[str, Any]]: إحصائيات كل دلو (الرموز المتاحة، المنتظرون، متوسط الانتظار)
+    """
+    return {name: bucket.get_stats() for name, bucket in _rate_limiters.items()}
+
+def _backoff_delay(policy: Dict[str, float], attempt: int) -> float:
+    """حساب مهلة الانتظار قبل المحاولة التالية (تزايد أسي مع عشوائية كاملة)"""
+    return random.uniform(0, min(policy["max_delay"], policy["base_delay"] * (2 ** (attempt - 1))))
+
+async def _request_with_retry(action: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    إرسال طلب عبر قاطع الدائرة مع إعادة المحاولة حسب سياسة الإجراء
+
+    Args:
+        action: نوع الإجراء المطلوب
+        params: معلمات إضافية للطلب (اختياري)
+
+    Returns:
+        Dict[str, Any]: استجابة API أو قاموس يحتوي على مفتاح "error"
+    """
+    policy = RETRY_POLICY.get(action, DEFAULT_RETRY_POLICY)
+    attempts = max(1, int(policy["attempts"]))
+    last_error = "خطأ غير معروف"
+
+    for attempt in range(1, attempts + 1):
+        # فحص القاطع أولاً حتى لا تستهلك الطلبات المرفوضة فورًا حصة المعدل
+        if not _breaker.allow_request():
+            _resilience_stats["short_circuited"] += 1
+            logger.warning(f"تم رفض طلب API ({action}) فورًا لأن قاطع الدائرة مفتوح")
+            return {"error": "خدمة API غير متاحة مؤقتًا، يرجى المحاولة لاحقًا"}
+
+        completed = False
+        try:
+            # كل محاولة مُرسلة فعلاً (بما فيها إعادة المحاولة) تستهلك من حصة المعدل المشتركة
+            await _acquire_rate_limit(action)
+            result = await _send_api_request(action, params)
+            completed = True
+        except APITransientError as e:
+            completed = True
+            _resilience_stats["transient_failures"] += 1
+            _breaker.record_failure()
+            last_error = str(e)
+
+            if attempt < attempts:
+                delay = _backoff_delay(policy, attempt)
+                _resilience_stats["retries"] += 1
+                logger.warning(
+                    f"فشل مؤقت في طلب API ({action})، المحاولة {attempt}/{attempts}، "
+                    f"إعادة المحاولة بعد {delay:.2f} ثانية"
+                )
+                await asyncio.sleep(delay)
+            continue
+        finally:
+            if not completed:
+                _breaker.release_trial()
+
+        # المزود استجاب (حتى لو برسالة خطأ منطقية) فهو متاح
+        _breaker.record_success()
+        return result
+
+    return {"error": last_error}
+
+def get_api_health() -> Dict[str, Any]:
+    """
+    الحصول على حالة صحة الاتصال بالمزود
+
+    Returns:
+        Dict[str, Any]: حالة قاطع الدائرة وعدادات الإخفاق وإعادة المحاولة
+    """
+    return {**_breaker.get_state(), **_resilience_stats}
+
+def _request_key(action: str, params: Optional[Dict[str, Any]]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """بناء مفتاح يميز الطلب (الإجراء مع معلماته) لدمج الطلبات المتطابقة"""
+    return action, tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+
+def _copy_result(result: Any) -> Any:
+    """نسخة سطحية من النتيجة لكل منتظر حتى لا يؤثر تعديل أحدهم على الآخرين"""
+    if isinstance(result, dict):
+        return dict(result)
+    if isinstance(result, list):
+        return list(result)
+    return result
+
+async def make_api_request(action: str, params: Optional[Dict[str, Any]] = None,
+                           coalesce: Optional[bool] = None) -> Dict[str, Any]:
     """
     إنشاء طلب إلى API الخارجية وإرجاع النتيجة
 
+    الطلبات المتطابقة المتزامنة (نفس الإجراء ونفس المعلمات) للإجراءات المسموح
+    بدمجها في COALESCE_POLICY تشترك في طلب HTTP واحد ونتيجته.
+
     Args:
         action: نوع الإجراء المطلوب (balance, services, add, status, etc.)
         params: معلمات إضافية للطلب (اختياري)
+        coalesce: تجاوز سياسة الدمج لهذا الطلب (None = حسب COALESCE_POLICY)
 
     Returns:
         Dict[str, Any]: استجابة API كقاموس
         في حالة الخطأ، يحتوي القاموس على مفتاح "error" مع وصف الخطأ
     """
+    if coalesce is None:
+        coalesce = COALESCE_POLICY.get(action, False)
+
+    # إنشاء الطلبات وأي إجراء غير آمن لا يتم دمجه أبدًا
+    if not coalesce or action in NEVER_COALESCE:
+        return await _request_with_retry(action, params)
+
+    key = _request_key(action, params)
+    task = _inflight.get(key)
+    if task is None:
+        # أول طالب: إرسال الطلب كمهمة مستقلة حتى لا يلغيه إلغاء الطالب نفسه
+        task = asyncio.ensure_future(_request_with_retry(action, params))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        _pool_stats["coalesced"] += 1
+        logger.debug(f"دمج طلب API ({action}) مع طلب جارٍ مطابق")
+
+    result = await asyncio.shield(task)
+    return _copy_result(result)
+
+async def _send_api_request(action: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    إرسال طلب HTTP واحد إلى API الخارجية (بدون دمج أو إعادة محاولة)
+
+    Args:
+        action: نوع الإجراء المطلوب
+        params: معلمات إضافية للطلب (اختياري)
+
+    Returns:
+        Dict[str, Any]: استجابة API كقاموس أو قاموس يحتوي على مفتاح "error"
+
+    Raises:
+        APITransientError: عند فشل النقل (مهلة، خطأ اتصال، خطأ 5xx أو 429)
+    """
     global _session
     
     # التأكد من وجود مفتاح API
@@ -92,10 +549,13 @@ async def make_api_request(action: str, params: Optional[Dict[str, Any]] = None)
             logger.warning("الجلسة مغلقة أو غير موجودة، إعادة تهيئتها")
             await init_api_session()
             
-        # إرسال الطلب
+        # إرسال الطلب (المهلات مضبوطة على مستوى الجلسة)
         if _session:
+            _pool_stats["requests"] += 1
+            _pool_stats["in_flight"] += 1
+            _pool_stats["peak_in_flight"] = max(_pool_stats["peak_in_flight"], _pool_stats["in_flight"])
             try:
-                async with _session.post(API_URL, data=payload, timeout=30) as response:
+                async with _session.post(API_URL, data=payload) as response:
                     # تسجيل معلومات الاستجابة الأولية
                     logger.debug(f"استجابة API {action}: {response.status}")
                     
@@ -131,16 +591,23 @@ async def make_api_request(action: str, params: Optional[Dict[str, Any]] = None)
                         # أخطاء أخرى في استجابة الخادم
                         response_text = await response.text()
                         logger.error(f"خطأ في استجابة API ({action}): {response.status} - {response_text}")
+                        if response.status >= 500 or response.status == 429:
+                            # الخادم مثقل أو معطل: خطأ مؤقت يمكن إعادة المحاولة بعده
+                            raise APITransientError(f"خطأ في استجابة API: {response.status} - {response_text}")
                         return {"error": f"خطأ في استجابة API: {response.status} - {response_text}"}
             except asyncio.TimeoutError:
                 logger.error(f"انتهت مهلة الاتصال بـ API ({action})")
-                return {"error": "انتهت مهلة الاتصال بـ API"}
+                raise APITransientError("انتهت مهلة الاتصال بـ API")
+            finally:
+                _pool_stats["in_flight"] -= 1
         else:
             logger.error("فشل الاتصال: لم يتم تهيئة الجلسة بشكل صحيح")
             return {"error": "فشل الاتصال: لم يتم تهيئة الجلسة بشكل صحيح"}
+    except APITransientError:
+        raise
     except aiohttp.ClientError as e:
         logger.error(f"خطأ في الاتصال بـ API ({action}): {e}")
-        return {"error": f"خطأ في الاتصال: {e}"}
+        raise APITransientError(f"خطأ في الاتصال: {e}")
     except Exception as e:
         logger.error(f"خطأ غير متوقع أثناء الاتصال بـ API ({action}): {e}")
         return {"error": f"خطأ غير متوقع: {e}"}
@@ -0,0 +1,311 @@
+"""
+ذاكرة التخزين المؤقت لكتالوج الخدمات
+
+يحتفظ هذا الملف بنسخة واحدة مشتركة من قائمة خدمات المزود على مستوى العملية
+بدلاً من تنزيلها من API في كل مرة يضغط فيها المستخدم على "طلب جديد".
+يتم تحديث النسخة في الخلفية بشكل دوري، وعند انتهاء صلاحيتها تُعاد النسخة
+القديمة فورًا بينما يجري التحديث في الخلفية (stale-while-revalidate).
+
+كل تحديث ناجح ينتج لقطة (snapshot) ثابتة ذات رقم إصدار. جلسات الطلب تخزن
+في حالة FSM رقم الإصدار فقط مع معرفات الفئة والخدمة المختارة، وتحجز اللقطة
+التي بدأت بها حتى تنتهي الجلسة. اللقطات القديمة التي لم تعد أي جلسة تحجزها
+يتم تحريرها تلقائيًا.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from types import MappingProxyType
+from typing import Dict, List, Any, Optional, Hashable, Mapping, Tuple
+
+from dotenv import load_dotenv
+
+from services.api import get_services, organize_services_by_category
+from utils.common import format_service_button_text
+
+# تحميل المتغيرات البيئية
+load_dotenv()
+
+# إعداد المسجل
+logger = logging.getLogger("smm_bot")
+
+# مدة صلاحية الكتالوج بالثواني، بعدها يعتبر قديمًا ويُجدد في الخلفية
+CATALOG_TTL = int(os.getenv("CATALOG_TTL", "600"))
+# الفاصل الزمني بين عمليات التحديث الدورية في الخلفية
+CATALOG_REFRESH_INTERVAL = int(os.getenv("CATALOG_REFRESH_INTERVAL", "300"))
+# الفاصل الزمني لإعادة المحاولة بعد فشل التحديث
+CATALOG_RETRY_INTERVAL = int(os.getenv("CATALOG_RETRY_INTERVAL", "30"))
+# المدة التي تحجز فيها جلسة غير نشطة لقطة الكتالوج قبل تحريرها
+CATALOG_SESSION_TTL = int(os.getenv("CATALOG_SESSION_TTL", "3600"))
+
+class CatalogSnapshot:
+    """لقطة ثابتة (غير قابلة للتعديل) من كتالوج الخدمات"""
+
+    __slots__ = ("version", "services", "categories", "category_names", "_by_id", "_lookup")
+
+    def __init__(self, version: int, services: List[Dict[str, Any]]):
+        self.version = version
+        # نسخ الخدمات إلى قواميس للقراءة فقط حتى لا يعدلها أي معالج
+        self.services: Tuple[Mapping[str, Any], ...] = tuple(
+            MappingProxyType(dict(service)) for service in services
+        )
+        grouped = organize_services_by_category(list(self.services))
+        self.categories: Mapping[str, Tuple[Mapping[str, Any], ...]] = MappingProxyType(
+            {name: tuple(items) for name, items in grouped.items()}
+        )
+        self.category_names: Tuple[str, ...] = tuple(self.categories.keys())
+        # فهرس البحث لكل فئة: نص الزر ورقم الخدمة -> الخدمة (يُبنى مرة واحدة عند التحميل)
+        lookup: Dict[str, Dict[str, Mapping[str, Any]]] = {}
+        for name, items in self.categories.items():
+            index = lookup[name] = {}
+            for service in items:
+                index.setdefault(str(service.get("service")), service)
+            for service in items:
+                index.setdefault(format_service_button_text(service), service)
+        self._lookup = lookup
+        self._by_id: Dict[str, Mapping[str, Any]] = {
+            str(service.get("service")): service for service in self.services
+        }
+
+    def __setattr__(self, name, value):
+        if hasattr(self, "_by_id"):
+            raise AttributeError("لقطة الكتالوج غير قابلة للتعديل")
+        object.__setattr__(self, name, value)
+
+    def get_category(self, name: str) -> Tuple[Mapping[str, Any], ...]:
+        """الحصول على خدمات فئة معينة"""
+        return self.categories.get(name, ())
+
+    def get_service(self, service_id: Any) -> Optional[Mapping[str, Any]]:
+        """الحصول على خدمة بواسطة معرفها لدى المزود"""
+        return self._by_id.get(str(service_id))
+
+    def find_service(self, category: str, text: str) -> Optional[Mapping[str, Any]]:
+        """
+        البحث عن الخدمة التي ضغط المستخدم على زرها داخل فئة معينة
+
+        Args:
+            category: اسم الفئة المختارة
+            text: نص الرسالة (نص الزر أو "رقم. ...")
+
+        Returns:
+            Optional[Mapping[str, Any]]: الخدمة أو None إذا لم توجد في الفئة
+        """
+        index = self._lookup.get(category)
+        if not index:
+            return None
+
+        text = (text or "").strip()
+        service = index.get(text)
+        if service is None:
+            # نص معدل أو مختصر: البحث برقم الخدمة في بداية النص
+            service_id, dot, _ = text.partition(".")
+            if dot and service_id.isdigit():
+                service = index.get(str(int(service_id)))
+        return service
+
+# حالة الكتالوج المشتركة
+_current: Optional[CatalogSnapshot] = None
+_snapshots: Dict[int, CatalogSnapshot] = {}
+_session_pins: Dict[Hashable, Tuple[int, float]] = {}
+_next_version = 1
+_fetched_at: Optional[float] = None
+_refresh_task: Optional[asyncio.Task] = None
+
+# عدادات المراقبة
+_stats = {
+    "hits": 0,
+    "stale_hits": 0,
+    "misses": 0,
+    "refreshes": 0,
+    "refresh_failures": 0,
+    "last_refresh_latency": 0.0,
+    "total_refresh_latency": 0.0,
+    "released_snapshots": 0,
+}
+
+def _is_fresh() -> bool:
+    """التحقق مما إذا كان الكتالوج الحالي ضمن مدة الصلاحية"""
+    return _fetched_at is not None and (time.monotonic() - _fetched_at) < CATALOG_TTL
+
+def _prune_snapshots() -> None:
+    """تحرير اللقطات القديمة التي لا تحجزها أي جلسة نشطة"""
+    now = time.monotonic()
+
+    # إزالة حجوزات الجلسات المهجورة
+    expired = [key for key, (_, touched) in _session_pins.items() if now - touched > CATALOG_SESSION_TTL]
+    for key in expired:
+        del _session_pins[key]
+
+    pinned_versions = {version for version, _ in _session_pins.values()}
+    for version in list(_snapshots):
+        if version not in pinned_versions and (_current is None or version != _current.version):
+            del _snapshots[version]
+            _stats["released_snapshots"] += 1
+            logger.debug(f"تم تحرير لقطة الكتالوج رقم {version}")
+
+async def refresh_catalog() -> bool:
+    """
+    تنزيل الكتالوج من API ونشر لقطة جديدة
+
+    في حالة الفشل يتم الاحتفاظ باللقطة السابقة كما هي، وإذا لم يتغير الكتالوج
+    لا يتم إنشاء إصدار جديد.
+
+    Returns:
+        bool: True إذا تم التحديث بنجاح، False خلاف ذلك
+    """
+    global _current, _fetched_at, _next_version
+
+    start_time = time.monotonic()
+    services = await get_services()
+    latency = time.monotonic() - start_time
+
+    _stats["last_refresh_latency"] = latency
+    _stats["total_refresh_latency"] += latency
+
+    if not services:
+        _stats["refresh_failures"] += 1
+        logger.warning(f"فشل تحديث كتالوج الخدمات بعد {latency:.2f} ثانية، سيتم الاحتفاظ بالنسخة السابقة")
+        return False
+
+    _fetched_at = time.monotonic()
+    _stats["refreshes"] += 1
+
+    if _current is not None and [dict(service) for service in _current.services] == services:
+        logger.info(f"كتالوج الخدمات لم يتغير (الإصدار {_current.version})، تم التحقق في {latency:.2f} ثانية")
+        return True
+
+    snapshot = CatalogSnapshot(_next_version, services)
+    _next_version += 1
+    _snapshots[snapshot.version] = snapshot
+    _current = snapshot
+    _prune_snapshots()
+
+    logger.info(f"تم نشر لقطة الكتالوج رقم {snapshot.version}: {len(services)} خدمة في {latency:.2f} ثانية")
+    return True
+
+def _schedule_refresh() -> asyncio.Task:
+    """بدء تحديث في الخلفية إذا لم يكن هناك تحديث جارٍ بالفعل"""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(refresh_catalog())
+    return _refresh_task
+
+async def get_catalog_snapshot() -> Optional[CatalogSnapshot]:
+    """
+    الحصول على أحدث لقطة من الكتالوج
+
+    - إذا كانت اللقطة صالحة تُعاد مباشرة
+    - إذا كانت قديمة تُعاد فورًا ويُجدد الكتالوج في الخلفية
+    - إذا لم تكن هناك لقطة بعد (بداية التشغيل) يتم انتظار التحديث الجاري
+
+    Returns:
+        Optional[CatalogSnapshot]: اللقطة الحالية أو None إذا تعذر تحميل الكتالوج
+    """
+    if _current is not None:
+        if _is_fresh():
+            _stats["hits"] += 1
+        else:
+            _stats["stale_hits"] += 1
+            _schedule_refresh()
+        return _current
+
+    # لا يوجد كتالوج بعد: ننضم إلى التحديث الجاري بدلاً من إرسال طلب جديد
+    _stats["misses"] += 1
+    try:
+        await asyncio.shield(_schedule_refresh())
+    except Exception as e:
+        logger.error(f"خطأ أثناء انتظار تحديث كتالوج الخدمات: {e}")
+    return _current
+
+def pin_snapshot(session_key: Hashable, snapshot: CatalogSnapshot) -> None:
+    """
+    حجز لقطة لجلسة مستخدم حتى لا يتم تحريرها أثناء الطلب
+
+    Args:
+        session_key: مفتاح الجلسة (عادة معرف المستخدم)
+        snapshot: اللقطة المراد حجزها
+    """
+    previous = _session_pins.get(session_key)
+    _session_pins[session_key] = (snapshot.version, time.monotonic())
+    if previous and previous[0] != snapshot.version:
+        _prune_snapshots()
+
+def get_pinned_snapshot(session_key: Hashable, version: Optional[int]) -> Optional[CatalogSnapshot]:
+    """
+    الحصول على اللقطة التي تستخدمها جلسة معينة
+
+    Args:
+        session_key: مفتاح الجلسة
+        version: رقم الإصدار المخزن في حالة FSM
+
+    Returns:
+        Optional[CatalogSnapshot]: اللقطة أو None إذا تم تحريرها
+    """
+    snapshot = _snapshots.get(version) if version is not None else None
+    if snapshot is not None:
+        _session_pins[session_key] = (snapshot.version, time.monotonic())
+    return snapshot
+
+def release_snapshot(session_key: Hashable) -> None:
+    """
+    تحرير حجز الجلسة عند انتهاء الطلب أو إلغائه
+
+    Args:
+        session_key: مفتاح الجلسة
+    """
+    if _session_pins.pop(session_key, None) is not None:
+        _prune_snapshots()
+
+def get_catalog_stats() -> Dict[str, Any]:
+    """
+    الحصول على عدادات الذاكرة المؤقتة للكتالوج
+
+    Returns:
+        Dict[str, Any]: عدد الإصابات والإخفاقات وزمن التحديث وعمر الكتالوج واللقطات المحجوزة
+    """
+    refreshes = _stats["refreshes"] + _stats["refresh_failures"]
+    age = time.monotonic() - _fetched_at if _fetched_at is not None else None
+    return {
+        **_stats,
+        "services_count": len(_current.services) if _current else 0,
+        "current_version": _current.version if _current else None,
+        "snapshots_held": len(_snapshots),
+        "active_sessions": len(_session_pins),
+        "age": age,
+        "is_fresh": _is_fresh(),
+        "avg_refresh_latency": _stats["total_refresh_latency"] / refreshes if refreshes else 0.0,
+    }
+
+async def start_catalog_refresher():
+    """
+    مهمة خلفية لتحديث كتالوج الخدمات بشكل دوري
+    """
+    logger.info("تم بدء مهمة تحديث كتالوج الخدمات الدورية")
+
+    while True:
+        try:
+            success = await _schedule_refresh()
+            # تنظيف حجوزات الجلسات المهجورة حتى لو لم يتغير الكتالوج
+            _prune_snapshots()
+            await asyncio.sleep(CATALOG_REFRESH_INTERVAL if success else CATALOG_RETRY_INTERVAL)
+        except asyncio.CancelledError:
+            logger.info("تم إلغاء مهمة تحديث كتالوج الخدمات")
+            break
+        except Exception as e:
+            logger.error(f"خطأ غير متوقع في مهمة تحديث كتالوج الخدمات: {e}")
+            await asyncio.sleep(CATALOG_RETRY_INTERVAL)
+
+async def schedule_catalog_refresher(app):
+    """
+    جدولة مهمة تحديث كتالوج الخدمات الدورية
+
+    Args:
+        app: تطبيق البوت (للتسجيل في الخلفية)
+    """
+    try:
+        app["catalog_refresh_task"] = asyncio.create_task(start_catalog_refresher())
+        logger.info("تمت جدولة مهمة تحديث كتالوج الخدمات بنجاح")
+    except Exception as e:
+        logger.error(f"فشل جدولة مهمة تحديث كتالوج الخدمات: {e}")
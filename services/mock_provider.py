@@ -0,0 +1,324 @@
+"""
+خادم وهمي لمزود خدمات SMM (بروتوكول API v2)
+
+يحاكي هذا الملف واجهة المزود محليًا لاختبار الحمل والتطوير بدون اتصال
+بالخادم الحقيقي. يكفي توجيه البوت إليه عبر المتغير البيئي API_URL:
+
+    python -m services.mock_provider --port 8081
+    API_URL=http://127.0.0.1:8081/api/v2 python main.py
+
+الإجراءات المدعومة: balance, services, add, status (طلب واحد أو عدة طلبات),
+cancel, refill. يمكن ضبط زمن الاستجابة ونسبة الأخطاء وحجم الكتالوج وسرعة
+تقدم الطلبات عبر المتغيرات البيئية MOCK_* أو معاملات سطر الأوامر.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from typing import Dict, List, Any, Optional
+
+from aiohttp import web
+
+# إعداد المسجل
+logger = logging.getLogger("smm_bot")
+
+# الإعدادات الافتراضية (قابلة للتعديل عبر المتغيرات البيئية أو سطر الأوامر)
+MOCK_HOST = os.getenv("MOCK_HOST", "127.0.0.1")
+MOCK_PORT = int(os.getenv("MOCK_PORT", "8081"))
+MOCK_API_KEY = os.getenv("MOCK_API_KEY", "")                        # فارغ = قبول أي مفتاح
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "150"))        # متوسط زمن الاستجابة
+MOCK_LATENCY_JITTER_MS = float(os.getenv("MOCK_LATENCY_JITTER_MS", "50"))
+MOCK_ERROR_RATE = float(os.getenv("MOCK_ERROR_RATE", "0"))          # نسبة ردود 500
+MOCK_TIMEOUT_RATE = float(os.getenv("MOCK_TIMEOUT_RATE", "0"))      # نسبة الطلبات التي لا يُرد عليها
+MOCK_TIMEOUT_SECONDS = float(os.getenv("MOCK_TIMEOUT_SECONDS", "60"))
+MOCK_SERVICES = int(os.getenv("MOCK_SERVICES", "200"))              # عدد الخدمات في الكتالوج
+MOCK_CATEGORIES = int(os.getenv("MOCK_CATEGORIES", "12"))           # عدد الفئات
+MOCK_ORDER_DURATION = float(os.getenv("MOCK_ORDER_DURATION", "300"))  # مدة اكتمال الطلب بالثواني
+MOCK_PENDING_SECONDS = float(os.getenv("MOCK_PENDING_SECONDS", "10"))  # مدة بقاء الطلب معلقًا
+MOCK_PARTIAL_RATE = float(os.getenv("MOCK_PARTIAL_RATE", "0.05"))   # نسبة الطلبات التي تنتهي جزئيًا
+MOCK_BALANCE = float(os.getenv("MOCK_BALANCE", "1000"))
+MOCK_SEED = os.getenv("MOCK_SEED")
+
+# الحد الأقصى لعدد الطلبات في استعلام حالة أو إلغاء متعدد (كما في المزود الحقيقي)
+MAX_MULTI_ORDERS = 100
+
+_PLATFORMS = ["Instagram", "TikTok", "YouTube", "Facebook", "Twitter", "Telegram", "Snapchat", "Spotify"]
+_KINDS = ["Followers", "Likes", "Views", "Comments", "Shares", "Members", "Subscribers", "Plays"]
+
+def build_catalog(services_count: int, categories_count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """
+    إنشاء كتالوج خدمات وهمي بنفس تنسيق المزود
+
+    Args:
+        services_count: عدد الخدمات
+        categories_count: عدد الفئات
+        rng: مولد الأرقام العشوائية
+
+    Returns:
+        List[Dict[str, Any]]: قائمة الخدمات
+    """
+    categories = []
+    for i in range(max(1, categories_count)):
+        platform = _PLATFORMS[i % len(_PLATFORMS)]
+        kind = _KINDS[(i // len(_PLATFORMS)) % len(_KINDS)]
+        categories.append(f"{platform} {kind}" + (f" #{i // (len(_PLATFORMS) * len(_KINDS)) + 1}" if i >= len(_PLATFORMS) * len(_KINDS) else ""))
+
+    services = []
+    for service_id in range(1, services_count + 1):
+        category = categories[(service_id - 1) % len(categories)]
+        is_package = rng.random() < 0.05
+        services.append({
+            "service": service_id,
+            "name": f"{category} [Mock {service_id}]",
+            "type": "Package" if is_package else "Default",
+            "category": category,
+            "rate": f"{rng.uniform(0.1, 15):.2f}",
+            "min": "1" if is_package else str(rng.choice([10, 50, 100])),
+            "max": "1" if is_package else str(rng.choice([5000, 10000, 50000, 100000])),
+            "refill": rng.random() < 0.5,
+            "cancel": rng.random() < 0.5,
+        })
+    return services
+
+class MockProvider:
+    """حالة المزود الوهمي: الكتالوج والرصيد والطلبات"""
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.rng = random.Random(settings["seed"])
+        self.services = build_catalog(settings["services"], settings["categories"], self.rng)
+        self.services_by_id = {service["service"]: service for service in self.services}
+        self.balance = settings["balance"]
+        self.orders: Dict[int, Dict[str, Any]] = {}
+        self.next_order_id = 100000
+        self.next_refill_id = 1
+        self.requests = 0
+
+    # ----- المساعدات -----
+
+    def _order_status(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        """حساب حالة الطلب حسب الوقت المنقضي منذ إنشائه"""
+        quantity = order["quantity"]
+        elapsed = time.time() - order["created_at"]
+        pending = self.settings["pending_seconds"]
+        duration = max(1.0, self.settings["order_duration"])
+
+        if order["canceled"]:
+            status, remains = "Canceled", quantity
+        elif elapsed < pending:
+            status, remains = "Pending", quantity
+        else:
+            progress = min(1.0, (elapsed - pending) / duration)
+            if progress >= 1.0:
+                if order["partial"]:
+                    status, remains = "Partial", max(1, quantity // 10)
+                else:
+                    status, remains = "Completed", 0
+            else:
+                status = "In progress"
+                remains = quantity - int(quantity * progress)
+
+        delivered_ratio = (quantity - remains) / quantity if quantity else 0
+        charge = order["charge"] if status not in ("Canceled", "Partial") else order["charge"] * delivered_ratio
+        return {
+            "charge": f"{charge:.5f}",
+            "start_count": str(order["start_count"]),
+            "status": status,
+            "remains": str(remains),
+            "currency": "USD",
+        }
+
+    def _parse_order_ids(self, value: str) -> List[str]:
+        return [part.strip() for part in value.split(",") if part.strip()][:MAX_MULTI_ORDERS]
+
+    # ----- الإجراءات -----
+
+    def action_balance(self, data: Dict[str, str]) -> Any:
+        return {"balance": f"{self.balance:.5f}", "currency": "USD"}
+
+    def action_services(self, data: Dict[str, str]) -> Any:
+        return self.services
+
+    def action_add(self, data: Dict[str, str]) -> Any:
+        try:
+            service = self.services_by_id.get(int(data.get("service", "")))
+        except ValueError:
+            service = None
+        if service is None:
+            return {"error": "Incorrect service ID"}
+
+        link = data.get("link", "")
+        if not link:
+            return {"error": "Incorrect link"}
+
+        try:
+            quantity = int(data.get("quantity", "0"))
+        except ValueError:
+            return {"error": "Incorrect quantity"}
+        if quantity < int(service["min"]) or quantity > int(service["max"]):
+            return {"error": f"Quantity must be between {service['min']} and {service['max']}"}
+
+        if service["max"] == "1":
+            charge = float(service["rate"])
+        else:
+            charge = float(service["rate"]) * quantity / 1000
+        if charge > self.balance:
+            return {"error": "Not enough funds on balance"}
+
+        self.balance -= charge
+        order_id = self.next_order_id
+        self.next_order_id += 1
+        self.orders[order_id] = {
+            "service": service["service"],
+            "link": link,
+            "quantity": quantity,
+            "charge": charge,
+            "start_count": self.rng.randint(0, 50000),
+            "created_at": time.time(),
+            "partial": self.rng.random() < self.settings["partial_rate"],
+            "canceled": False,
+        }
+        return {"order": order_id}
+
+    def action_status(self, data: Dict[str, str]) -> Any:
+        if "orders" in data:
+            result = {}
+            for order_id in self._parse_order_ids(data["orders"]):
+                order = self.orders.get(int(order_id)) if order_id.isdigit() else None
+                result[order_id] = self._order_status(order) if order else {"error": "Incorrect order ID"}
+            return result
+
+        order_id = data.get("order", "")
+        order = self.orders.get(int(order_id)) if order_id.isdigit() else None
+        if order is None:
+            return {"error": "Incorrect order ID"}
+        return self._order_status(order)
+
+    def _cancel_one(self, order_id: str) -> Any:
+        order = self.orders.get(int(order_id)) if order_id.isdigit() else None
+        if order is None:
+            return {"error": "Incorrect order ID"}
+        if not self.services_by_id[order["service"]]["cancel"]:
+            return {"error": "Cancel is not available for this service"}
+        if self._order_status(order)["status"] in ("Completed", "Partial", "Canceled"):
+            return {"error": "Order can not be canceled"}
+        order["canceled"] = True
+        self.balance += order["charge"]
+        return 1
+
+    def action_cancel(self, data: Dict[str, str]) -> Any:
+        order_ids = self._parse_order_ids(data.get("orders", data.get("order", "")))
+        return [{"order": int(order_id) if order_id.isdigit() else order_id, "cancel": self._cancel_one(order_id)}
+                for order_id in order_ids]
+
+    def _refill_one(self, order_id: str) -> Any:
+        order = self.orders.get(int(order_id)) if order_id.isdigit() else None
+        if order is None:
+            return {"error": "Incorrect order ID"}
+        if not self.services_by_id[order["service"]]["refill"]:
+            return {"error": "Refill is not available for this service"}
+        refill_id = self.next_refill_id
+        self.next_refill_id += 1
+        return refill_id
+
+    def action_refill(self, data: Dict[str, str]) -> Any:
+        if "orders" in data:
+            return [{"order": int(order_id) if order_id.isdigit() else order_id, "refill": self._refill_one(order_id)}
+                    for order_id in self._parse_order_ids(data["orders"])]
+        refill = self._refill_one(data.get("order", ""))
+        return refill if isinstance(refill, dict) else {"refill": str(refill)}
+
+    # ----- معالج HTTP -----
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """معالجة طلب API واحد"""
+        self.requests += 1
+        data = dict(await request.post()) if request.method == "POST" else dict(request.query)
+
+        # محاكاة زمن الاستجابة والأعطال
+        settings = self.settings
+        latency = max(0.0, self.rng.gauss(settings["latency_ms"], settings["latency_jitter_ms"])) / 1000
+        await asyncio.sleep(latency)
+
+        roll = self.rng.random()
+        if roll < settings["timeout_rate"]:
+            await asyncio.sleep(settings["timeout_seconds"])
+            return web.Response(status=504, text="Gateway Timeout")
+        if roll < settings["timeout_rate"] + settings["error_rate"]:
+            return web.Response(status=500, text="Internal Server Error")
+
+        if settings["api_key"] and data.get("key") != settings["api_key"]:
+            return web.json_response({"error": "Invalid API key"})
+
+        action = data.get("action", "")
+        handler = getattr(self, f"action_{action}", None)
+        if handler is None:
+            return web.json_response({"error": "Incorrect request"})
+
+        return web.json_response(handler(data), dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+def create_app(settings: Optional[Dict[str, Any]] = None) -> web.Application:
+    """
+    إنشاء تطبيق aiohttp للمزود الوهمي
+
+    Args:
+        settings: تجاوز الإعدادات الافتراضية (اختياري)
+
+    Returns:
+        web.Application: التطبيق الجاهز للتشغيل
+    """
+    defaults = {
+        "api_key": MOCK_API_KEY,
+        "latency_ms": MOCK_LATENCY_MS,
+        "latency_jitter_ms": MOCK_LATENCY_JITTER_MS,
+        "error_rate": MOCK_ERROR_RATE,
+        "timeout_rate": MOCK_TIMEOUT_RATE,
+        "timeout_seconds": MOCK_TIMEOUT_SECONDS,
+        "services": MOCK_SERVICES,
+        "categories": MOCK_CATEGORIES,
+        "order_duration": MOCK_ORDER_DURATION,
+        "pending_seconds": MOCK_PENDING_SECONDS,
+        "partial_rate": MOCK_PARTIAL_RATE,
+        "balance": MOCK_BALANCE,
+        "seed": MOCK_SEED,
+    }
+    defaults.update(settings or {})
+
+    provider = MockProvider(defaults)
+    app = web.Application()
+    app["provider"] = provider
+    app.router.add_route("POST", "/api/v2", provider.handle)
+    app.router.add_route("GET", "/api/v2", provider.handle)
+    return app
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="خادم وهمي لمزود خدمات SMM (API v2)")
+    parser.add_argument("--host", default=MOCK_HOST)
+    parser.add_argument("--port", type=int, default=MOCK_PORT)
+    parser.add_argument("--api-key", default=MOCK_API_KEY, help="المفتاح المطلوب (فارغ = أي مفتاح)")
+    parser.add_argument("--latency-ms", type=float, default=MOCK_LATENCY_MS)
+    parser.add_argument("--latency-jitter-ms", type=float, default=MOCK_LATENCY_JITTER_MS)
+    parser.add_argument("--error-rate", type=float, default=MOCK_ERROR_RATE, help="نسبة ردود 500 (0-1)")
+    parser.add_argument("--timeout-rate", type=float, default=MOCK_TIMEOUT_RATE, help="نسبة الطلبات المعلقة (0-1)")
+    parser.add_argument("--timeout-seconds", type=float, default=MOCK_TIMEOUT_SECONDS)
+    parser.add_argument("--services", type=int, default=MOCK_SERVICES, help="عدد الخدمات في الكتالوج")
+    parser.add_argument("--categories", type=int, default=MOCK_CATEGORIES, help="عدد الفئات")
+    parser.add_argument("--order-duration", type=float, default=MOCK_ORDER_DURATION, help="مدة اكتمال الطلب بالثواني")
+    parser.add_argument("--pending-seconds", type=float, default=MOCK_PENDING_SECONDS)
+    parser.add_argument("--partial-rate", type=float, default=MOCK_PARTIAL_RATE)
+    parser.add_argument("--balance", type=float, default=MOCK_BALANCE)
+    parser.add_argument("--seed", default=MOCK_SEED)
+    return parser.parse_args()
+
+# تشغيل الخادم الوهمي عند تشغيل الملف مباشرة
+if __name__ == "__main__":
+    args = _parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    settings = {key: value for key, value in vars(args).items() if key not in ("host", "port")}
+    logger.info(f"تشغيل المزود الوهمي على http://{args.host}:{args.port}/api/v2 ({args.services} خدمة)")
+    web.run_app(create_app(settings), host=args.host, port=args.port, print=None)
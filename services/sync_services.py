@@ -4,20 +4,17 @@
 
 import asyncio
 import logging
-import os
 from datetime import datetime
 from typing import Dict, List, Any, Tuple
 
 import aiosqlite
 
 from services.api import get_services, organize_services_by_category, init_api_session, close_api_session
+from database.pool import get_connection
 
 # إعداد التسجيل
 logger = logging.getLogger("smm_bot")
 
-# الحصول على مسار قاعدة البيانات
-DB_PATH = os.getenv("DATABASE_PATH", "database.db")
-
 async def sync_categories_from_api() -> Tuple[int, int, int]:
     """
     مزامنة الفئات من API وحفظها في قاعدة البيانات
@@ -43,7 +40,7 @@ async def sync_categories_from_api() -> Tuple[int, int, int]:
         updated_categories = 0
         
         # افتح اتصالًا بقاعدة البيانات
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with get_connection() as db:
             # تحويل كائن الاتصال لاستخدام القواميس
             db.row_factory = aiosqlite.Row
             
@@ -110,7 +107,7 @@ async def sync_services_from_api() -> Tuple[int, int, int]:
         current_time = datetime.now().isoformat()
         
         # افتح اتصالًا بقاعدة البيانات
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with get_connection() as db:
             # تحويل كائن الاتصال لاستخدام القواميس
             db.row_factory = aiosqlite.Row
             
@@ -5,7 +5,6 @@
 
 from utils.common import (
     setup_logging,
-    cleanup_resources,
     format_money,
     validate_number,
     format_service_info,
@@ -265,32 +265,6 @@ def truncate_text(text: str, max_length: int = 500) -> str:
         return text
     return text[:max_length-3] + "..."
 
-async def cleanup_resources():
-    """تنظيف الموارد عند إغلاق البوت"""
-    logger = logging.getLogger("smm_bot")
-    logger.info("بدء تنظيف الموارد...")
-
-    try:
-        # تنظيف جلسات API
-        from services.api import close_api_session
-        await close_api_session()
-        logger.info("تم إغلاق جلسة API بنجاح")
-    except Exception as e:
-        logger.error(f"خطأ في إغلاق جلسة API: {e}")
-
-    try:
-        # إلغاء المهام المعلقة
-        import asyncio
-        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
-        if tasks:
-            logger.info(f"إلغاء {len(tasks)} مهمة معلقة")
-            for task in tasks:
-                task.cancel()
-            await asyncio.gather(*tasks, return_exceptions=True)
-        logger.info("اكتمل تنظيف الموارد")
-    except Exception as e:
-        logger.error(f"خطأ في إلغاء المهام المعلقة: {e}")
-
 # تنسيق المبالغ المالية
 
 # التحقق من صحة الأرقام
@@ -344,6 +318,28 @@ def format_service_info(service: Dict[str, Any]) -> str:
         f"<b>⬆️ الحد الأقصى:</b> {max_order}"
     )
 
+# تنسيق نص زر الخدمة
+def format_service_button_text(service: Dict[str, Any]) -> str:
+    """
+    تنسيق نص زر الخدمة في لوحة مفاتيح الخدمات
+    Args:
+        service: معلومات الخدمة
+    Returns:
+        نص الزر (يستخدم أيضًا كمفتاح للبحث عن الخدمة عند الضغط عليه)
+    """
+    service_id = service.get("service", "غير محدد")
+    name = service.get("name", "غير محدد")
+    price = service.get("rate", "غير محدد")
+
+    # تحديد نوع التسعير وتنسيق السعر
+    try:
+        max_order = int(service.get("max", 0)) if isinstance(service.get("max"), str) else service.get("max", 0)
+        price_format = "للباقة" if max_order == 1 else "لكل 1000"
+    except (ValueError, TypeError):
+        price_format = "لكل 1000"
+
+    return f"{service_id}. {name} ({price}$ {price_format})"
+
 # تنسيق معلومات الطلب
 def format_order_info(order: Dict[str, Any]) -> str:
     """
@@ -7,13 +7,18 @@
 3. تحديث حالتها في قاعدة البيانات المحلية
 """
 
+import os
+import heapq
 import logging
 import asyncio
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
 import time
 
 from database.core import (
-    get_all_orders,
+    iter_active_orders,
+    apply_order_status_updates,
+    handle_order_completion,
     update_order_status,
     update_order_remains_simple
 )
@@ -28,8 +33,34 @@ logger = logging.getLogger("smm_bot")
 
 # المدة الزمنية بين دورات التحديث بالثواني
 UPDATE_INTERVAL = 300  # 5 دقائق
-# عدد الطلبات في كل دفعة لطلبات API المتعددة
-BATCH_SIZE = 50
+# عدد الطلبات في كل دفعة لطلبات API المتعددة (حجم البداية، يتكيف تلقائيًا)
+BATCH_SIZE = int(os.getenv("ORDER_UPDATER_BATCH_SIZE", "50"))
+# حدود حجم الدفعة: المزود يقبل حتى 100 طلب في استعلام الحالة الواحد
+MIN_BATCH_SIZE = int(os.getenv("ORDER_UPDATER_MIN_BATCH_SIZE", "10"))
+MAX_BATCH_SIZE = 100
+# عدد الدفعات التي تُرسل بالتوازي (معدل الإرسال الفعلي يحدده محدد المعدل في services.api)
+UPDATER_CONCURRENCY = int(os.getenv("ORDER_UPDATER_CONCURRENCY", "4"))
+# زمن الدفعة المستهدف بالثواني: الدفعات الأسرع منه تسمح بتكبير حجم الدفعة
+BATCH_LATENCY_TARGET = float(os.getenv("ORDER_UPDATER_BATCH_LATENCY_TARGET", "5"))
+
+# جدولة الاستعلام لكل طلب: الطلبات الجديدة والمتقدمة تُفحص كثيرًا والراكدة تتباعد
+SCHEDULER_TICK = int(os.getenv("ORDER_POLL_TICK", "15"))                  # دورة المجدول بالثواني
+MIN_POLL_INTERVAL = int(os.getenv("ORDER_POLL_MIN_INTERVAL", "60"))       # أقصر فترة بين فحصين
+PENDING_POLL_INTERVAL = int(os.getenv("ORDER_POLL_PENDING_INTERVAL", "120"))  # الطلبات التي لم تبدأ بعد
+MAX_POLL_INTERVAL = int(os.getenv("ORDER_POLL_MAX_INTERVAL", "21600"))    # أطول فترة (6 ساعات)
+POLL_BACKOFF_FACTOR = float(os.getenv("ORDER_POLL_BACKOFF", "2"))         # مضاعف التباعد عند عدم التقدم
+# الحد الأقصى للفترة حسب عمر الطلب: (العمر بالثواني، أقصى فترة)
+POLL_AGE_CAPS = (
+    (3600, UPDATE_INTERVAL),   # أقل من ساعة: كل 5 دقائق على الأكثر
+    (86400, 1800),             # أقل من يوم: كل 30 دقيقة على الأكثر
+)
+
+# حجم الدفعة الحالي بعد التكيف
+_batch_size = max(MIN_BATCH_SIZE, min(BATCH_SIZE, MAX_BATCH_SIZE))
+
+# طابور الأولوية للطلبات المستحقة: (موعد الفحص، المعرف الداخلي، الطلب)
+_poll_queue: List[Tuple[float, int, Dict[str, Any]]] = []
+_queued_ids = set()
 
 # قاموس حالات طلبات API المختلفة وما يقابلها في قاعدة البيانات
 API_STATUS_MAPPING = {
@@ -65,6 +96,62 @@ async def convert_api_status(api_status: str) -> str:
     # إعادة اسم الحالة المعروف أو الافتراضي
     return API_STATUS_MAPPING.get(cleaned_status, cleaned_status)
 
+def _parse_db_timestamp(value: Optional[str]) -> Optional[float]:
+    """تحويل طابع زمني من قاعدة البيانات (UTC) إلى ثوانٍ منذ epoch"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value)[:19], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+def compute_poll_interval(order: Dict[str, Any], status: Optional[str], remains: Optional[int]) -> int:
+    """
+    حساب الفترة حتى الفحص التالي لطلب
+
+    - إذا تقدم الطلب (نقصت الكمية المتبقية) تعود الفترة لأقصر قيمة
+    - إذا لم يتقدم تتضاعف الفترة تدريجيًا
+    - الطلبات المعلقة (لم تبدأ) لا تُفحص أسرع من PENDING_POLL_INTERVAL
+    - عمر الطلب يحدد سقف الفترة: الطلبات الحديثة لا تتباعد كثيرًا
+
+    Args:
+        order: بيانات الطلب كما في قاعدة البيانات (remains, poll_interval, created_at)
+        status: الحالة الجديدة (None إذا تعذر الحصول عليها)
+        remains: الكمية المتبقية الجديدة (None إذا تعذر الحصول عليها)
+
+    Returns:
+        int: الفترة بالثواني
+    """
+    previous = order.get("poll_interval") or MIN_POLL_INTERVAL
+    old_remains = order.get("remains")
+
+    try:
+        progressed = remains is not None and old_remains is not None and remains < int(old_remains)
+    except (ValueError, TypeError):
+        progressed = False
+
+    if progressed:
+        interval = MIN_POLL_INTERVAL
+    elif order.get("poll_interval") is None:
+        # أول فحص للطلب
+        interval = MIN_POLL_INTERVAL
+    else:
+        interval = previous * POLL_BACKOFF_FACTOR
+
+    if status == "pending":
+        interval = max(interval, PENDING_POLL_INTERVAL)
+
+    created_at = _parse_db_timestamp(order.get("created_at"))
+    cap = MAX_POLL_INTERVAL
+    if created_at is not None:
+        age = time.time() - created_at
+        for max_age, age_cap in POLL_AGE_CAPS:
+            if age < max_age:
+                cap = age_cap
+                break
+
+    return int(max(MIN_POLL_INTERVAL, min(interval, cap)))
+
 async def get_active_orders() -> List[Dict[str, Any]]:
     """
     الحصول على الطلبات النشطة التي تحتاج إلى تحديث
@@ -73,16 +160,8 @@ async def get_active_orders() -> List[Dict[str, Any]]:
         List[Dict[str, Any]]: قائمة بالطلبات النشطة
     """
     try:
-        # استرجاع الطلبات التي ليست في حالة مكتملة أو ملغاة
-        active_statuses = ["pending", "in_progress", "processing"]
-        orders, _ = await get_all_orders(status=None)  # نسترجع كل الطلبات ثم نقوم بالتصفية
-        
-        active_orders = []
-        for order in orders:
-            status = order.get("status", "").lower()
-            # نضيف الطلب إذا كان في إحدى الحالات النشطة
-            if status in active_statuses:
-                active_orders.append(order)
+        # الاستعلام يختار الطلبات النشطة فقط من قاعدة البيانات (بدون تحميل سجل الطلبات كاملاً)
+        active_orders = [order async for order in iter_active_orders()]
         
         logger.info(f"تم استرجاع {len(active_orders)} طلب نشط للتحديث")
         return active_orders
@@ -162,9 +241,22 @@ async def update_orders_batch(orders: List[Dict[str, Any]]) -> int:
     Returns:
         int: عدد الطلبات التي تم تحديثها بنجاح
     """
+    success_count, _ = await _process_batch(orders)
+    return success_count
+
+async def _process_batch(orders: List[Dict[str, Any]]) -> Tuple[int, bool]:
+    """
+    تحديث دفعة من الطلبات مع الإبلاغ عن نجاح طلب API نفسه
+
+    Args:
+        orders: قائمة بالطلبات المراد تحديثها
+
+    Returns:
+        Tuple[int, bool]: (عدد الطلبات المحدثة، هل نجح استعلام API للدفعة)
+    """
     try:
         if not orders:
-            return 0
+            return 0, True
         
         # استخراج معرفات الطلبات (تخطي الطلبات المحلية)
         order_ids = [
@@ -174,22 +266,32 @@ async def update_orders_batch(orders: List[Dict[str, Any]]) -> int:
         ]
         
         if not order_ids:
-            return 0
+            return 0, True
+        
+        orders_by_id = {str(order.get("order_id")): order for order in orders}
         
         # طلب حالة الطلبات من API
         api_response = await check_multiple_orders(order_ids)
         
         if "error" in api_response:
             logger.warning(f"خطأ في تحديث دفعة الطلبات: {api_response['error']}")
-            return 0
+            # تأجيل الدفعة مع مضاعفة الفترة حتى لا تُعاد كل دورة أثناء تعطل المزود
+            await apply_order_status_updates([], {
+                order_id: compute_poll_interval(orders_by_id.get(order_id, {}), None, None)
+                for order_id in order_ids
+            })
+            return 0, False
         
-        # عداد الطلبات التي تم تحديثها بنجاح
-        success_count = 0
-        
-        # معالجة كل طلب في الاستجابة
+        # تجميع تحديثات الدفعة كاملة وجدولة الفحص التالي لكل طلب
+        updates = []
+        schedule = {}
         for order_id, status_data in api_response.items():
-            if "error" in status_data:
-                logger.warning(f"خطأ في تحديث الطلب {order_id}: {status_data['error']}")
+            order = orders_by_id.get(str(order_id), {})
+            if not isinstance(status_data, dict) or "error" in status_data:
+                error = status_data.get("error") if isinstance(status_data, dict) else status_data
+                logger.warning(f"خطأ في تحديث الطلب {order_id}: {error}")
+                # الطلبات التي يرفضها المزود تتباعد بدلاً من إعادة فحصها كل دورة
+                schedule[str(order_id)] = compute_poll_interval(order, None, None)
                 continue
             
             # استخراج البيانات من استجابة API
@@ -205,19 +307,55 @@ async def update_orders_batch(orders: List[Dict[str, Any]]) -> int:
             except (ValueError, TypeError):
                 remains_int = 0
             
-            # تحديث الطلب في قاعدة البيانات
-            updated = await update_order_remains_simple(order_id, remains_int)
-            
-            if updated:
-                # تأكد من تحديث الحالة (لاحظ أن update_order_remains_simple تقوم بذلك جزئيًا)
-                await update_order_status(order_id, local_status)
-                logger.info(f"تم تحديث الطلب {order_id}: الحالة={local_status}, المتبقي={remains_int}")
-                success_count += 1
+            updates.append((order_id, local_status, remains_int))
+            schedule[str(order_id)] = compute_poll_interval(order, local_status, remains_int)
+        
+        # الطلبات التي لم يذكرها المزود في الاستجابة تتباعد أيضًا
+        for order_id in order_ids:
+            if order_id not in schedule:
+                schedule[order_id] = compute_poll_interval(orders_by_id.get(order_id, {}), None, None)
+        
+        # كتابة الدفعة في معاملة واحدة (الصفوف المتغيرة فقط + مواعيد الفحص التالية)
+        completed_orders = await apply_order_status_updates(updates, schedule)
+        success_count = len(updates)
         
-        return success_count
+        # معالجة الطلبات المكتملة (ترقية الرتب) بعد حفظ الدفعة
+        for order in completed_orders:
+            await handle_order_completion(order["user_id"], order["order_id"])
+        
+        return success_count, True
     except Exception as e:
         logger.error(f"خطأ في تحديث دفعة الطلبات: {e}")
-        return 0
+        return 0, False
+
+async def _run_batch(semaphore: asyncio.Semaphore, batch: List[Dict[str, Any]]) -> Tuple[int, bool, float]:
+    """تشغيل دفعة واحدة وقياس زمنها ثم تحرير مكانها في حد التوازي (يحجزه المستدعي)"""
+    try:
+        start_time = time.monotonic()
+        updated_count, ok = await _process_batch(batch)
+        return updated_count, ok, time.monotonic() - start_time
+    finally:
+        semaphore.release()
+
+def _adapt_batch_size(results: List[Tuple[int, bool, float]]) -> None:
+    """
+    تعديل حجم الدفعة للدورة التالية حسب نتائج الدورة الحالية
+
+    يتضاعف الحجم تدريجيًا حتى حد المزود (100) ما دامت الدفعات تنجح ضمن
+    الزمن المستهدف، ويُقسم على اثنين عند فشل أي دفعة.
+    """
+    global _batch_size
+    if not results:
+        return
+
+    previous = _batch_size
+    if not all(ok for _, ok, _ in results):
+        _batch_size = max(MIN_BATCH_SIZE, _batch_size // 2)
+    elif max(latency for _, _, latency in results) < BATCH_LATENCY_TARGET:
+        _batch_size = min(MAX_BATCH_SIZE, int(_batch_size * 1.5))
+
+    if _batch_size != previous:
+        logger.info(f"تم تعديل حجم دفعة تحديث الطلبات من {previous} إلى {_batch_size}")
 
 async def update_all_orders() -> int:
     """
@@ -227,37 +365,116 @@ async def update_all_orders() -> int:
         int: عدد الطلبات التي تم تحديثها بنجاح
     """
     try:
-        # الحصول على الطلبات النشطة
-        active_orders = await get_active_orders()
-        
-        if not active_orders:
+        # قراءة الطلبات النشطة كتدفق من قاعدة البيانات وإرسال كل دفعة فور اكتمالها،
+        # وحجز مكان في حد التوازي قبل إنشاء الدفعة يُبقي الذاكرة محدودة بعدد الدفعات الجارية
+        batch_size = _batch_size
+        semaphore = asyncio.Semaphore(max(1, UPDATER_CONCURRENCY))
+        tasks = []
+        batch = []
+        active_count = 0
+
+        async def dispatch(orders_batch: List[Dict[str, Any]]) -> None:
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(_run_batch(semaphore, orders_batch)))
+
+        async for order in iter_active_orders():
+            active_count += 1
+            batch.append(order)
+            if len(batch) >= batch_size:
+                await dispatch(batch)
+                batch = []
+
+        if batch:
+            await dispatch(batch)
+
+        if not tasks:
             logger.info("لا توجد طلبات نشطة للتحديث")
             return 0
-        
-        # عداد إجمالي الطلبات المحدثة
-        total_updated = 0
-        
-        # تقسيم الطلبات إلى دفعات لتحسين الأداء
-        for i in range(0, len(active_orders), BATCH_SIZE):
-            batch = active_orders[i:i+BATCH_SIZE]
-            
-            # تحديث الدفعة باستخدام طلب API متعدد
-            updated_count = await update_orders_batch(batch)
-            total_updated += updated_count
-            
-            # انتظار قصير بين الدفعات لتجنب إرهاق API
-            if i + BATCH_SIZE < len(active_orders):
-                await asyncio.sleep(1)
-        
-        logger.info(f"تم تحديث {total_updated} طلب من أصل {len(active_orders)}")
+
+        # ووتيرة الإرسال الفعلية يضبطها محدد المعدل المشترك في services.api
+        results = await asyncio.gather(*tasks)
+
+        total_updated = sum(updated_count for updated_count, _, _ in results)
+        failed_batches = sum(1 for _, ok, _ in results if not ok)
+        _adapt_batch_size(results)
+
+        logger.info(
+            f"تم تحديث {total_updated} طلب من أصل {active_count} "
+            f"في {len(tasks)} دفعة (الحجم {batch_size}، التوازي {UPDATER_CONCURRENCY}، فاشلة {failed_batches})"
+        )
         return total_updated
     except Exception as e:
         logger.error(f"خطأ في تحديث جميع الطلبات: {e}")
         return 0
 
+async def _load_due_orders(horizon: int) -> int:
+    """
+    إضافة الطلبات التي يحين موعد فحصها خلال الأفق المحدد إلى طابور الأولوية
+
+    Args:
+        horizon: الأفق الزمني بالثواني
+
+    Returns:
+        int: عدد الطلبات التي أضيفت للطابور
+    """
+    added = 0
+    now = time.time()
+    async for order in iter_active_orders(due_within=horizon):
+        if order["id"] in _queued_ids:
+            continue
+        due_at = _parse_db_timestamp(order.get("next_check_at")) or now
+        heapq.heappush(_poll_queue, (due_at, order["id"], order))
+        _queued_ids.add(order["id"])
+        added += 1
+    return added
+
+async def update_due_orders() -> int:
+    """
+    فحص الطلبات التي حان موعدها فقط حسب جدولة كل طلب
+
+    Returns:
+        int: عدد الطلبات التي تم تحديثها بنجاح
+    """
+    try:
+        await _load_due_orders(SCHEDULER_TICK)
+
+        # سحب الطلبات المستحقة من الطابور بترتيب مواعيدها
+        now = time.time()
+        due_orders = []
+        while _poll_queue and _poll_queue[0][0] <= now:
+            _, internal_id, order = heapq.heappop(_poll_queue)
+            _queued_ids.discard(internal_id)
+            due_orders.append(order)
+
+        if not due_orders:
+            return 0
+
+        batch_size = _batch_size
+        semaphore = asyncio.Semaphore(max(1, UPDATER_CONCURRENCY))
+        tasks = []
+        for i in range(0, len(due_orders), batch_size):
+            await semaphore.acquire()
+            tasks.append(asyncio.create_task(_run_batch(semaphore, due_orders[i:i + batch_size])))
+
+        results = await asyncio.gather(*tasks)
+        total_updated = sum(updated_count for updated_count, _, _ in results)
+        _adapt_batch_size(results)
+
+        logger.info(
+            f"تم فحص {len(due_orders)} طلب مستحق في {len(tasks)} دفعة، "
+            f"تم تحديث {total_updated} (في الانتظار {len(_poll_queue)})"
+        )
+        return total_updated
+    except Exception as e:
+        logger.error(f"خطأ في تحديث الطلبات المستحقة: {e}")
+        return 0
+
 async def start_order_status_updater():
     """
     بدء مهمة تحديث حالة الطلبات بشكل دوري
+
+    يعمل المجدول بدورة قصيرة (SCHEDULER_TICK) ويفحص في كل دورة الطلبات
+    التي حان موعد فحصها فقط، بينما يحدد next_check_at لكل طلب متى يُفحص مجددًا.
     """
     logger.info("تم بدء مهمة تحديث حالة الطلبات الدورية")
     
@@ -266,15 +483,16 @@ async def start_order_status_updater():
             # تسجيل وقت بدء التحديث
             start_time = time.time()
             
-            # تنفيذ التحديث
-            await update_all_orders()
+            # تنفيذ التحديث للطلبات المستحقة
+            updated = await update_due_orders()
             
             # حساب المدة المستغرقة
             elapsed_time = time.time() - start_time
-            logger.info(f"اكتمل تحديث الطلبات في {elapsed_time:.2f} ثانية")
+            if updated:
+                logger.info(f"اكتمل تحديث الطلبات المستحقة في {elapsed_time:.2f} ثانية")
             
             # الانتظار حتى الدورة التالية
-            await asyncio.sleep(UPDATE_INTERVAL)
+            await asyncio.sleep(max(0, SCHEDULER_TICK - elapsed_time))
         except asyncio.CancelledError:
             # المهمة تم إلغاؤها
             logger.info("تم إلغاء مهمة تحديث حالة الطلبات")
@@ -282,7 +500,7 @@ async def start_order_status_updater():
         except Exception as e:
             # خطأ غير متوقع، سجل وحاول مرة أخرى بعد الفاصل
             logger.error(f"خطأ غير متوقع في مهمة تحديث الطلبات: {e}")
-            await asyncio.sleep(UPDATE_INTERVAL)
+            await asyncio.sleep(SCHEDULER_TICK)
 
 async def schedule_order_status_updater(app):
     """
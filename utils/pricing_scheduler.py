@@ -0,0 +1,114 @@
+"""
+مجدول فترات صلاحية قواعد التسعير
+
+جدول التسعير المُجمّع يحتوي فقط القواعد السارية لحظة بنائه، ويحفظ أقرب لحظة
+تبدأ فيها قاعدة أو تنتهي (next_boundary). هذه المهمة تنام حتى تلك اللحظة
+بالضبط، ثم تستبدل الجدول وتحدّث مصفوفة الأسعار وترسل حدث بدء أو انتهاء العرض
+لكل مستمع مسجل. عند تعديل القواعد تستيقظ المهمة لإعادة حساب الموعد التالي.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List
+
+from database.pricing import (
+    build_pricing_table,
+    get_pricing_table,
+    pop_pricing_rule_events,
+    rules_changed_event
+)
+
+# إعداد المسجل
+logger = logging.getLogger("smm_bot")
+
+# أطول فترة نوم بدون موعد قادم (لالتقاط التعديلات المباشرة على قاعدة البيانات)
+PRICING_SCHEDULER_IDLE = float(os.getenv("PRICING_SCHEDULER_IDLE", "3600"))
+# هامش صغير بعد الموعد لضمان أن وقت البناء تجاوزه
+BOUNDARY_MARGIN = 0.05
+
+# مستمعو أحداث العروض: callback(event, rule) حيث event هو "started" أو "ended"
+PromotionListener = Callable[[str, Dict[str, Any]], Awaitable[None]]
+_listeners: List[PromotionListener] = []
+
+def add_promotion_listener(listener: PromotionListener) -> None:
+    """
+    تسجيل مستمع لأحداث بدء وانتهاء العروض
+
+    Args:
+        listener: دالة غير متزامنة تستقبل (الحدث، القاعدة)
+    """
+    _listeners.append(listener)
+
+async def _emit_events() -> int:
+    """إرسال الأحداث المتراكمة إلى المستمعين وإرجاع عددها"""
+    events = pop_pricing_rule_events()
+    for event, rule in events:
+        logger.info(f"{'بدأ' if event == 'started' else 'انتهى'} العرض: {rule['id']} - {rule['name']}")
+        for listener in _listeners:
+            try:
+                await listener(event, rule)
+            except Exception as e:
+                logger.error(f"خطأ في مستمع أحداث العروض: {e}")
+    return len(events)
+
+async def apply_pricing_boundary() -> int:
+    """
+    استبدال جدول التسعير عند موعد بدء أو انتهاء قاعدة
+
+    Returns:
+        int: عدد العروض التي بدأت أو انتهت
+    """
+    await build_pricing_table()
+    count = await _emit_events()
+    if count:
+        # الأسعار المحفوظة مسبقًا تعتمد على القواعد السارية
+        from database.price_matrix import refresh_price_matrix
+        await refresh_price_matrix()
+    return count
+
+async def start_pricing_scheduler():
+    """
+    مهمة خلفية لاستبدال قواعد التسعير السارية عند مواعيد بدئها وانتهائها
+    """
+    logger.info("تم بدء مجدول قواعد التسعير")
+
+    while True:
+        try:
+            table = await get_pricing_table()
+            if table.next_boundary is not None:
+                delay = (table.next_boundary - datetime.utcnow()).total_seconds() + BOUNDARY_MARGIN
+                delay = max(0.0, min(delay, PRICING_SCHEDULER_IDLE))
+            else:
+                delay = PRICING_SCHEDULER_IDLE
+
+            rules_changed_event.clear()
+            try:
+                await asyncio.wait_for(rules_changed_event.wait(), timeout=delay)
+                # تعديل يدوي للقواعد: الجدول أُعيد بناؤه، نعيد حساب الموعد فقط
+                await _emit_events()
+                continue
+            except asyncio.TimeoutError:
+                pass
+
+            await apply_pricing_boundary()
+        except asyncio.CancelledError:
+            logger.info("تم إلغاء مجدول قواعد التسعير")
+            break
+        except Exception as e:
+            logger.error(f"خطأ غير متوقع في مجدول قواعد التسعير: {e}")
+            await asyncio.sleep(60)
+
+async def schedule_pricing_scheduler(app):
+    """
+    جدولة مهمة مجدول قواعد التسعير
+
+    Args:
+        app: تطبيق البوت (للتسجيل في الخلفية)
+    """
+    try:
+        app["pricing_scheduler_task"] = asyncio.create_task(start_pricing_scheduler())
+        logger.info("تمت جدولة مجدول قواعد التسعير بنجاح")
+    except Exception as e:
+        logger.error(f"فشل جدولة مجدول قواعد التسعير: {e}")